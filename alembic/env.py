@@ -45,15 +45,18 @@ def run_migrations_online():
 
     connectable = create_async_engine(app_config.DATABASE_URL, poolclass=pool.NullPool)
 
+    def run_sync_migrations(sync_conn):
+        context.configure(
+            connection=sync_conn,
+            target_metadata=target_metadata,
+        )
+        # без begin_transaction зміни відкочуються при закритті з'єднання
+        with context.begin_transaction():
+            context.run_migrations()
+
     async def do_run_migrations():
         async with connectable.connect() as connection:
-            await connection.run_sync(
-                lambda sync_conn: context.configure(
-                    connection=sync_conn,
-                    target_metadata=target_metadata,
-                )
-            )
-            await connection.run_sync(lambda sync_conn: context.run_migrations())
+            await connection.run_sync(run_sync_migrations)
 
     asyncio.run(do_run_migrations())
 
@@ -0,0 +1,40 @@
+"""transactions (user_id, created_at DESC, id DESC) index for cursor pagination
+
+Revision ID: 0002_tx_user_created_index
+Revises: 0001_credits_version
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_tx_user_created_index'
+down_revision: Union[str, Sequence[str], None] = '0001_credits_version'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not sa.inspect(op.get_bind()).has_table("transactions"):
+        # нова БД: таблиці (з індексом) створює init_db.py
+        return
+    op.create_index(
+        "ix_transactions_user_created_id",
+        "transactions",
+        ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_transactions_user_created_id",
+        table_name="transactions",
+        if_exists=True,
+    )
@@ -0,0 +1,54 @@
+"""transaction_counters: per-user, per-type transaction totals
+
+Revision ID: 0003_transaction_counters
+Revises: 0002_tx_user_created_index
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003_transaction_counters'
+down_revision: Union[str, Sequence[str], None] = '0002_tx_user_created_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("transactions"):
+        # нова БД: таблиці створює init_db.py
+        return
+    if inspector.has_table("transaction_counters"):
+        return
+
+    op.create_table(
+        "transaction_counters",
+        sa.Column("user_id", sa.String(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column(
+            "type",
+            postgresql.ENUM(
+                "CHARGE", "ADD", "SUBSCRIPTION",
+                name="transactiontype", create_type=False
+            ),
+            nullable=False,
+        ),
+        sa.Column("count", sa.BigInteger(), server_default="0", nullable=False),
+        sa.PrimaryKeyConstraint("user_id", "type"),
+    )
+    # початкові значення з існуючої історії
+    op.execute(
+        "INSERT INTO transaction_counters (user_id, type, count) "
+        "SELECT user_id, type, count(*) FROM transactions GROUP BY user_id, type"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("transaction_counters", if_exists=True)
@@ -0,0 +1,66 @@
+"""daily_usage_rollup: pre-aggregated statistics per (day, tier, type)
+
+Revision ID: 0004_daily_usage_rollup
+Revises: 0003_transaction_counters
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004_daily_usage_rollup'
+down_revision: Union[str, Sequence[str], None] = '0003_transaction_counters'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("transactions"):
+        # нова БД: таблиці створює init_db.py
+        return
+
+    if not inspector.has_table("daily_usage_rollup"):
+        op.create_table(
+            "daily_usage_rollup",
+            sa.Column("day", sa.Date(), nullable=False),
+            sa.Column("tier", sa.String(24), nullable=False),
+            sa.Column(
+                "type",
+                postgresql.ENUM(
+                    "CHARGE", "ADD", "SUBSCRIPTION",
+                    name="transactiontype", create_type=False
+                ),
+                nullable=False,
+            ),
+            sa.Column("tx_count", sa.BigInteger(), nullable=False),
+            sa.Column("credits", sa.BigInteger(), nullable=False),
+            sa.Column("cost_usd", sa.Float(), nullable=False),
+            sa.Column("amount_usd", sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint("day", "tier", "type"),
+        )
+
+    # заповнюється catch-up задачею (або rollup_usage.py) з нуля
+    if not inspector.has_table("daily_usage_rollup_state"):
+        op.create_table(
+            "daily_usage_rollup_state",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("rolled_through", sa.Date(), nullable=True),
+            sa.Column(
+                "updated_at", sa.DateTime(timezone=True),
+                server_default=sa.func.now(), nullable=True
+            ),
+            sa.PrimaryKeyConstraint("id"),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("daily_usage_rollup_state", if_exists=True)
+    op.drop_table("daily_usage_rollup", if_exists=True)
@@ -0,0 +1,185 @@
+"""partition transactions by month; transaction_operations for idempotency
+
+Revision ID: 0005_partition_transactions
+Revises: 0004_daily_usage_rollup
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005_partition_transactions'
+down_revision: Union[str, Sequence[str], None] = '0004_daily_usage_rollup'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# далі партиції наперед створює worker (app.utils.partitions)
+PARTITIONS_AHEAD = 3
+
+COLUMNS = (
+    "id, user_id, type, source, operation_id, cost_usd, amount_usd, credits, "
+    "balance_before, balance_after, description, info, created_at"
+)
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _transactions_table(name: str, partitioned: bool) -> None:
+    kwargs = {"postgresql_partition_by": "RANGE (created_at)"} if partitioned else {}
+    op.create_table(
+        name,
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("user_id", sa.String(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column(
+            "type",
+            postgresql.ENUM(
+                "CHARGE", "ADD", "SUBSCRIPTION",
+                name="transactiontype", create_type=False
+            ),
+            nullable=False,
+        ),
+        sa.Column(
+            "source",
+            postgresql.ENUM(
+                "PURCHASE", "SUBSCRIPTION", "BONUS", "REFUND",
+                name="transactionsource", create_type=False
+            ),
+            nullable=True,
+        ),
+        sa.Column("operation_id", sa.String(), nullable=False),
+        sa.Column("cost_usd", sa.Float(), nullable=True),
+        sa.Column("amount_usd", sa.Float(), nullable=True),
+        sa.Column("credits", sa.Integer(), nullable=False),
+        sa.Column("balance_before", sa.Integer(), nullable=False),
+        sa.Column("balance_after", sa.Integer(), nullable=False),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("info", sa.JSON(), nullable=True),
+        sa.Column(
+            "created_at", sa.DateTime(timezone=True),
+            server_default=sa.func.now(), nullable=False
+        ),
+        sa.PrimaryKeyConstraint(
+            *(("id", "created_at") if partitioned else ("id",)),
+            name=f"{name}_pkey"
+        ),
+        **kwargs,
+    )
+
+
+def _is_partitioned(bind) -> bool:
+    return bind.execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table "
+        "WHERE partrelid = 'transactions'::regclass"
+    )).first() is not None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if not inspector.has_table("transactions"):
+        # нова БД: таблиці (і партиції) створює init_db.py
+        return
+
+    if not _is_partitioned(bind):
+        # стара таблиця звільняє імена обмежень/індексу для нової
+        op.execute("ALTER TABLE transactions RENAME TO transactions_legacy")
+        op.execute(
+            "ALTER TABLE transactions_legacy "
+            "DROP CONSTRAINT IF EXISTS transactions_pkey, "
+            "DROP CONSTRAINT IF EXISTS transactions_operation_id_key, "
+            "DROP CONSTRAINT IF EXISTS transactions_user_id_fkey"
+        )
+        op.execute("DROP INDEX IF EXISTS ix_transactions_user_created_id")
+
+        _transactions_table("transactions", partitioned=True)
+        op.create_index(
+            "ix_transactions_user_created_id",
+            "transactions",
+            ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+        )
+
+        # місяці від найстарішої транзакції до PARTITIONS_AHEAD наперед
+        first_created_at = bind.execute(
+            sa.text("SELECT min(created_at) FROM transactions_legacy")
+        ).scalar()
+        today = datetime.now(timezone.utc).date()
+        month = (first_created_at.astimezone(timezone.utc).date()
+                 if first_created_at is not None else today).replace(day=1)
+        last = _add_months(today.replace(day=1), PARTITIONS_AHEAD)
+        while month <= last:
+            op.execute(
+                f"CREATE TABLE transactions_y{month.year}m{month.month:02d} "
+                f"PARTITION OF transactions FOR VALUES "
+                f"FROM ('{month.isoformat()} 00:00:00+00') "
+                f"TO ('{_add_months(month, 1).isoformat()} 00:00:00+00')"
+            )
+            month = _add_months(month, 1)
+        op.execute("CREATE TABLE transactions_default PARTITION OF transactions DEFAULT")
+
+        op.execute(
+            f"INSERT INTO transactions ({COLUMNS}) "
+            f"SELECT {COLUMNS.replace('created_at', 'coalesce(created_at, now())')} "
+            f"FROM transactions_legacy"
+        )
+        op.drop_table("transactions_legacy")
+
+    if not inspector.has_table("transaction_operations"):
+        op.create_table(
+            "transaction_operations",
+            sa.Column("operation_id", sa.String(), nullable=False),
+            sa.Column("transaction_id", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+            sa.PrimaryKeyConstraint("operation_id"),
+        )
+        op.execute(
+            "INSERT INTO transaction_operations (operation_id, transaction_id, created_at) "
+            "SELECT operation_id, id, created_at FROM transactions"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if inspector.has_table("transactions") and _is_partitioned(bind):
+        op.execute("ALTER TABLE transactions RENAME TO transactions_partitioned")
+        op.execute(
+            "ALTER TABLE transactions_partitioned "
+            "RENAME CONSTRAINT transactions_pkey TO transactions_partitioned_pkey"
+        )
+        op.execute(
+            "ALTER TABLE transactions_partitioned "
+            "DROP CONSTRAINT transactions_user_id_fkey"
+        )
+        op.execute(
+            "ALTER INDEX ix_transactions_user_created_id "
+            "RENAME TO ix_transactions_partitioned_user_created_id"
+        )
+
+        _transactions_table("transactions", partitioned=False)
+        op.create_unique_constraint(
+            "transactions_operation_id_key", "transactions", ["operation_id"]
+        )
+        op.create_index(
+            "ix_transactions_user_created_id",
+            "transactions",
+            ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+        )
+        op.execute(
+            f"INSERT INTO transactions ({COLUMNS}) "
+            f"SELECT {COLUMNS} FROM transactions_partitioned"
+        )
+        # разом з усіма місячними партиціями
+        op.drop_table("transactions_partitioned")
+
+    op.drop_table("transaction_operations", if_exists=True)
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 
 
@@ -7,6 +9,15 @@ class AppConfig(BaseSettings):
     POSTGRES_DB: str
     POSTGRES_HOST: str
     POSTGRES_PORT: str
+    # пул з'єднань SQLAlchemy (на worker) та кеші запитів;
+    # значення за замовчуванням - як у SQLAlchemy/asyncpg (-1 - без recycle)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    DB_POOL_RECYCLE_SECONDS: int = -1
+    DB_POOL_PRE_PING: bool = False
+    DB_QUERY_CACHE_SIZE: int = 500
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100
 
     ADMIN_TOKEN: str
     SERVICE_TOKEN: str
@@ -14,13 +25,81 @@ class AppConfig(BaseSettings):
 
     DEBUG_MODE: bool = False
 
+    # логи: обмежена черга (запис у файли - у фоновому потоці) та
+    # політика при переповненні; ротація logs/*.log за розміром або часом
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_QUEUE_OVERFLOW: Literal["drop_new", "drop_oldest", "block"] = "drop_new"
+    LOG_ROTATION: Literal["size", "time"] = "size"
+    LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    LOG_ROTATION_WHEN: str = "midnight"
+    LOG_BACKUP_COUNT: int = 5
+    # text - рядок + JSON полів моделі, json - один JSON-рядок на подію
+    LOG_FORMAT: Literal["text", "json"] = "text"
+
     INTERNAL_HOST: str
     INTERNAL_PORT: str
+    # local - Public API викликає логіку Internal API напряму (той самий
+    # процес), remote - через HTTP (окремий розгорнутий Internal API)
+    INTERNAL_API_MODE: Literal["local", "remote"] = "local"
+    # HTTP клієнт до Internal API: пул keep-alive з'єднань на worker,
+    # таймаути (сек) та повтори ідемпотентних викликів з jitter
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 2
+    HTTP_READ_TIMEOUT_SECONDS: float = 10
+    HTTP_RETRIES: int = 2
+    HTTP_RETRY_BACKOFF_SECONDS: float = 0.1
 
     REDIS_HOST: str
     REDIS_PORT: str
     REDIS_DB: int
     CACHE_TTL_SECONDS: int
+    # кеш балансу після зміни кредитів: write_through - записати новий
+    # баланс (з версією) після commit, delete - видалити ключ
+    BALANCE_CACHE_STRATEGY: Literal["delete", "write_through"] = "write_through"
+    # захист від stampede: lock читання балансу з БД між workers та
+    # ймовірнісне раннє оновлення до закінчення TTL (0 - вимкнено)
+    BALANCE_LOCK_SECONDS: float = 2
+    BALANCE_EARLY_REFRESH_BETA: float = 0
+
+    # in-process L1 кеш (LRU) балансів і підписок перед Redis/БД
+    LOCAL_CACHE_ENABLED: bool = False
+    LOCAL_CACHE_TTL_SECONDS: float = 2
+    LOCAL_CACHE_MAX_ENTRIES: int = 10000
+
+    # негативний кеш users/tiers (404): записи короткі
+    EXISTENCE_NEGATIVE_TTL_SECONDS: float = 5
+
+    # денні rollups для /statistics: період catch-up задачі (0 - вимкнено)
+    # та затримка закриття дня для транзакцій, що комітяться після півночі
+    ROLLUP_INTERVAL_SECONDS: int = 300
+    ROLLUP_LAG_SECONDS: int = 300
+    # кеш закритих бакетів /statistics/series
+    STATS_SERIES_CACHE_TTL_SECONDS: int = 86400
+    # кеш відповідей /statistics (0 - вимкнено); діапазони з закритих днів
+    # живуть до наступного прогону rollup (ROLLUP_INTERVAL_SECONDS)
+    STATS_CACHE_TTL_SECONDS: int = 30
+
+    # місячні партиції transactions: скільки місяців наперед створювати
+    # та період фонової перевірки (0 - лише при старті worker)
+    TRANSACTION_PARTITIONS_AHEAD: int = 3
+    PARTITION_MAINTENANCE_INTERVAL_SECONDS: int = 86400
+    # холодний архів transactions (archive_transactions.py): каталог файлів,
+    # скільки місяців лишається в БД, рядків на один DELETE
+    ARCHIVE_DIR: str = "archive"
+    ARCHIVE_RETENTION_MONTHS: int = 12
+    ARCHIVE_BATCH_SIZE: int = 5000
+
+    # in-process реєстр планів/налаштувань (страховка до pub/sub інвалідації)
+    REGISTRY_TTL_SECONDS: int = 60
+    # примусове перезавантаження для невідомого tier - не частіше (сек)
+    REGISTRY_MIN_RELOAD_SECONDS: float = 1
+
+    # ідемпотентність: збережені відповіді та in-flight маркери у Redis
+    IDEMPOTENCY_TTL_SECONDS: int = 86400
+    IDEMPOTENCY_LOCK_SECONDS: int = 10
+    IDEMPOTENCY_WAIT_SECONDS: float = 5
 
     @property
     def DATABASE_URL(self) -> str:
@@ -3,7 +3,21 @@ from sqlalchemy.orm import sessionmaker, declarative_base
 from app.core.config import config
 
 
-engine = create_async_engine(config.DATABASE_URL, echo=config.DEBUG_MODE)
+engine = create_async_engine(
+	config.DATABASE_URL,
+	echo=config.DEBUG_MODE,
+	pool_size=config.DB_POOL_SIZE,
+	max_overflow=config.DB_MAX_OVERFLOW,
+	pool_timeout=config.DB_POOL_TIMEOUT_SECONDS,
+	pool_recycle=config.DB_POOL_RECYCLE_SECONDS,
+	pool_pre_ping=config.DB_POOL_PRE_PING,
+	# кеш скомпільованих SQL (ключ - структура запиту)
+	query_cache_size=config.DB_QUERY_CACHE_SIZE,
+	# кеш asyncpg prepared statements на з'єднання (0 - вимкнено, напр. pgbouncer)
+	connect_args={
+		"prepared_statement_cache_size": config.DB_PREPARED_STATEMENT_CACHE_SIZE
+	},
+)
 async_session=sessionmaker(
 	bind=engine,
 	expire_on_commit=False,
@@ -1,59 +1,267 @@
-import logging
+import atexit
 import json
+import logging
+import logging.handlers
+import queue
+import threading
+from typing import Dict, Optional
 
+from app.core.config import config
 from app.models import Transaction
 from app.models.settings import AdminLog
+from app.utils.json_encoding import json_dumps
 
-# logging credits (transactions)
-TRANSACTION_FIELDS = {c.name for c in Transaction.__table__.columns}
+# logging credits (transactions), у порядку колонок
+TRANSACTION_FIELDS = tuple(c.name for c in Transaction.__table__.columns)
 # admin logging
-ADMIN_FIELDS = {c.name for c in AdminLog.__table__.columns}
+ADMIN_FIELDS = tuple(c.name for c in AdminLog.__table__.columns)
+
+# політики при переповненій черзі логів
+OVERFLOW_DROP_NEW = "drop_new"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_BLOCK = "block"
+
+# максимум записів, що форматуються та пишуться між двома flush
+LOG_BATCH_SIZE = 500
+
+_listener: Optional["BatchingQueueListener"] = None
+_queue_handler: Optional["BoundedQueueHandler"] = None
 
 
 class ModelFormatter(logging.Formatter):
     def __init__(self, fmt=None, fields=None):
         super().__init__(fmt)
-        self.fields = fields or set()
+        self.fields = tuple(fields or ())
+
+    def extras(self, record) -> dict:
+        # лише поля моделі (десяток lookup замість обходу всього record.__dict__)
+        data = record.__dict__
+        return {k: data[k] for k in self.fields if k in data}
 
     def format(self, record):
         base = super().format(record)
-        extras = {k: v for k, v in record.__dict__.items() if k in self.fields}
+        extras = self.extras(record)
         if extras:
+            # текстовий формат рядка як і раніше (str() для datetime, Decimal, enum)
             base += " " + json.dumps(extras, default=str, ensure_ascii=False)
         return base
 
 
+class JsonFormatter(ModelFormatter):
+    """Структурований режим: один JSON-рядок на подію"""
+
+    def format(self, record):
+        event = {
+            "time": self.formatTime(record),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        event.update(self.extras(record))
+        if record.exc_info:
+            event["exc_info"] = self.formatException(record.exc_info)
+        return json_dumps(event)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    Handler у потоці event loop: лише кладе record у обмежену чергу.
+    Форматування та запис у файли - у потоці BatchingQueueListener.
+    """
+
+    def __init__(self, log_queue: queue.Queue, overflow: str):
+        super().__init__(log_queue)
+        self.overflow = overflow
+        self.dropped = 0
+        self._lock_dropped = threading.Lock()
+
+    def prepare(self, record):
+        # без format() тут: record форматується у фоновому потоці
+        return record
+
+    def _drop(self):
+        with self._lock_dropped:
+            self.dropped += 1
+
+    def enqueue(self, record):
+        if self.overflow == OVERFLOW_BLOCK:
+            self.queue.put(record)
+            return
+
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            if self.overflow == OVERFLOW_DROP_NEW:
+                self._drop()
+                return
+
+        # drop_oldest: звільняємо місце, відкидаючи найстаріший запис
+        try:
+            self.queue.get_nowait()
+            self._drop()
+        except queue.Empty:
+            pass
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._drop()
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """
+    Фоновий потік: забирає з черги до LOG_BATCH_SIZE записів, передає кожен
+    handler свого logger (routes) і скидає буфери файлів один раз на пачку.
+    """
+
+    def __init__(self, log_queue: queue.Queue, routes: Dict[str, logging.Handler]):
+        super().__init__(log_queue, *routes.values())
+        self.routes = routes
+
+    def handle(self, record):
+        handler = self.routes.get(record.name)
+        if handler is not None and record.levelno >= handler.level:
+            handler.handle(record)
+
+    def enqueue_sentinel(self):
+        # sentinel має потрапити у чергу навіть якщо вона повна
+        self.queue.put(self._sentinel)
+
+    def _flush(self):
+        for handler in self.handlers:
+            handler.flush_batch()
+
+    def _monitor(self):
+        q = self.queue
+        while True:
+            batch = [q.get()]
+            while len(batch) < LOG_BATCH_SIZE:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            for record in batch:
+                if record is self._sentinel:
+                    stop = True
+                else:
+                    self.handle(record)
+            self._flush()
+
+            if stop:
+                break
+
+
+class _BatchedWrites:
+    """flush() після кожного запису вимкнено - буфер скидає listener"""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class BatchedRotatingFileHandler(_BatchedWrites, logging.handlers.RotatingFileHandler):
+    pass
+
+
+class BatchedTimedRotatingFileHandler(
+    _BatchedWrites, logging.handlers.TimedRotatingFileHandler
+):
+    pass
+
+
+def _file_handler(filename: str) -> logging.Handler:
+    # ротація logs/*.log за розміром або за часом
+    if config.LOG_ROTATION == "time":
+        return BatchedTimedRotatingFileHandler(
+            filename,
+            when=config.LOG_ROTATION_WHEN,
+            backupCount=config.LOG_BACKUP_COUNT,
+            encoding="utf-8",
+            utc=True,
+        )
+    return BatchedRotatingFileHandler(
+        filename,
+        maxBytes=config.LOG_MAX_BYTES,
+        backupCount=config.LOG_BACKUP_COUNT,
+        encoding="utf-8",
+    )
+
+
+def get_logging_stats() -> Dict[str, int]:
+    """Стан черги логів поточного worker"""
+    if _queue_handler is None:
+        return {"queued": 0, "dropped": 0}
+    return {
+        "queued": _queue_handler.queue.qsize(),
+        "dropped": _queue_handler.dropped,
+    }
+
+
 # setup
 def setup_logging():
-    formatter_tx = ModelFormatter(
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    formatter_class = JsonFormatter if config.LOG_FORMAT == "json" else ModelFormatter
+
+    formatter_tx = formatter_class(
         "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
         fields=TRANSACTION_FIELDS
     )
 
-    formatter_admin = ModelFormatter(
+    formatter_admin = formatter_class(
         "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
         fields=ADMIN_FIELDS
     )
 
     # INTERNAL credits
-    internal_handler = logging.FileHandler("logs/internal_credits.log")
+    internal_handler = _file_handler("logs/internal_credits.log")
     internal_handler.setFormatter(formatter_tx)
-    internal_logger = logging.getLogger("[INTERNAL]")
-    internal_logger.setLevel(logging.INFO)
-    internal_logger.addHandler(internal_handler)
 
     # PUBLIC credits
-    public_handler = logging.FileHandler("logs/public_credits.log")
+    public_handler = _file_handler("logs/public_credits.log")
     public_handler.setFormatter(formatter_tx)
-    public_logger = logging.getLogger("[PUBLIC]")
-    public_logger.setLevel(logging.INFO)
-    public_logger.addHandler(public_handler)
 
     # ADMIN
-    admin_handler = logging.FileHandler("logs/admin.log")
+    admin_handler = _file_handler("logs/admin.log")
     admin_handler.setFormatter(formatter_admin)
-    admin_logger = logging.getLogger("[ADMIN]")
-    admin_logger.setLevel(logging.INFO)
-    admin_logger.addHandler(admin_handler)
+
+    routes = {
+        "[INTERNAL]": internal_handler,
+        "[PUBLIC]": public_handler,
+        "[ADMIN]": admin_handler,
+    }
+
+    # у loggers лише QueueHandler: запис у файли не блокує event loop
+    log_queue = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+    _queue_handler = BoundedQueueHandler(log_queue, config.LOG_QUEUE_OVERFLOW)
+    for name in routes:
+        route_logger = logging.getLogger(name)
+        route_logger.setLevel(logging.INFO)
+        route_logger.addHandler(_queue_handler)
+
+    _listener = BatchingQueueListener(log_queue, routes)
+    _listener.start()
+    atexit.register(stop_logging)
 
     logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
+
+
+def stop_logging():
+    """Дописати чергу у файли та закрити їх (при зупинці worker)"""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+
+    for name in _listener.routes:
+        logging.getLogger(name).removeHandler(_queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    _queue_handler = None
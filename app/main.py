@@ -1,18 +1,75 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from sqlalchemy.exc import DBAPIError, ProgrammingError
 
+from app.core.config import config
+from app.core.database import async_session
 from app.routers.admin import admin_router
 from app.routers.internal import internal_router
 from app.routers.public import public_router
+from app.utils.http_client import open_http_client, close_http_client
+from app.utils.invalidation import listen_invalidations
+from app.utils.partitions import (
+    ensure_transaction_partitions, run_partition_maintenance
+)
+from app.utils.plan_registry import plan_registry
+from app.utils.statistics import run_daily_rollup
 
-from app.core.logging_config import setup_logging
+from app.core.logging_config import setup_logging, stop_logging
 
 setup_logging()
 
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # фоновий потік запису логів (повторно - після попередньої зупинки)
+    setup_logging()
+    # in-process реєстр тарифів/курсу + слухач інвалідації між workers
+    try:
+        async with async_session() as session:
+            await plan_registry.load(session)
+    except (ProgrammingError, DBAPIError):
+        # нова БД ще без таблиць (init_db.py запускається після старту) -
+        # реєстр завантажиться при першому запиті
+        logger.warning("Plan registry preload skipped", exc_info=True)
+    background_tasks = [asyncio.create_task(listen_invalidations())]
+    # пул keep-alive з'єднань до Internal API на весь час життя worker
+    await open_http_client()
+
+    # місячні партиції transactions на TRANSACTION_PARTITIONS_AHEAD наперед
+    if config.PARTITION_MAINTENANCE_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(run_partition_maintenance()))
+    else:
+        try:
+            async with async_session() as session:
+                await ensure_transaction_partitions(session)
+        except (ProgrammingError, DBAPIError):
+            # таблиці transactions ще немає - партиції створить init_db.py
+            logger.warning("Transaction partitions check skipped", exc_info=True)
+
+    # catch-up денних rollups для /statistics
+    if config.ROLLUP_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(run_daily_rollup()))
+
+    yield
+
+    for task in background_tasks:
+        task.cancel()
+    await close_http_client()
+    # дописати у файли записи, що ще в черзі логів
+    stop_logging()
+
 
 app = FastAPI(
     title="Token System",
     description="Сервіс для керування токенами, кредитами та підписками",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 
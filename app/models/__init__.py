@@ -1,5 +1,9 @@
 from .user import User
 from .subscription import Subscription, SubscriptionPlan
 from .credits import Credits
-from .transaction import Transaction, TransactionType, TransactionSource
-from .settings import Settings, AdminLog, AdminOperationType
\ No newline at end of file
+from .transaction import (
+    Transaction, TransactionType, TransactionSource, TransactionCounter,
+    TransactionOperation
+)
+from .settings import Settings, AdminLog, AdminOperationType
+from .rollup import DailyUsageRollup, DailyUsageRollupState
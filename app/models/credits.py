@@ -13,5 +13,6 @@ class Credits(Base):
 	balance = Column(Integer, default=0) # поточний баланс
 	total_earned = Column(Integer, default=0) # скільки всього нараховано
 	total_spent = Column(Integer, default=0) # скільки всього списано
+	version = Column(Integer, default=0, server_default="0", nullable=False) # версія для кешу балансу
 
 	user = relationship("User", back_populates="credit")
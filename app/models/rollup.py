@@ -0,0 +1,34 @@
+from sqlalchemy import (
+	Column, Integer, String, Date, BigInteger, Float, DateTime, Enum, func
+)
+
+from app.core.database import Base
+from app.models.transaction import TransactionType
+
+
+class DailyUsageRollup(Base):
+	"""
+	Агрегати транзакцій за закритий день (UTC) по tier та типу.
+	Tier - план підписки користувача на момент агрегації (день щойно закрився);
+	як і сирі транзакції після rolled_through, рахуються лише користувачі
+	з підпискою. Заповнюється catch-up задачею (app.utils.rollup).
+	"""
+	__tablename__ = "daily_usage_rollup"
+
+	day = Column(Date, primary_key=True)
+	tier = Column(String(24), primary_key=True) # tier підписки на момент агрегації
+	type = Column(Enum(TransactionType), primary_key=True)
+	tx_count = Column(BigInteger, nullable=False, default=0)
+	credits = Column(BigInteger, nullable=False, default=0) # сума credits (+/-)
+	cost_usd = Column(Float, nullable=False, default=0)
+	amount_usd = Column(Float, nullable=False, default=0)
+
+
+class DailyUsageRollupState(Base):
+	__tablename__ = "daily_usage_rollup_state"
+
+	id = Column(Integer, primary_key=True) # єдиний рядок, id = 1
+	rolled_through = Column(Date, nullable=True) # останній агрегований день
+	updated_at = Column(
+		DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+	)
@@ -1,7 +1,8 @@
 import enum
 
 from sqlalchemy import (
-    Column, Integer, String, ForeignKey, Float, DateTime, JSON, Enum, func
+    Column, Integer, String, ForeignKey, Float, DateTime, JSON, Enum, func,
+    Index, BigInteger
 )
 from sqlalchemy.orm import relationship
 
@@ -20,6 +21,12 @@ class TransactionSource(enum.Enum):
     REFUND = "refund"        # повернення
 
 class Transaction(Base):
+    """
+    Таблиця партиціонована за місяцями (RANGE по created_at, UTC):
+    партиції transactions_yYYYYmMM створює app.utils.partitions наперед,
+    transactions_default - страховка для рядків поза створеними місяцями.
+    Ключ партиціонування входить у первинний ключ (id, created_at).
+    """
     __tablename__ = "transactions"
 
     id = Column(String, primary_key=True)
@@ -28,7 +35,8 @@ class Transaction(Base):
     type = Column(Enum(TransactionType), nullable=False)
     source = Column(Enum(TransactionSource), nullable=True)  # уточнення походження
 
-    operation_id = Column(String, unique=True, nullable=False)  # для ідемпотентності
+    # для ідемпотентності; глобальна унікальність - TransactionOperation
+    operation_id = Column(String, nullable=False)
     cost_usd = Column(Float, nullable=True)   # для generation service
     amount_usd = Column(Float, nullable=True)  # для поповнення кредитів
     credits = Column(Integer, nullable=False)  # + або - кількість
@@ -37,6 +45,45 @@ class Transaction(Base):
 
     description = Column(String, nullable=True)
     info = Column(JSON, default={})   # metadata (!)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(
+        DateTime(timezone=True), primary_key=True, server_default=func.now()
+    )
 
     user = relationship("User", back_populates="transactions")
+
+    __table_args__ = (
+        # історія користувача: keyset-пагінація (created_at, id) DESC
+        Index(
+            "ix_transactions_user_created_id",
+            user_id, created_at.desc(), id.desc()
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+class TransactionOperation(Base):
+    """
+    Глобальний індекс operation_id -> транзакція (ідемпотентність).
+    Унікальний індекс партиціонованої transactions мав би містити created_at,
+    тому унікальність operation_id тримає ця таблиця; created_at вказує
+    партицію, тож пошук транзакції не обходить інші місяці.
+    Вставляється разом з Transaction (app.utils.ledger).
+    """
+    __tablename__ = "transaction_operations"
+
+    operation_id = Column(String, primary_key=True)
+    transaction_id = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class TransactionCounter(Base):
+    """
+    Кількість транзакцій користувача за типом (total історії без COUNT(*)).
+    Оновлюється в тій самій DB-транзакції, що й вставка Transaction
+    (app.utils.ledger); відновлення - repair_counters.py.
+    """
+    __tablename__ = "transaction_counters"
+
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    type = Column(Enum(TransactionType), primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0, server_default="0")
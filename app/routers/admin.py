@@ -1,19 +1,23 @@
-from datetime import date, datetime, timezone, time
-from typing import Optional
+from datetime import date, datetime, timezone, time, timedelta
+from typing import Optional, Literal
 
 from fastapi import APIRouter, Depends, status, HTTPException, Query
-from sqlalchemy import select, func, case
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import config
 from app.core.dependencies import access_admin, get_session
-from app.models import Credits, Transaction, TransactionType
+from app.core.logging_config import get_logging_stats
+from app.models import Transaction
 from app.models.user import User
 from app.models.settings import AdminLog, AdminOperationType
 from app.models.subscription import SubscriptionPlan, Subscription
-from app.schemas.admin import ExchangeRateResponse, ExchangeRateUpdate
+from app.schemas.admin import (
+    ExchangeRateResponse, ExchangeRateUpdate, CacheStatsResponse,
+    HttpClientStatsResponse, LoggingStatsResponse
+)
 from app.schemas.base import (
-    StatisticsResponse, StatisticsPeriod, StatisticsPlans,
-    StatisticsCredits, StatisticsTransactions
+    StatisticsResponse, StatisticsSeriesResponse, StatisticsSeriesPoint
 )
 from app.schemas.subscription import (
     SubscriptionPlanResponse,
@@ -27,8 +31,17 @@ from app.schemas.subscription import (
 
 import logging
 
+from app.utils.archive import archive_horizon, iter_archived
 from app.utils.common import dump_payload, tier_existing_check, get_base_rate_from_settings
+from app.utils.export import export_query, export_response
+from app.utils.http_client import get_http_client_stats
 from app.utils.logging import generate_admin_log_id, get_extra_data_log
+from app.utils.local_cache import get_cache_stats
+from app.utils.plan_registry import plan_registry
+from app.utils.statistics import (
+    get_cached_usage_statistics, invalidate_statistics_cache
+)
+from app.utils.stats_series import get_statistics_series
 
 logger = logging.getLogger("[ADMIN]")
 
@@ -106,6 +119,8 @@ async def update_exchange_rate(
         message, extra=get_extra_data_log(new_admin_log)
     )
     await session.commit()
+    await plan_registry.notify_changed()
+    await invalidate_statistics_cache()
     return result
 
 
@@ -188,6 +203,8 @@ async def create_subscription_plan(
     )
 
     await session.commit()
+    await plan_registry.notify_changed()
+    await invalidate_statistics_cache()
     return SubscriptionPlanResponse(success=True, plan=new_plan)
 
 
@@ -258,6 +275,8 @@ async def update_subscription_plan(
         "Updated subscription plan. AdminLog:", extra=get_extra_data_log(new_admin_log)
     )
     await session.commit()
+    await plan_registry.notify_changed()
+    await invalidate_statistics_cache()
     return SubscriptionPlanResponse(success=True, plan=plan)
 
 
@@ -325,6 +344,8 @@ async def delete_subscription_plan(
     )
 
     await session.commit()
+    await plan_registry.notify_changed()
+    await invalidate_statistics_cache()
     return {
         "success": True,
         "message": "Subscription plan deleted",
@@ -459,6 +480,8 @@ async def update_multiplier(
     )
 
     await session.commit()
+    await plan_registry.notify_changed()
+    await invalidate_statistics_cache()
     await session.refresh(plan)
 
     return MultiplierUpdateResponse(
@@ -541,6 +564,8 @@ async def update_purchase_rate(
     )
 
     await session.commit()
+    await plan_registry.notify_changed()
+    await invalidate_statistics_cache()
     await session.refresh(plan)
 
     return PurchaseRateUpdateResponse(
@@ -588,91 +613,269 @@ async def get_usage_statistics(
         # перевірка tier існує? як що ні: Exception
         await tier_existing_check(session, tier)
 
-    # формування дати-часу з дати
-    start: datetime = datetime.combine(start_date, time(0, 0, 0), tzinfo=timezone.utc)
-    end: datetime = datetime.combine(end_date, time(23, 59, 59), tzinfo=timezone.utc)
+    # три запити паралельно на окремих з'єднаннях + кеш відповіді у Redis
+    return await get_cached_usage_statistics(session, start_date, end_date, tier)
 
-    # dict з кількістю users у кожний підписці
-    # загальна кількість користувачів які мають підписку
-    stmt = (
-        select(SubscriptionPlan.tier, func.count(User.id))
-        .join(Subscription, Subscription.user_id == User.id)
-        .join(SubscriptionPlan, Subscription.plan_id == SubscriptionPlan.tier)
-        .group_by(SubscriptionPlan.tier)
-    )
 
-    result = await session.execute(stmt)
-    rows = result.all()
-
-    subscriptions = {tier: count for tier, count in rows}
-    total_users = sum(subscriptions.values())
+@admin_router.get(
+    "/statistics/series",
+    dependencies=[Depends(access_admin)],
+    summary="Статистика по бакетах часу (година/день) для графіків",
+    description=(
+        "Доступ лише для адміністратора. Headers: X-Admin-Token. "
+        "Закриті бакети кешуються, перераховується лише відкритий."
+    ),
+    response_model=StatisticsSeriesResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        400: {
+            "description": "Bad request.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Too many buckets (max 2000)."}
+                },
+            },
+        },
+        403: {
+            "description": "Forbidden.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Invalid admin token."}
+                },
+            },
+        },
+        404: {
+            "description": "Not found.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Subscription Plan 'basic' not found."}
+                },
+            },
+        },
+        500: {
+            "description": "Internal Server Error.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Internal Server Error."}
+                }
+            },
+        },
+    },
+)
+async def get_usage_statistics_series(
+    bucket: Literal["hour", "day"] = Query("hour"),
+    start: Optional[datetime] = Query(None, description="Start (default: end - 48h / 30d)"),
+    end: Optional[datetime] = Query(None, description="End (default: now)"),
+    tier: Optional[str] = Query(None, description="Tier: optional"),
+    session: AsyncSession = Depends(get_session)
+):
     if tier:
-        if tier in subscriptions:
-            subscriptions = {tier: subscriptions[tier]}
-            total_users = subscriptions[tier]
-        else:
-            subscriptions = {}
-            total_users = 0
-
-    # статистика по кредитам
-    stmt = (
-        select(
-            func.sum(Credits.total_earned).label("total_earned"),
-            func.sum(Credits.total_spent).label("total_spent"),
-        )
-        .select_from(User)
-        .join(Subscription, Subscription.user_id == User.id)
-        .join(SubscriptionPlan, Subscription.plan_id == SubscriptionPlan.tier)
+        # перевірка tier існує? як що ні: Exception
+        await tier_existing_check(session, tier)
+
+    # дати без часової зони вважаються UTC
+    end = end or datetime.now(timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start is None:
+        start = end - (timedelta(hours=48) if bucket == "hour" else timedelta(days=30))
+    elif start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+
+    points = await get_statistics_series(session, bucket, start, end, tier)
+
+    return StatisticsSeriesResponse(
+        bucket=bucket,
+        start=start,
+        end=end,
+        points=[StatisticsSeriesPoint(**point) for point in points]
     )
 
+
+@admin_router.get(
+    "/transactions/export",
+    dependencies=[Depends(access_admin)],
+    summary="Експорт транзакцій за період (NDJSON/CSV)",
+    description=(
+        "Доступ лише для адміністратора. Headers: X-Admin-Token. "
+        "Відповідь стрімиться частинами, gzip - опційно."
+    ),
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Transactions stream.",
+            "content": {"application/x-ndjson": {}, "text/csv": {}},
+        },
+        403: {
+            "description": "Forbidden.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Invalid admin token."}
+                },
+            },
+        },
+        404: {
+            "description": "Not found.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Subscription Plan 'basic' not found."}
+                },
+            },
+        },
+        500: {
+            "description": "Internal Server Error.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Internal Server Error."}
+                }
+            },
+        },
+    },
+)
+async def export_transactions(
+    start_date: date = Query(..., description="Start date (e.g. 2026-01-01)"),
+    end_date: date = Query(..., description="End date (e.g. 2026-01-31)"),
+    tier: Optional[str] = Query(None, description="Tier: optional"),
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    gzip: bool = Query(False),
+    session: AsyncSession = Depends(get_session)
+):
     if tier:
-        stmt = stmt.where(SubscriptionPlan.tier == tier)
+        # перевірка tier існує? як що ні: Exception
+        await tier_existing_check(session, tier)
 
-    result = await session.execute(stmt)
-    row = result.one()
+    # напіввідкритий інтервал [start, наступний день після end_date) -
+    # однаковий для архіву та БД (без втрати рядків у 23:59:59.xxx)
+    start: datetime = datetime.combine(start_date, time(0, 0, 0), tzinfo=timezone.utc)
+    end: datetime = datetime.combine(
+        end_date + timedelta(days=1), time(0, 0, 0), tzinfo=timezone.utc
+    )
 
-    total_earned = row.total_earned or 0
-    total_spent = row.total_spent or 0
-    current_balance = total_earned - total_spent
+    # місяці до межі холодного архіву читаються з його файлів, решта - з БД
+    archived = None
+    horizon = archive_horizon()
+    if horizon is not None and start < horizon:
+        user_ids = None
+        if tier:
+            result = await session.execute(
+                select(Subscription.user_id).where(Subscription.plan_id == tier)
+            )
+            user_ids = set(result.scalars().all())
+        archived = iter_archived(start, end, user_ids)
+        start = max(start, horizon)
 
-    # статистика кількості транзакцій
     stmt = (
-        select(
-            func.count(Transaction.id).label("total"),
-            func.sum(case((Transaction.type == TransactionType.CHARGE, 1), else_=0)).label("charges"),
-            func.sum(case((Transaction.type == TransactionType.ADD, 1), else_=0)).label("additions"),
-        )
-        .join(Subscription, Subscription.user_id == Transaction.user_id)
-        .join(SubscriptionPlan, Subscription.plan_id == SubscriptionPlan.tier)
+        export_query()
         .where(Transaction.created_at >= start)
-        .where(Transaction.created_at <= end)
+        .where(Transaction.created_at < end)
+        .order_by(Transaction.created_at, Transaction.id)
     )
 
     if tier:
-        stmt = stmt.where(SubscriptionPlan.tier == tier)
-
-    result = await session.execute(stmt)
-    row = result.one()
-
-    total = row.total or 0
-    charges = row.charges or 0
-    additions = row.additions or 0
-
-    return StatisticsResponse(
-        period=StatisticsPeriod(
-            start=start,
-            end=end
-        ),
-        total_users=total_users,
-        subscriptions=StatisticsPlans(subscriptions=subscriptions),
-        credits=StatisticsCredits(
-            total_earned=total_earned,
-            total_spent=total_spent,
-            current_balance=current_balance
-        ),
-        transactions=StatisticsTransactions(
-            total=total,
-            charges=charges,
-            additions=additions
+        # tier - поточна підписка користувача (як у /statistics)
+        stmt = (
+            stmt.join(Subscription, Subscription.user_id == Transaction.user_id)
+            .where(Subscription.plan_id == tier)
         )
+
+    return export_response(
+        stmt, format, compress=gzip,
+        filename=f"transactions_{start_date}_{end_date}",
+        archived=archived,
+    )
+
+
+@admin_router.get(
+    "/cache/stats",
+    dependencies=[Depends(access_admin)],
+    summary="Лічильники hit/miss кешів (L1 та Redis) поточного worker",
+    description="Доступ лише для адміністратора. Headers: X-Admin-Token",
+    response_model=CacheStatsResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        403: {
+            "description": "Forbidden.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Invalid admin token."}
+                },
+            },
+        },
+        500: {
+            "description": "Internal Server Error.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Internal Server Error."}
+                }
+            },
+        },
+    },
+)
+async def get_cache_statistics():
+    return CacheStatsResponse(
+        local_cache_enabled=config.LOCAL_CACHE_ENABLED,
+        caches=get_cache_stats()
+    )
+
+
+@admin_router.get(
+    "/http-client/stats",
+    dependencies=[Depends(access_admin)],
+    summary="Використання пулу HTTP з'єднань до Internal API поточного worker",
+    description="Доступ лише для адміністратора. Headers: X-Admin-Token",
+    response_model=HttpClientStatsResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        403: {
+            "description": "Forbidden.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Invalid admin token."}
+                },
+            },
+        },
+        500: {
+            "description": "Internal Server Error.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Internal Server Error."}
+                }
+            },
+        },
+    },
+)
+async def get_http_client_statistics():
+    return HttpClientStatsResponse(**get_http_client_stats())
+
+
+@admin_router.get(
+    "/logging/stats",
+    dependencies=[Depends(access_admin)],
+    summary="Стан черги логів (очікують запису, відкинуті) поточного worker",
+    description="Доступ лише для адміністратора. Headers: X-Admin-Token",
+    response_model=LoggingStatsResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        403: {
+            "description": "Forbidden.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Invalid admin token."}
+                },
+            },
+        },
+        500: {
+            "description": "Internal Server Error.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Internal Server Error."}
+                }
+            },
+        },
+    },
+)
+async def get_logging_statistics():
+    return LoggingStatsResponse(
+        overflow_policy=config.LOG_QUEUE_OVERFLOW,
+        **get_logging_stats()
     )
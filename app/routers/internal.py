@@ -1,40 +1,57 @@
 from datetime import datetime, timezone
-from typing import Optional, Union
+from typing import Dict, List, Optional, Union
 
 from fastapi import APIRouter, Depends, status, HTTPException
-from sqlalchemy import select
+from sqlalchemy import select, update, bindparam
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
 from app.core.dependencies import (
     get_session, access_internal, get_balance_service
 )
 from app.utils.common import (
-    generate_transaction_id, user_existing_check,
-    calculate_credits_amount, get_base_rate_from_settings, tier_existing_check
+    generate_transaction_id, calculate_credits_amount, tier_existing_check,
+    invalidate_user_subscription
+)
+from app.utils.idempotency import (
+    IdempotentBatch, get_existing_transactions, get_used_operations,
+    idempotent_operation, idempotent_operations
 )
-from app.utils.idempotency import check_idempotency
 from app.models import (
     Subscription, Transaction, TransactionType,
-    TransactionSource, SubscriptionPlan
+    TransactionSource, User
 )
 from app.schemas.credits import (
     CreditsUserBalanceResponse, CreditsBase, CreditsUserCheckResponse,
     CreditsAddResponse, CreditsAddRequest, CreditsCalculateResponse,
     CreditsCalculateRequest, CreditsChargeRequest, CreditsChargeSuccessResponse,
-    CreditsChargeNoSuccessResponse
+    CreditsChargeNoSuccessResponse, CreditsChargeBatchRequest,
+    CreditsChargeBatchResponse, CreditsUserCheckBatchRequest,
+    CreditsUserCheckBatchResponse
 )
 from app.schemas.subscription import (
     SubscriptionUpdateResponse, SubscriptionUpdateRequest,
     SubscriptionPlanInternal)
+from app.utils.ledger import add_transaction, insert_transactions
 from app.utils.logging import get_extra_data_log
+from app.utils.plan_registry import plan_registry
+from app.utils.request_context import load_request_context
 from app.utils.service_balance import BalanceService
+from app.utils.service_credits import add_credits
 
 import logging
 
 logger = logging.getLogger("[INTERNAL]")
 
 
+# users + plan_id для пакетних endpoints (expanding IN - будується один раз)
+_USERS_PLAN_IDS = (
+    select(User.id, Subscription.plan_id)
+    .outerjoin(Subscription, Subscription.user_id == User.id)
+    .where(User.id.in_(bindparam("user_ids", expanding=True)))
+)
+
+
 # Internal API (для інших внутрішніх сервісів)
 internal_router = APIRouter(prefix="/api/internal", tags=["Internal API"])
 
@@ -88,24 +105,48 @@ async def create_user_subscription_plan(
     session: AsyncSession = Depends(get_session),
     balance_service: BalanceService = Depends(get_balance_service)
 ):
-    user_id = payload.user_id
+    # Redis fast path ідемпотентності: повтори без звернення до Postgres,
+    # паралельні дублікати чекають на результат першого запиту
+    async with idempotent_operation(
+        payload.operation_id, TransactionType.SUBSCRIPTION.value
+    ) as idempotency:
+        if idempotency.replay is not None:
+            logger.info(
+                "Found duplicate operation. Cached response:",
+                extra={"operation_id": payload.operation_id}
+            )
+            return SubscriptionUpdateResponse(**idempotency.replay)
 
-    # перевірка user існує? як що ні: Exception
-    await user_existing_check(session, user_id)
+        result = await _update_user_subscription(payload, session, balance_service)
 
-    tier = payload.subscription_tier
+        # зберігаємо відповідь (вже після commit) для наступних повторів
+        await idempotency.save(result)
 
-    # перевірка tier існує? як що ні: Exception
-    await tier_existing_check(session, tier)
+    return result
+
+
+async def _update_user_subscription(
+    payload: SubscriptionUpdateRequest,
+    session: AsyncSession,
+    balance_service: BalanceService
+):
+    user_id = payload.user_id
 
-    # Перевіряємо ідемпотентність
-    is_duplicate, existing_tx = await check_idempotency(
-        session=session,
+    # контекст одним запитом: user (404), підписка, ідемпотентність (409)
+    context = await load_request_context(
+        session,
+        user_id,
         operation_id=payload.operation_id,
         expected_type=TransactionType.SUBSCRIPTION.value
     )
+    existing_tx = context.existing_tx
+
+    tier = payload.subscription_tier
+
+    # перевірка tier існує? як що ні: Exception
+    await tier_existing_check(session, tier)
 
-    if is_duplicate and existing_tx is not None:
+    if existing_tx is not None:
         metadata = existing_tx.info
         # Повертаємо той самий результат, що був раніше
         message = "Found duplicate transaction. Existing transaction:"
@@ -122,38 +163,31 @@ async def create_user_subscription_plan(
             purchase_rate=metadata.get("purchase_rate"),
         )
     else:
-        # завантажуємо підписку разом із планом
-        result = await session.execute(
-            select(Subscription)
-            .options(selectinload(Subscription.plan))
-            .where(Subscription.user_id == user_id)
-        )
-        user_subscription: Subscription | None = result.scalar_one_or_none()
-
-        if not user_subscription:
+        # поточна підписка - з контексту (план - з in-process реєстру)
+        if context.plan is None:
             previous_tier = None
-            user_subscription = Subscription(
-                user_id=user_id, plan_id=tier
-            )
-            session.add(user_subscription)
-            plan = await session.get(SubscriptionPlan, tier)
+            session.add(Subscription(user_id=user_id, plan_id=tier))
         else:
-            if user_subscription.plan.tier == tier:
+            if context.plan.tier == tier:
                 raise HTTPException(
                     status_code=status.HTTP_409_CONFLICT,
                     detail=f"CONFLICT: User '{user_id}' has the same tier '{tier}'.",
                 )
-            previous_tier = user_subscription.plan.tier
-            user_subscription.plan_id = tier
-            plan = user_subscription.plan
+            previous_tier = context.plan.tier
+            await session.execute(
+                update(Subscription)
+                .where(Subscription.user_id == user_id)
+                .values(plan_id=tier)
+            )
+
+        plan = await plan_registry.get_plan(session, tier)
 
-        # кредити
-        credits_before = await balance_service.get_credits(user_id)
-        balance_before = credits_before.balance
+        # кредити: атомарне оновлення, balance_before з RETURNING
         user_credit = await balance_service.update_credits(
             user_id, payload.credits_to_add
         )
         balance_after = user_credit.balance
+        balance_before = balance_after - payload.credits_to_add
 
         new_tier = tier
         multiplier = plan.multiplier
@@ -181,7 +215,7 @@ async def create_user_subscription_plan(
                 "purchase_rate": float(purchase_rate),
             }
         )
-        session.add(new_tx)
+        await add_transaction(session, new_tx)
         await session.flush()
 
         message = "Updated credits. Transaction:"
@@ -203,7 +237,9 @@ async def create_user_subscription_plan(
         extra=extra_log
     )
 
-    await session.commit()
+    # commit, потім оновлення кешу балансу та L1 кешу підписки
+    await balance_service.commit()
+    await invalidate_user_subscription(user_id)
     return result
 
 
@@ -246,17 +282,11 @@ async def user_credits_balance(
     session: AsyncSession = Depends(get_session),
     balance_service: BalanceService = Depends(get_balance_service)
 ):
-    # перевірка user існує? як що ні: Exception
-    await user_existing_check(session, user_id)
-
-    # завантажуємо підписку разом із планом
-    result = await session.execute(
-        select(Subscription)
-        .options(selectinload(Subscription.plan))
-        .where(Subscription.user_id == user_id)
-    )
-    subscription = result.scalar_one_or_none()
-    if not subscription:
+    # контекст одним запитом: user (404), підписка
+    context = await load_request_context(session, user_id)
+
+    plan = context.plan
+    if plan is None:
         return CreditsUserBalanceResponse(
             user_id=user_id,
             subscription=SubscriptionPlanInternal(
@@ -271,7 +301,6 @@ async def user_credits_balance(
                 total_spent=0
             )
         )
-    plan = subscription.plan
 
     # кредити
     user_credits = await balance_service.get_credits(user_id)
@@ -332,22 +361,11 @@ async def user_credits_checking(
     session: AsyncSession = Depends(get_session),
     balance_service: BalanceService = Depends(get_balance_service)
 ):
-    # перевірка user існує? як що ні: Exception
-    await user_existing_check(session, user_id)
-
-    # завантажуємо підписку разом із планом
-    result = await session.execute(
-        select(
-            Subscription,
-            SubscriptionPlan.tier,
-            SubscriptionPlan.multiplier
-        )
-        .outerjoin(SubscriptionPlan,
-                   Subscription.plan_id == SubscriptionPlan.tier)
-        .where(Subscription.user_id == user_id)
-    )
-    row = result.first()
-    if not row:
+    # контекст одним запитом: user (404), підписка
+    context = await load_request_context(session, user_id)
+
+    plan = context.plan
+    if plan is None:
         return CreditsUserCheckResponse(
             user_id=user_id,
             has_subscription=False,
@@ -357,8 +375,6 @@ async def user_credits_checking(
             multiplier=1
         )
 
-    subscription, tier, multiplier = row
-
     # кредити
     user_credits = await balance_service.get_credits(user_id)
     balance = user_credits.balance
@@ -371,13 +387,99 @@ async def user_credits_checking(
     return CreditsUserCheckResponse(
         user_id=user_id,
         has_subscription=True,
-        subscription_tier=tier,
+        subscription_tier=plan.tier,
         balance=balance,
         sufficient=sufficient,
-        multiplier=multiplier,
+        multiplier=plan.multiplier,
     )
 
 
+@internal_router.post(
+    "/credits/check/batch",
+    dependencies=[Depends(access_internal)],
+    summary="Перевірка наявності кредитів для багатьох користувачів",
+    description="Лише внутрішній доступ. Headers: X-Service-Token",
+    response_model=CreditsUserCheckBatchResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        403: {
+            "description": "Forbidden.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Invalid service token."}
+                },
+            },
+        },
+        500: {
+            "description": "Internal Server Error.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Internal Server Error."}
+                }
+            },
+        },
+    },
+)
+async def users_credits_checking(
+    payload: CreditsUserCheckBatchRequest,
+    session: AsyncSession = Depends(get_session),
+    balance_service: BalanceService = Depends(get_balance_service)
+):
+    user_ids = {item.user_id for item in payload.users}
+
+    # users + підписки одним запитом (None: немає підписки)
+    result = await session.execute(_USERS_PLAN_IDS, {"user_ids": list(user_ids)})
+    plans = {}
+    for user_id, plan_id in result.all():
+        plans[user_id] = (
+            await plan_registry.get_plan(session, plan_id) if plan_id else None
+        )
+
+    # кредити: один MGET + один запит для промахів кешу
+    user_credits = await balance_service.get_credits_many(
+        user_id for user_id, plan in plans.items() if plan is not None
+    )
+
+    results = []
+    not_found = []
+    for item in payload.users:
+        user_id = item.user_id
+
+        if user_id not in plans:
+            not_found.append(user_id)
+            continue
+
+        plan = plans[user_id]
+        if plan is None:
+            results.append(CreditsUserCheckResponse(
+                user_id=user_id,
+                has_subscription=False,
+                subscription_tier=None,
+                balance=0,
+                sufficient=False,
+                multiplier=1
+            ))
+            continue
+
+        balance = user_credits[user_id].balance
+
+        if item.required_credits is None:
+            sufficient = True
+        else:
+            sufficient = balance >= item.required_credits
+
+        results.append(CreditsUserCheckResponse(
+            user_id=user_id,
+            has_subscription=True,
+            subscription_tier=plan.tier,
+            balance=balance,
+            sufficient=sufficient,
+            multiplier=plan.multiplier,
+        ))
+
+    return CreditsUserCheckBatchResponse(results=results, not_found=not_found)
+
+
 @internal_router.post(
     "/credits/add",
     dependencies=[Depends(access_internal)],
@@ -427,118 +529,7 @@ async def user_credits_add(
     session: AsyncSession = Depends(get_session),
     balance_service: BalanceService = Depends(get_balance_service)
 ):
-    user_id = payload.user_id
-
-    # перевірка user існує? як що ні: Exception
-    await user_existing_check(session, user_id)
-
-    # Перевіряємо ідемпотентність
-    operation_id = payload.operation_id
-    is_duplicate, existing_tx = await check_idempotency(
-        session=session,
-        operation_id=operation_id,
-        expected_type=TransactionType.ADD.value
-    )
-
-    if is_duplicate and existing_tx is not None:
-        metadata = existing_tx.info
-        # Повертаємо той самий результат, що був раніше
-        message = "Found duplicate transaction. Existing transaction:"
-        extra_log = get_extra_data_log(existing_tx)
-
-        result =  CreditsAddResponse(
-            success=True,
-            transaction_id=existing_tx.id,
-            user_id=existing_tx.user_id,
-            amount_usd=existing_tx.amount_usd,
-            credits_added=existing_tx.credits,
-            purchase_rate=metadata.get("purchase_rate"),
-            balance_before=existing_tx.balance_before,
-            balance_after=existing_tx.balance_after,
-            operation_id=existing_tx.operation_id
-        )
-    else:
-        # завантажуємо підписку разом із планом
-        result = await session.execute(
-            select(Subscription)
-            .options(selectinload(Subscription.plan))
-            .where(Subscription.user_id == user_id)
-        )
-        subscription: Subscription | None = result.scalar_one_or_none()
-
-        if not subscription:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Not found: user '{user_id}' does not have subscription.",
-            )
-        purchase_rate = float(subscription.plan.purchase_rate)
-
-        # завантаження базового курсу конвертації
-        base_rate, _, _ = await get_base_rate_from_settings(session)
-
-        # розрахунок суми кредитів з урахуванням бонусу підписки
-        amount_usd = payload.amount_usd
-        credits_added = round(amount_usd * purchase_rate * base_rate)
-
-        # кредити
-        user_credits = await balance_service.get_credits(user_id)
-        balance_before = user_credits.balance
-
-        # оновити кредити та створити транзакцію
-        async with session.begin_nested():
-            # оновити кредити
-            user_credits = await balance_service.update_credits(
-                user_id, credits_added
-            )
-            balance_after = user_credits.balance
-
-            id_tx = generate_transaction_id(operation_id)
-
-            meta = payload.metadata.dict() if hasattr(payload.metadata, "dict") else (payload.metadata or {})
-            info = {"purchase_rate": float(purchase_rate), **meta}
-
-            # транзакція
-            new_tx = Transaction(
-                id=id_tx,
-                user_id=user_id,
-                operation_id=operation_id,
-                type=TransactionType.ADD,
-                source=TransactionSource.PURCHASE,
-                amount_usd=amount_usd,
-                credits=credits_added,
-                balance_before=balance_before,
-                balance_after=balance_after,
-                description=payload.description,
-                created_at=datetime.now(timezone.utc),
-                info=info
-            )
-
-            session.add(new_tx)
-            await session.flush()
-
-            message = "Updated credits. Transaction::"
-            extra_log = get_extra_data_log(new_tx)
-
-            result = CreditsAddResponse(
-                success=True,
-                transaction_id=new_tx.id,
-                user_id=user_id,
-                amount_usd=amount_usd,
-                credits_added=credits_added,
-                purchase_rate=purchase_rate,
-                balance_before=balance_before,
-                balance_after=balance_after,
-                operation_id=operation_id
-            )
-
-    await session.commit()
-
-    logger.info(
-        message,
-        extra=extra_log
-    )
-
-    return result
+    return await add_credits(payload, session, balance_service, logger)
 
 
 @internal_router.post(
@@ -591,28 +582,23 @@ async def user_credits_calculate(
 ):
     user_id = payload.user_id
 
-    # перевірка user існує? як що ні: Exception
-    await user_existing_check(session, user_id)
+    # контекст одним запитом: user (404), підписка
+    context = await load_request_context(session, user_id)
 
-    # отримуємо підписку і множник з плану
-    result = await session.execute(
-        select(Subscription, SubscriptionPlan.multiplier)
-        .join(Subscription.plan)   # зв'язати з планом
-        .where(Subscription.user_id == user_id)
-    )
-    row = result.one_or_none()
-    if row is None:
+    # план підписки і множник
+    plan = context.plan
+    if plan is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"User '{user_id}' has no subscription.",
         )
 
-    _, multiplier = row
+    multiplier = plan.multiplier
 
     # отримати базову ставку
-    base_rate, _, _ = await get_base_rate_from_settings(session)
+    base_rate = await plan_registry.get_base_rate(session)
 
-    # отримати баланс
+    # баланс
     user_credits = await balance_service.get_credits(user_id)
     user_balance = user_credits.balance
 
@@ -684,35 +670,55 @@ async def user_credits_charge(
     session: AsyncSession = Depends(get_session),
     balance_service: BalanceService = Depends(get_balance_service)
 ):
-    user_id = payload.user_id
+    # Redis fast path ідемпотентності: повтори без звернення до Postgres,
+    # паралельні дублікати чекають на результат першого запиту
+    async with idempotent_operation(
+        payload.operation_id, TransactionType.CHARGE.value
+    ) as idempotency:
+        if idempotency.replay is not None:
+            logger.info(
+                "Found duplicate operation. Cached response:",
+                extra={"operation_id": payload.operation_id}
+            )
+            return CreditsChargeSuccessResponse(**idempotency.replay)
 
-    # перевірка user існує? як що ні: Exception
-    await user_existing_check(session, user_id)
+        result_back = await _charge_user_credits(payload, session, balance_service)
 
-    # отримуємо підписку і множник з плану
-    result = await session.execute(
-        select(Subscription, SubscriptionPlan.multiplier)
-        .join(Subscription.plan)   # зв'язати з планом
-        .where(Subscription.user_id == user_id)
-    )
-    row = result.one_or_none()
-    if row is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"User '{user_id}' has no subscription.",
-        )
+        # зберігаємо відповідь (вже після commit) для наступних повторів
+        if result_back.success:
+            await idempotency.save(result_back)
+
+    return result_back
 
-    _, multiplier = row
 
-    # Перевіряємо ідемпотентність
+async def _charge_user_credits(
+    payload: CreditsChargeRequest,
+    session: AsyncSession,
+    balance_service: BalanceService
+):
+    user_id = payload.user_id
+
+    # контекст одним запитом: user (404), підписка, ідемпотентність (409)
     operation_id = payload.operation_id
-    is_duplicate, existing_tx = await check_idempotency(
-        session=session,
+    context = await load_request_context(
+        session,
+        user_id,
         operation_id=operation_id,
         expected_type=TransactionType.CHARGE.value
     )
+    existing_tx = context.existing_tx
+
+    # план підписки і множник
+    plan = context.plan
+    if plan is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User '{user_id}' has no subscription.",
+        )
+
+    multiplier = plan.multiplier
 
-    if is_duplicate and existing_tx is not None:
+    if existing_tx is not None:
         # Повертаємо той самий результат, що був раніше
         message = "Found duplicate transaction. Existing transaction:"
         extra_log = get_extra_data_log(existing_tx)
@@ -728,18 +734,23 @@ async def user_credits_charge(
         )
     else:
         # отримати базову ставку
-        base_rate, _, _ = await get_base_rate_from_settings(session)
-
-        # отримати баланс
-        user_credits_before = await balance_service.get_credits(user_id)
-        balance_before_charge = user_credits_before.balance
+        base_rate = await plan_registry.get_base_rate(session)
 
         # розрахувати кредити до списання
         cost_usd = payload.cost_usd
         multiplier = float(multiplier)
         credits_to_charge = calculate_credits_amount(cost_usd, multiplier, base_rate)
 
-        if (balance_before_charge - credits_to_charge) < 0:
+        # atomic operation (!) here: умовне списання одним UPDATE,
+        # баланс не може стати від'ємним навіть при паралельних запитах
+        user_credits = await balance_service.charge_credits(
+            user_id, credits_to_charge
+        )
+
+        if user_credits is None:
+            # кредитів недостатньо: нічого не списано
+            current_balance = await balance_service.current_balance(user_id)
+
             message = "Insufficient user credits"
             extra_log = {}
 
@@ -747,41 +758,257 @@ async def user_credits_charge(
                 error="insufficient_credits",
                 user_id=user_id,
                 required_credits=credits_to_charge,
-                current_balance=balance_before_charge,
-                deficit=(credits_to_charge - balance_before_charge)
+                current_balance=current_balance,
+                deficit=(credits_to_charge - current_balance)
             )
         else:
-            # atomic operation (!) here: txn, credits
-            async with session.begin_nested():
-                # списати кредити з балансу user (update credits)
-                user_credits = await balance_service.update_credits(
-                    user_id, -credits_to_charge
-                )
-                new_balance = user_credits.balance
+            new_balance = user_credits.balance
+            balance_before_charge = new_balance + credits_to_charge
 
-                # створити транзакцію
-                id_tx = generate_transaction_id(operation_id)
-                new_tx = Transaction(
-                    id=id_tx,
-                    user_id=user_id,
-                    operation_id=operation_id,
-                    type=TransactionType.CHARGE,
-                    cost_usd=cost_usd,
-                    credits=-credits_to_charge,
-                    balance_before=balance_before_charge,
-                    balance_after=new_balance,
-                    description=payload.description,
-                    created_at=datetime.now(timezone.utc),
-                    info=payload.metadata or {}
+            # створити транзакцію (в тій самій DB-транзакції, що й списання)
+            id_tx = generate_transaction_id(operation_id)
+            new_tx = Transaction(
+                id=id_tx,
+                user_id=user_id,
+                operation_id=operation_id,
+                type=TransactionType.CHARGE,
+                cost_usd=cost_usd,
+                credits=-credits_to_charge,
+                balance_before=balance_before_charge,
+                balance_after=new_balance,
+                description=payload.description,
+                created_at=datetime.now(timezone.utc),
+                info=payload.metadata or {}
+            )
+
+            await add_transaction(session, new_tx)
+            await session.flush()
+
+            message = "Updated credits. Transaction:"
+            extra_log = get_extra_data_log(new_tx)
+
+            result_back = CreditsChargeSuccessResponse(
+                transaction_id=id_tx,
+                user_id=user_id,
+                cost_usd=cost_usd,
+                credits_charged=credits_to_charge,
+                balance_before=balance_before_charge,
+                balance_after=new_balance,
+                operation_id=operation_id
+            )
+
+    logger.info(
+        message,
+        extra=extra_log
+    )
+    # commit, потім оновлення кешу балансу
+    await balance_service.commit()
+
+    return result_back
+
+
+@internal_router.post(
+    "/credits/charge/batch",
+    dependencies=[Depends(access_internal)],
+    summary="Пакетне списання кредитів: одна DB-транзакція",
+    description="Лише внутрішній доступ. Headers: X-Service-Token",
+    response_model=CreditsChargeBatchResponse,
+    # поля, які не розраховувались (None), не повертаються
+    response_model_exclude_none=True,
+    status_code=status.HTTP_200_OK,
+    responses={
+        403: {
+            "description": "Forbidden.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Invalid service token."}
+                },
+            },
+        },
+        500: {
+            "description": "Internal Server Error.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Internal Server Error."}
+                }
+            },
+        },
+    },
+)
+async def user_credits_charge_batch(
+    payload: CreditsChargeBatchRequest,
+    session: AsyncSession = Depends(get_session),
+    balance_service: BalanceService = Depends(get_balance_service)
+):
+    items = payload.items
+
+    # Redis fast path ідемпотентності для кожного operation_id пакета:
+    # завершені - без Postgres, in-flight в інших запитах - чекаємо результат
+    async with idempotent_operations(
+        (item.operation_id for item in items), TransactionType.CHARGE.value
+    ) as idempotency:
+        try:
+            result_back = await _charge_batch(
+                items, idempotency, session, balance_service
+            )
+        except IntegrityError:
+            # operation_id пакета щойно записав паралельний запит (не дочекався
+            # маркера в Redis): повторний прохід визначить його як дублікат
+            await balance_service.rollback()
+            result_back = await _charge_batch(
+                items, idempotency, session, balance_service
+            )
+
+        # зберігаємо відповіді успішних списань (вже після commit) для повторів
+        await idempotency.save([
+            (item.operation_id, item_result)
+            for item, item_result in zip(items, result_back.results)
+            if item_result.success
+        ])
+
+    return result_back
+
+
+async def _charge_batch(
+    items: List[CreditsChargeRequest],
+    idempotency: IdempotentBatch,
+    session: AsyncSession,
+    balance_service: BalanceService
+) -> CreditsChargeBatchResponse:
+    # повтор operation_id у межах пакета - та сама відповідь, що й першому
+    unique_items = {}
+    for item in items:
+        unique_items.setdefault(item.operation_id, item)
+
+    results_by_operation = {}
+    pending = []
+    for operation_id, item in unique_items.items():
+        if operation_id in idempotency.replays:
+            results_by_operation[operation_id] = CreditsChargeSuccessResponse(
+                **idempotency.replays[operation_id]
+            )
+        elif operation_id in idempotency.conflicts:
+            results_by_operation[operation_id] = CreditsChargeNoSuccessResponse(
+                error="operation_type_conflict", user_id=item.user_id
+            )
+        else:
+            pending.append(item)
+
+    multipliers = {}
+    existing_txs = {}
+    used_operations = set()
+    if pending:
+        # users + плани підписок одним запитом (None: немає підписки)
+        result = await session.execute(
+            _USERS_PLAN_IDS, {"user_ids": list({item.user_id for item in pending})}
+        )
+        for user_id, plan_id in result.all():
+            plan = await plan_registry.get_plan(session, plan_id) if plan_id else None
+            multipliers[user_id] = plan.multiplier if plan else None
+
+        # Перевіряємо ідемпотентність усіх operation_id одним запитом
+        existing_txs = await get_existing_transactions(
+            session, (item.operation_id for item in pending)
+        )
+        # використані operation_id без транзакції в БД (холодний архів)
+        used_operations = await get_used_operations(
+            session,
+            (
+                item.operation_id for item in pending
+                if item.operation_id not in existing_txs
+            )
+        )
+
+    # списання по користувачах: user_id -> елементи в порядку пакета
+    charges: Dict[str, List[CreditsChargeRequest]] = {}
+    for item in pending:
+        user_id = item.user_id
+        operation_id = item.operation_id
+        existing_tx = existing_txs.get(operation_id)
+
+        if existing_tx is not None:
+            if existing_tx.type != TransactionType.CHARGE:
+                item_result = CreditsChargeNoSuccessResponse(
+                    error="operation_type_conflict", user_id=user_id
+                )
+            else:
+                # Повертаємо той самий результат, що був раніше
+                item_result = CreditsChargeSuccessResponse(
+                    transaction_id=existing_tx.id,
+                    user_id=existing_tx.user_id,
+                    cost_usd=existing_tx.cost_usd,
+                    credits_charged=existing_tx.credits,
+                    balance_before=existing_tx.balance_before,
+                    balance_after=existing_tx.balance_after,
+                    operation_id=operation_id
                 )
+        elif operation_id in used_operations:
+            item_result = CreditsChargeNoSuccessResponse(
+                error="operation_already_used", user_id=user_id
+            )
+        elif user_id not in multipliers or multipliers[user_id] is None:
+            item_result = CreditsChargeNoSuccessResponse(
+                error=(
+                    "user_not_found" if user_id not in multipliers
+                    else "no_subscription"
+                ),
+                user_id=user_id
+            )
+        else:
+            charges.setdefault(user_id, []).append(item)
+            continue
 
-                session.add(new_tx)
-                await session.flush()
+        results_by_operation[operation_id] = item_result
 
-                message = "Updated credits. Transaction:"
-                extra_log = get_extra_data_log(new_tx)
+    # отримати базову ставку
+    base_rate = await plan_registry.get_base_rate(session) if charges else None
+
+    # atomic operation (!) here: умовне списання одним UPDATE на елемент,
+    # як і в /credits/charge. Користувачі - в порядку user_id: паралельні
+    # пакети блокують рядки credits в одному порядку (без deadlock)
+    new_txs = []
+    for user_id in sorted(charges):
+        multiplier = float(multipliers[user_id])
+        for item in charges[user_id]:
+            operation_id = item.operation_id
+            cost_usd = item.cost_usd
+            credits_to_charge = calculate_credits_amount(
+                cost_usd, multiplier, base_rate
+            )
+            user_credits = await balance_service.charge_credits(
+                user_id, credits_to_charge
+            )
+
+            if user_credits is None:
+                # кредитів недостатньо: нічого не списано
+                current_balance = await balance_service.current_balance(user_id)
+                item_result = CreditsChargeNoSuccessResponse(
+                    error="insufficient_credits",
+                    user_id=user_id,
+                    required_credits=credits_to_charge,
+                    current_balance=current_balance,
+                    deficit=(credits_to_charge - current_balance)
+                )
+            else:
+                new_balance = user_credits.balance
+                balance_before_charge = new_balance + credits_to_charge
 
-                result_back = CreditsChargeSuccessResponse(
+                id_tx = generate_transaction_id(operation_id)
+                new_txs.append({
+                    "id": id_tx,
+                    "user_id": user_id,
+                    "operation_id": operation_id,
+                    "type": TransactionType.CHARGE,
+                    "cost_usd": cost_usd,
+                    "credits": -credits_to_charge,
+                    "balance_before": balance_before_charge,
+                    "balance_after": new_balance,
+                    "description": item.description,
+                    "created_at": datetime.now(timezone.utc),
+                    "info": item.metadata or {},
+                })
+
+                item_result = CreditsChargeSuccessResponse(
                     transaction_id=id_tx,
                     user_id=user_id,
                     cost_usd=cost_usd,
@@ -791,10 +1018,23 @@ async def user_credits_charge(
                     operation_id=operation_id
                 )
 
+            results_by_operation[operation_id] = item_result
+
+    if new_txs:
+        # bulk insert транзакцій в тій самій DB-транзакції, що й списання
+        await insert_transactions(session, new_txs)
+
+        for tx in new_txs:
+            logger.info("Updated credits. Transaction:", extra=tx)
+
     logger.info(
-        message,
-        extra=extra_log
+        "Batch charge: %s items, %s charged", len(items), len(new_txs)
     )
-    await session.commit()
+    # commit, потім оновлення кешу балансу
+    await balance_service.commit()
 
-    return result_back
+    return CreditsChargeBatchResponse(
+        total=len(items),
+        charged=len(new_txs),
+        results=[results_by_operation[item.operation_id] for item in items]
+    )
@@ -1,26 +1,35 @@
-from typing import Optional, List
+from typing import Optional, Literal
 
-from fastapi import APIRouter, status, Depends, HTTPException, Query
-from sqlalchemy import select, func
+from fastapi import APIRouter, status, Depends, HTTPException, Query, Response
+from sqlalchemy import select, func, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
+from app.core.config import config
 from app.core.dependencies import get_session, get_current_user, get_balance_service
-from app.models import TransactionSource, TransactionType, Transaction
-from app.models.subscription import SubscriptionPlan, Subscription
+from app.models import (
+    TransactionSource, TransactionType, Transaction, TransactionCounter
+)
+from app.models.subscription import SubscriptionPlan
 from app.schemas.base import UserCreditsBase
-from app.schemas.credits import CreditsPurchaseResponse, CreditsPurchasePayload
-from app.schemas.serializers import serialize_transaction
+from app.schemas.credits import (
+    CreditsPurchaseResponse, CreditsPurchasePayload, CreditsAddRequest
+)
+from app.schemas.serializers import (
+    serialize_transactions, TRANSACTION_DETAIL_COLUMNS
+)
 from app.schemas.subscription import (
     SubscriptionPlanPublicList, UserSubscriptionResponse,
     SubscriptionPlanPublicDetail
 )
 from app.schemas.transactions import TransactionPublicPaginatedList
-from app.utils.common import is_payment_complete
+from app.utils.common import is_payment_complete, get_user_plan
+from app.utils.export import export_query, export_response
 from app.utils.http_client import call_internal_api
-from app.utils.idempotency import check_idempotency
+from app.utils.idempotency import check_idempotency, get_idempotent_response
 from app.utils.logging import get_extra_data_log
+from app.utils.pagination import encode_cursor, decode_cursor
 from app.utils.service_balance import BalanceService
+from app.utils.service_credits import add_credits
 
 import logging
 
@@ -102,7 +111,8 @@ async def list_available_subscription_plans(
 async def credits_purchase_by_user(
         payload: CreditsPurchasePayload,
         user_id: str = Depends(get_current_user),
-        session: AsyncSession = Depends(get_session)
+        session: AsyncSession = Depends(get_session),
+        balance_service: BalanceService = Depends(get_balance_service)
 ):
 
     source = TransactionSource.PURCHASE.value
@@ -117,6 +127,23 @@ async def credits_purchase_by_user(
     # для демонстрації роботи тестового у public API
     operation_id = f"op_user_{payload.payment_method_id}"
 
+    # Redis fast path ідемпотентності: відповідь /credits/add без БД
+    cached = await get_idempotent_response(
+        operation_id, TransactionType.ADD.value
+    )
+    if cached is not None:
+        logger.info(
+            "Found duplicate operation. Cached response:",
+            extra={"operation_id": operation_id}
+        )
+        return CreditsPurchaseResponse(
+            success=True,
+            transaction_id=cached["transaction_id"],
+            amount_usd=payload.amount_usd,
+            credits_added=cached["credits_added"],
+            new_balance=cached["balance_after"]
+        )
+
     # Перевіряємо ідемпотентність
     is_duplicate, existing_tx = await check_idempotency(
         session=session,
@@ -148,8 +175,18 @@ async def credits_purchase_by_user(
 
         logger.info("Credits purchase by user. Request: ", extra=internal_payload)
 
-        internal_result = await call_internal_api(
-            "/api/internal/credits/add", internal_payload)
+        if config.INTERNAL_API_MODE == "local":
+            # той самий процес: без HTTP, JSON та другої сесії
+            internal_result = (await add_credits(
+                CreditsAddRequest(**internal_payload),
+                session,
+                balance_service,
+                logger
+            )).model_dump()
+        else:
+            # operation_id робить виклик ідемпотентним - повтори безпечні
+            internal_result = await call_internal_api(
+                "/api/internal/credits/add", internal_payload, idempotent=True)
 
         logger.info("Changed credits. Response:", extra=internal_result)
 
@@ -210,22 +247,15 @@ async def user_subscription(
     session: AsyncSession = Depends(get_session),
     balance_service: BalanceService = Depends(get_balance_service)
 ):
-    # підписка та план підписки
-    result = await session.execute(
-        select(Subscription)
-        .options(selectinload(Subscription.plan))
-        .where(Subscription.user_id == user_id)
-    )
-    subscription: Subscription | None = result.scalar_one_or_none()
+    # план підписки (з in-process реєстру)
+    plan = await get_user_plan(session, user_id)
 
-    if not subscription:
+    if plan is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Subscription of user '{user_id}' not found."
         )
 
-    plan = subscription.plan
-
     # кредити
     user_credits = await balance_service.get_credits(user_id)
 
@@ -251,9 +281,22 @@ async def user_subscription(
 @public_router.get(
     "/transactions",
     summary="Історія транзакцій",
+    description=(
+        "Пагінація: offset або cursor (next_cursor з попередньої сторінки). "
+        "Cursor-режим не залежить від глибини сторінки; "
+        "include_total=false не рахує total."
+    ),
     response_model=TransactionPublicPaginatedList,
     status_code=status.HTTP_200_OK,
     responses={
+        400: {
+            "description": "Bad request.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Invalid cursor."}
+                },
+            },
+        },
         401: {
             "description": "Unauthorized.",
             "content": {
@@ -283,35 +326,128 @@ async def user_subscription(
 async def list_user_transactions(
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor попередньої сторінки"),
+    include_total: bool = Query(True),
     type: Optional[TransactionType] = Query(None),
     user_id: str = Depends(get_current_user),
     session: AsyncSession = Depends(get_session)
 ):
-    # базовий запит
-    stmt = select(Transaction).where(Transaction.user_id == user_id)
+    # базовий запит: лише колонки відповіді, рядки без ORM-об'єктів
+    stmt = (
+        select(*TRANSACTION_DETAIL_COLUMNS)
+        .where(Transaction.user_id == user_id)
+    )
 
     # фільтр по типу
     if type:
         stmt = stmt.where(Transaction.type == type.value.upper())
 
-    # підрахунок total
-    count_stmt = (select(func.count()).select_from(Transaction)
-                  .where(Transaction.user_id == user_id))
-    if type:
-        count_stmt = count_stmt.where(Transaction.type == type.value.upper())
-    total_result = await session.execute(count_stmt)
-    total = total_result.scalar_one()
+    # total - з лічильників transaction_counters (без COUNT(*) по історії)
+    total = None
+    if include_total:
+        count_stmt = (
+            select(func.coalesce(func.sum(TransactionCounter.count), 0))
+            .where(TransactionCounter.user_id == user_id)
+        )
+        if type:
+            count_stmt = count_stmt.where(TransactionCounter.type == type)
+        total_result = await session.execute(count_stmt)
+        # SUM(bigint) повертає numeric - model_construct не приводить тип
+        total = int(total_result.scalar_one())
+
+    # пагінація: keyset по індексу (user_id, created_at DESC, id DESC)
+    # замість OFFSET, якщо передано cursor
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        stmt = stmt.where(
+            tuple_(Transaction.created_at, Transaction.id)
+            < tuple_(cursor_created_at, cursor_id)
+        )
+        offset = 0
 
-    # пагінація
-    stmt = stmt.order_by(Transaction.created_at.desc()).limit(limit).offset(offset)
+    stmt = (
+        stmt.order_by(Transaction.created_at.desc(), Transaction.id.desc())
+        .limit(limit + 1)
+        .offset(offset)
+    )
     result = await session.execute(stmt)
-    db_transactions: List[Transaction] = result.scalars().all()
-
-    transactions = [serialize_transaction(t) for t in db_transactions]
-
-    return TransactionPublicPaginatedList(
+    db_transactions = result.all()
+
+    # зайвий рядок лише показує, що є наступна сторінка
+    next_cursor = None
+    if len(db_transactions) > limit:
+        db_transactions = db_transactions[:limit]
+        last = db_transactions[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    # одна валідація списку (TypeAdapter), JSON одразу через pydantic-core
+    # без повторної валідації response_model та stdlib json
+    page = TransactionPublicPaginatedList.model_construct(
         total=total,
         limit=limit,
         offset=offset,
-        transactions=transactions
+        transactions=serialize_transactions(db_transactions),
+        next_cursor=next_cursor
+    )
+
+    return Response(
+        content=page.model_dump_json(), media_type="application/json"
+    )
+
+
+@public_router.get(
+    "/transactions/export",
+    summary="Експорт усієї історії транзакцій (NDJSON/CSV)",
+    description=(
+        "Доступ для user з token. Headers: Authorization: Bearer {user_token}. "
+        "Відповідь стрімиться частинами, gzip - опційно."
+    ),
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Transactions stream.",
+            "content": {"application/x-ndjson": {}, "text/csv": {}},
+        },
+        401: {
+            "description": "Unauthorized.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Not authenticated."}
+                },
+            },
+        },
+        403: {
+            "description": "Forbidden.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Invalid user token."}
+                },
+            },
+        },
+        500: {
+            "description": "Internal Server Error.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Internal Server Error."}
+                }
+            },
+        },
+    },
+)
+async def export_user_transactions(
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    gzip: bool = Query(False),
+    type: Optional[TransactionType] = Query(None),
+    user_id: str = Depends(get_current_user)
+):
+    stmt = (
+        export_query()
+        .where(Transaction.user_id == user_id)
+        .order_by(Transaction.created_at.desc(), Transaction.id.desc())
+    )
+    if type:
+        stmt = stmt.where(Transaction.type == type)
+
+    return export_response(
+        stmt, format, compress=gzip, filename=f"transactions_{user_id}"
     )
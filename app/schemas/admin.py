@@ -1,3 +1,5 @@
+from typing import Dict
+
 from pydantic import BaseModel
 
 
@@ -14,3 +16,31 @@ class ExchangeRateResponse(BaseModel):
 	class Config:
 		from_attributes = True
 
+
+class CacheTierStats(BaseModel):
+	hits: int
+	misses: int
+
+
+class CacheStatsResponse(BaseModel):
+	local_cache_enabled: bool
+	# кеш (balance/subscription) -> рівень (l1/redis) -> лічильники
+	caches: Dict[str, Dict[str, CacheTierStats]]
+
+
+class HttpClientStatsResponse(BaseModel):
+	requests: int
+	in_flight: int
+	max_in_flight: int
+	# нові TCP з'єднання; requests - connections_opened = reuse з пулу
+	connections_opened: int
+	retries: int
+	errors: int
+
+
+class LoggingStatsResponse(BaseModel):
+	overflow_policy: str
+	# записи, що чекають на запис у файли
+	queued: int
+	# відкинуті через переповнену чергу
+	dropped: int
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Dict
+from typing import Dict, List, Literal
 
 from pydantic import BaseModel
 
@@ -34,6 +34,26 @@ class StatisticsResponse(BaseModel):
 	transactions: StatisticsTransactions
 
 
+class StatisticsSeriesPoint(BaseModel):
+	bucket: datetime  # початок бакета (UTC)
+	tier: str
+	charges: int
+	additions: int
+	subscriptions: int
+	credits_charged: int
+	credits_added: int
+	credits_granted: int
+	cost_usd: float
+	amount_usd: float
+
+
+class StatisticsSeriesResponse(BaseModel):
+	bucket: Literal["hour", "day"]
+	start: datetime
+	end: datetime
+	points: List[StatisticsSeriesPoint]
+
+
 # problem: circular import
 class UserCreditsBase(BaseModel):
 	balance: int
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, List, Union
 from pydantic import BaseModel, Field
 
 from app.schemas.subscription import SubscriptionPlanInternal
@@ -29,6 +29,20 @@ class CreditsUserCheckResponse(BaseModel):
 	multiplier: float
 
 
+class CreditsUserCheckItem(BaseModel):
+	user_id: str
+	required_credits: Optional[int] = None
+
+
+class CreditsUserCheckBatchRequest(BaseModel):
+	users: List[CreditsUserCheckItem] = Field(..., min_length=1, max_length=1000)
+
+
+class CreditsUserCheckBatchResponse(BaseModel):
+	results: List[CreditsUserCheckResponse]
+	not_found: List[str]
+
+
 class CreditsAddRequest(BaseModel):
 	user_id: str
 	amount_usd: float = Field(..., gt=0)
@@ -73,9 +87,10 @@ class CreditsChargeNoSuccessResponse(BaseModel):
 	success: bool = False
 	error: str
 	user_id: str
-	required_credits: int
-	current_balance: int
-	deficit: int
+	# None: не розраховувалось (user не знайдено, немає підписки, конфлікт типу)
+	required_credits: Optional[int] = None
+	current_balance: Optional[int] = None
+	deficit: Optional[int] = None
 
 
 class CreditsChargeSuccessResponse(BaseModel):
@@ -89,6 +104,18 @@ class CreditsChargeSuccessResponse(BaseModel):
 	operation_id: str
 
 
+class CreditsChargeBatchRequest(BaseModel):
+	items: List[CreditsChargeRequest] = Field(..., min_length=1, max_length=1000)
+
+
+class CreditsChargeBatchResponse(BaseModel):
+	total: int
+	charged: int
+	results: List[
+		Union[CreditsChargeSuccessResponse, CreditsChargeNoSuccessResponse]
+	]
+
+
 # **************    Public
 class CreditsPurchasePayload(BaseModel):
 	amount_usd: float
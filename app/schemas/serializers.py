@@ -1,12 +1,40 @@
+from typing import Iterable, List
+
+from pydantic import TypeAdapter
+
 from app.models import Transaction, TransactionType
 from app.schemas.transactions import (
 	TransactionDetail, ChargeTransaction, AddTransaction,
     SubscriptionTransaction
 )
 
+TRANSACTION_MODELS = {
+    TransactionType.CHARGE: ChargeTransaction,
+    TransactionType.ADD: AddTransaction,
+    TransactionType.SUBSCRIPTION: SubscriptionTransaction,
+}
 
-def serialize_transaction(tx: Transaction) -> TransactionDetail:
-    tx_dict = {
+# валідація всього списку одним викликом (pydantic-core)
+transaction_list_adapter = TypeAdapter(List[TransactionDetail])
+
+# лише колонки відповіді історії (без info/source/balance_before):
+# запит повертає рядки-кортежі замість ORM-об'єктів
+TRANSACTION_DETAIL_COLUMNS = (
+    Transaction.id,
+    Transaction.type,
+    Transaction.created_at,
+    Transaction.credits,
+    Transaction.balance_after,
+    Transaction.description,
+    Transaction.operation_id,
+    Transaction.cost_usd,
+    Transaction.amount_usd,
+)
+
+
+def _transaction_dict(tx) -> dict:
+    # tx - Transaction або рядок select(*TRANSACTION_DETAIL_COLUMNS)
+    return {
         "id": tx.id,
         "type": tx.type.value,
         "created_at": tx.created_at,
@@ -18,9 +46,14 @@ def serialize_transaction(tx: Transaction) -> TransactionDetail:
         "amount_usd": tx.amount_usd,
     }
 
-    if tx.type == TransactionType.CHARGE:
-        return ChargeTransaction.model_validate(tx_dict)
-    elif tx.type == TransactionType.ADD:
-        return AddTransaction.model_validate(tx_dict)
-    elif tx.type == TransactionType.SUBSCRIPTION:
-        return SubscriptionTransaction.model_validate(tx_dict)
+
+def serialize_transaction(tx: Transaction) -> TransactionDetail:
+    return TRANSACTION_MODELS[tx.type].model_validate(_transaction_dict(tx))
+
+
+def serialize_transactions(txs: Iterable) -> List[TransactionDetail]:
+    """Одна валідація TypeAdapter на весь список (discriminated union за type)"""
+    return transaction_list_adapter.validate_python(
+        [_transaction_dict(tx) for tx in txs]
+    )
+
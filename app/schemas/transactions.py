@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional, Literal, Union
+from typing import Annotated, List, Optional, Literal, Union
 
 from pydantic import (
 	BaseModel, Field, field_serializer, ConfigDict, computed_field
@@ -54,11 +54,16 @@ class SubscriptionTransaction(TransactionBase):
 	type: Literal["subscription"]
 
 
-TransactionDetail = Union[ChargeTransaction, AddTransaction, SubscriptionTransaction]
+# discriminated union: модель обирається за type без перебору варіантів
+TransactionDetail = Annotated[
+	Union[ChargeTransaction, AddTransaction, SubscriptionTransaction],
+	Field(discriminator="type")
+]
 
 
 class TransactionPublicPaginatedList(BaseModel):
-	total: int
+	total: Optional[int] = None  # None, якщо include_total=false
 	limit: int
 	offset: int
 	transactions: List[TransactionDetail]
+	next_cursor: Optional[str] = None  # cursor наступної сторінки (None - кінець)
@@ -0,0 +1,349 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import AsyncIterator, Iterator, List, Optional, Set
+
+from sqlalchemy import select, delete, func, tuple_, update, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import config
+from app.models import Transaction, TransactionCounter
+from app.utils.export import EXPORT_BATCH_SIZE, export_query, row_to_dict
+from app.utils.partitions import add_months, drop_partition, month_start
+from app.utils.rollup import day_start
+from app.utils.statistics import refresh_statistics_rollup
+
+logger = logging.getLogger(__name__)
+
+# єдиний формат файлів архіву: NDJSON + gzip, лише stdlib - будь-який
+# worker читає файли, записані будь-яким іншим (без опційних залежностей)
+FORMAT_NDJSON = "ndjson.gz"
+
+MANIFEST_FILE = "manifest.json"
+
+# зменшення лічильників на видалені (архівовані) транзакції: Core UPDATE
+# (executemany по user_id, type - без ORM bulk update по первинному ключу)
+_counters = TransactionCounter.__table__
+_DECREMENT_COUNTER = (
+    update(_counters)
+    .where(_counters.c.user_id == bindparam("b_user_id"))
+    .where(_counters.c.type == bindparam("b_type"))
+    .values(count=_counters.c.count - bindparam("b_count"))
+)
+
+
+def archive_root() -> str:
+    return os.path.join(config.ARCHIVE_DIR, "transactions")
+
+
+def _month_key(month: date) -> str:
+    return month.strftime("%Y-%m")
+
+
+def _encode_row(item: dict) -> str:
+    # явне кодування (не json_dumps з опційним orjson): однаковий файл
+    # незалежно від встановлених пакетів worker'а
+    return json.dumps(
+        dict(item, created_at=item["created_at"].isoformat()),
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+
+
+# **************    manifest
+# (ключ файлу, manifest): manifest перечитується лише після його заміни
+_manifest_cache: Optional[tuple] = None
+
+
+def _manifest_path() -> str:
+    return os.path.join(archive_root(), MANIFEST_FILE)
+
+
+def _read_manifest() -> dict:
+    try:
+        with open(_manifest_path(), encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {"archived_before": None, "months": {}}
+
+
+def load_manifest() -> dict:
+    """
+    manifest.json архіву (лише для читання - кешується в процесі):
+    archived_before - межа: транзакції раніше неї читаються лише з файлів,
+    months - {"YYYY-MM": {files: [{file, format, rows, sha256}], rows,
+    archived_at, pending_delete}}
+    На запит - лише stat() файлу; JSON читається заново, тільки якщо
+    архіватор (в будь-якому процесі) замінив manifest.
+    """
+    global _manifest_cache
+    try:
+        stat = os.stat(_manifest_path())
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        key = None
+
+    if _manifest_cache is None or _manifest_cache[0] != key:
+        _manifest_cache = (key, _read_manifest())
+    return _manifest_cache[1]
+
+
+def _save_manifest(manifest: dict):
+    # атомарна заміна: читачі бачать або старий, або новий manifest
+    path = _manifest_path()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def archive_horizon(manifest: Optional[dict] = None) -> Optional[datetime]:
+    """Транзакції з created_at раніше цієї межі - лише в архіві (None - архіву немає)"""
+    manifest = manifest or load_manifest()
+    if not manifest["archived_before"]:
+        return None
+    return datetime.fromisoformat(manifest["archived_before"])
+
+
+# **************    запис
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _MonthWriter:
+    """Файл місяця: NDJSON + gzip (пишеться у .tmp, потім атомарна заміна)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.format = FORMAT_NDJSON
+        self.writer = gzip.open(self.tmp_path, "wt", encoding="utf-8")
+
+    def write(self, items: List[dict]):
+        self.writer.write("".join(_encode_row(item) + "\n" for item in items))
+
+    def close(self):
+        self.writer.close()
+        with open(self.tmp_path, "rb") as file:
+            os.fsync(file.fileno())
+        os.replace(self.tmp_path, self.path)
+
+
+def _month_range(month: date):
+    return (
+        Transaction.created_at >= day_start(month),
+        Transaction.created_at < day_start(add_months(month, 1)),
+    )
+
+
+async def _write_month(session: AsyncSession, month: date, part: int) -> dict:
+    """Рядки місяця (у порядку created_at, id) -> новий файл month=YYYY-MM/part-N"""
+    directory = f"month={_month_key(month)}"
+    os.makedirs(os.path.join(archive_root(), directory), exist_ok=True)
+    filename = f"{directory}/part-{part}.{FORMAT_NDJSON}"
+
+    writer = _MonthWriter(os.path.join(archive_root(), filename))
+    rows = 0
+    stmt = (
+        export_query()
+        .where(*_month_range(month))
+        .order_by(Transaction.created_at, Transaction.id)
+    )
+    result = await session.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    async for batch in result.partitions(EXPORT_BATCH_SIZE):
+        writer.write([row_to_dict(row) for row in batch])
+        rows += len(batch)
+    writer.close()
+
+    return {
+        "file": filename,
+        "format": writer.format,
+        "rows": rows,
+        "sha256": _file_sha256(writer.path),
+    }
+
+
+async def _delete_month(session: AsyncSession, month: date) -> int:
+    """
+    Видаляє рядки місяця пачками по ARCHIVE_BATCH_SIZE (commit на пачку -
+    короткі блокування) разом зі зменшенням transaction_counters,
+    потім - порожню партицію місяця (drop_partition). transaction_operations лишаються:
+    архівований operation_id не може бути виконаний вдруге.
+    """
+    batch = (
+        select(Transaction.id, Transaction.created_at)
+        .where(*_month_range(month))
+        .limit(config.ARCHIVE_BATCH_SIZE)
+    )
+    stmt = (
+        delete(Transaction)
+        .where(tuple_(Transaction.id, Transaction.created_at).in_(batch))
+        .returning(Transaction.user_id, Transaction.type)
+        .execution_options(synchronize_session=False)
+    )
+
+    deleted = 0
+    while True:
+        result = await session.execute(stmt)
+        counts = Counter(result.all())
+        if counts:
+            await session.execute(
+                _DECREMENT_COUNTER,
+                [
+                    {"b_user_id": user_id, "b_type": tx_type, "b_count": count}
+                    for (user_id, tx_type), count in sorted(
+                        counts.items(), key=lambda item: (item[0][0], item[0][1].name)
+                    )
+                ],
+            )
+        await session.commit()
+
+        batch_size = sum(counts.values())
+        deleted += batch_size
+        if batch_size < config.ARCHIVE_BATCH_SIZE:
+            break
+
+    # рядків вже немає: партиція від'єднується і видаляється без
+    # ACCESS EXCLUSIVE на transactions на весь час DROP
+    await drop_partition(session.bind, month)
+    return deleted
+
+
+async def archive_transactions(
+    session: AsyncSession,
+    retention_months: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> List[dict]:
+    """
+    Переносить транзакції місяців, старших за retention_months, у файли
+    ARCHIVE_DIR/transactions/month=YYYY-MM/ і видаляє їх з БД.
+    Місяць архівується лише після його денних rollups (/statistics бере
+    архівні дні з daily_usage_rollup). Файл і manifest записуються до
+    видалення; перерване видалення продовжується наступним запуском.
+    Повертає записи manifest архівованих місяців.
+    """
+    if retention_months is None:
+        retention_months = config.ARCHIVE_RETENTION_MONTHS
+    now = now or datetime.now(timezone.utc)
+    cutoff = add_months(
+        month_start(now.astimezone(timezone.utc).date()), -retention_months
+    )
+
+    rolled_through = await refresh_statistics_rollup(session)
+    os.makedirs(archive_root(), exist_ok=True)
+    # власна копія: manifest змінюється тут і не має впливати на кеш читачів
+    manifest = _read_manifest()
+
+    # файл вже записаний, але попередній запуск не встиг видалити рядки
+    for key, entry in sorted(manifest["months"].items()):
+        if entry["pending_delete"]:
+            await _delete_month(session, datetime.strptime(key, "%Y-%m").date())
+            entry["pending_delete"] = False
+            _save_manifest(manifest)
+
+    result = await session.execute(select(func.min(Transaction.created_at)))
+    first_created_at = result.scalar_one_or_none()
+    if first_created_at is None:
+        return []
+
+    archived = []
+    month = month_start(first_created_at.astimezone(timezone.utc).date())
+    while month < cutoff:
+        month_end = add_months(month, 1) - timedelta(days=1)
+        if rolled_through is None or rolled_through < month_end:
+            logger.warning("Month %s is not rolled up yet, archiving stopped", month)
+            break
+
+        result = await session.execute(
+            select(Transaction.id).where(*_month_range(month)).limit(1)
+        )
+        if result.first() is not None:
+            key = _month_key(month)
+            entry = manifest["months"].setdefault(key, {"files": [], "rows": 0})
+            written = await _write_month(session, month, len(entry["files"]))
+            entry["files"].append(written)
+            entry["rows"] += written["rows"]
+            entry["archived_at"] = now.isoformat()
+            entry["pending_delete"] = True
+
+        # з цього моменту рядки місяця читаються лише з архіву
+        manifest["archived_before"] = day_start(add_months(month, 1)).isoformat()
+        _save_manifest(manifest)
+
+        entry = manifest["months"].get(_month_key(month))
+        if entry is not None and entry["pending_delete"]:
+            deleted = await _delete_month(session, month)
+            entry["pending_delete"] = False
+            _save_manifest(manifest)
+            logger.info("Archived %s: %s transactions", _month_key(month), deleted)
+            archived.append({"month": _month_key(month), **entry})
+
+        month = add_months(month, 1)
+
+    return archived
+
+
+# **************    читання
+def _read_file(path: str, fmt: str) -> Iterator[List[dict]]:
+    """Пачки рядків файлу у формі row_to_dict (created_at - datetime UTC)"""
+    if fmt != FORMAT_NDJSON:
+        raise RuntimeError(f"Unsupported archive file format '{fmt}': {path}")
+
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        items = []
+        for line in file:
+            item = json.loads(line)
+            item["created_at"] = datetime.fromisoformat(item["created_at"])
+            items.append(item)
+            if len(items) >= EXPORT_BATCH_SIZE:
+                yield items
+                items = []
+        if items:
+            yield items
+
+
+async def iter_archived(
+    start: datetime,
+    end: datetime,
+    user_ids: Optional[Set[str]] = None,
+) -> AsyncIterator[List[dict]]:
+    """
+    Архівовані транзакції з created_at у [start, end) (опційно - лише
+    user_ids) пачками, у порядку (created_at, id). Файли читаються у
+    thread pool, щоб не блокувати event loop.
+    """
+    manifest = load_manifest()
+    horizon = archive_horizon(manifest)
+    if horizon is None or start >= horizon:
+        return
+
+    month = month_start(start.astimezone(timezone.utc).date())
+    while day_start(month) < min(end, horizon):
+        entry = manifest["months"].get(_month_key(month))
+        for part in (entry or {}).get("files", []):
+            batches = _read_file(
+                os.path.join(archive_root(), part["file"]), part["format"]
+            )
+            while True:
+                items = await asyncio.to_thread(next, batches, None)
+                if items is None:
+                    break
+                items = [
+                    item for item in items
+                    if start <= item["created_at"] < end
+                    and (user_ids is None or item["user_id"] in user_ids)
+                ]
+                if items:
+                    yield items
+        month = add_months(month, 1)
@@ -1,9 +1,36 @@
-from typing import Tuple
+from typing import Tuple, Optional
 
 from fastapi import HTTPException, status
-from sqlalchemy import select
+from sqlalchemy import select, bindparam
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models import Settings, User, SubscriptionPlan
+from app.core.config import config
+from app.models import Settings, Subscription
+from app.utils.invalidation import (
+	register_invalidation_handler, publish_invalidation
+)
+from app.utils.local_cache import LocalCache, MISSING
+from app.utils.plan_registry import plan_registry, PlanInfo
+
+# L1 кеш user_id -> plan_id (None - немає підписки)
+SUBSCRIPTION_INVALIDATION = "subscription"
+subscription_local_cache = LocalCache("subscription")
+register_invalidation_handler(
+	SUBSCRIPTION_INVALIDATION, subscription_local_cache.invalidate
+)
+
+# негативний кеш users: user_id -> False (404, завжди увімкнений).
+# Users створюються поза сервісом, тому записи короткі;
+# зовнішній сервіс може інвалідувати їх повідомленням kind="user"
+USER_EXISTENCE_INVALIDATION = "user"
+user_existence_cache = LocalCache("user_existence", always_enabled=True)
+register_invalidation_handler(
+	USER_EXISTENCE_INVALIDATION, user_existence_cache.invalidate
+)
+
+# гарячі запити - на рівні модуля (ключ кешу компіляції будується один раз)
+_USER_PLAN_ID = select(Subscription.plan_id).where(
+	Subscription.user_id == bindparam("user_id")
+)
 
 
 def generate_transaction_id(operation_id: str) -> str:
@@ -34,32 +61,59 @@ async def get_base_rate_from_settings(
 	return (settings.base_rate, created, settings)
 
 
-async def user_existing_check(session: AsyncSession, user_id: str):
-	"""
-	Перевіряє, чи користувач існує в базі даних.
-	Якщо ні, генерує виняток.
-	"""
-	user = await session.get(User, user_id)
-	if not user:
-		raise HTTPException(
-			status_code=status.HTTP_404_NOT_FOUND,
-			detail=f"User '{user_id}' not found.",
-		)
+def remember_missing_user(user_id: str, generation: int):
+	"""Запам'ятати 404 на EXISTENCE_NEGATIVE_TTL_SECONDS"""
+	user_existence_cache.set(
+		user_id,
+		False,
+		generation,
+		ttl_seconds=config.EXISTENCE_NEGATIVE_TTL_SECONDS,
+	)
+
+
+def raise_user_not_found(user_id: str):
+	raise HTTPException(
+		status_code=status.HTTP_404_NOT_FOUND,
+		detail=f"User '{user_id}' not found.",
+	)
 
 
 async def tier_existing_check(session: AsyncSession, tier: str):
 	"""
-	Перевіряє, чи tier існує в базі даних.
+	Перевіряє, чи tier існує (in-process реєстр планів з негативним кешем).
 	Якщо ні, генерує виняток.
 	"""
-	ex_tier = await session.get(SubscriptionPlan, tier)
-	if not ex_tier:
+	if not await plan_registry.tier_exists(session, tier):
 		raise HTTPException(
 			status_code=status.HTTP_404_NOT_FOUND,
 			detail=f"Subscription Plan '{tier}' not found.",
 		)
 
 
+async def get_user_plan(session: AsyncSession, user_id: str) -> Optional[PlanInfo]:
+	"""
+	Повертає план підписки користувача або None, якщо підписки немає.
+	З БД (або L1 кешу) читається лише plan_id, значення плану - з in-process реєстру.
+	"""
+	plan_id = subscription_local_cache.get(user_id)
+	if plan_id is MISSING:
+		generation = subscription_local_cache.generation()
+		result = await session.execute(_USER_PLAN_ID, {"user_id": user_id})
+		plan_id = result.scalar_one_or_none()
+		subscription_local_cache.set(user_id, plan_id, generation)
+
+	if plan_id is None:
+		return None
+
+	return await plan_registry.get_plan(session, plan_id)
+
+
+async def invalidate_user_subscription(user_id: str):
+	"""Викликати після commit зміни підписки користувача"""
+	if subscription_local_cache.enabled:
+		await publish_invalidation(SUBSCRIPTION_INVALIDATION, user_id)
+
+
 def calculate_credits_amount(cost_usd: float, multiplier: float, base_rate: int) -> int:
 	return round(cost_usd * multiplier * base_rate)
 
@@ -0,0 +1,140 @@
+import csv
+import io
+import zlib
+from typing import AsyncIterator, Iterable, List, Optional
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select, select
+
+from app.core.database import async_session
+from app.models import Transaction
+from app.utils.json_encoding import json_dumps
+
+# рядків на один fetch з server-side cursor та один chunk відповіді
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = (
+    Transaction.id,
+    Transaction.user_id,
+    Transaction.type,
+    Transaction.source,
+    Transaction.operation_id,
+    Transaction.cost_usd,
+    Transaction.amount_usd,
+    Transaction.credits,
+    Transaction.balance_before,
+    Transaction.balance_after,
+    Transaction.description,
+    Transaction.info,
+    Transaction.created_at,
+)
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def export_query() -> Select:
+    """Базовий запит експорту (лише потрібні колонки, без ORM-об'єктів)"""
+    return select(*EXPORT_COLUMNS)
+
+
+def row_to_dict(row) -> dict:
+    """Рядок export_query() -> dict (enum - значення, created_at - datetime)"""
+    data = dict(row._mapping)
+    data["type"] = row.type.value
+    data["source"] = row.source.value if row.source is not None else None
+    return data
+
+
+def _export_dict(data: dict) -> dict:
+    created_at = data["created_at"]
+    return dict(data, created_at=created_at.isoformat() if created_at else None)
+
+
+def _encode_ndjson(items: Iterable[dict]) -> str:
+    return "".join(json_dumps(_export_dict(item)) + "\n" for item in items)
+
+
+def _encode_csv(items: Iterable[dict], header: bool) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    if header:
+        writer.writeheader()
+    for item in items:
+        data = _export_dict(item)
+        data["info"] = json_dumps(data["info"])
+        writer.writerow(data)
+    return buffer.getvalue()
+
+
+async def _batches(
+    stmt: Select, archived: Optional[AsyncIterator[List[dict]]]
+) -> AsyncIterator[List[dict]]:
+    # архівовані місяці (якщо є) старші за всі рядки БД - йдуть першими
+    if archived is not None:
+        async for items in archived:
+            yield items
+
+    # власна сесія: відповідь стрімиться вже після закриття сесії запиту
+    async with async_session() as session:
+        result = await session.stream(
+            stmt.execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for rows in result.partitions(EXPORT_BATCH_SIZE):
+            yield [row_to_dict(row) for row in rows]
+
+
+async def _stream_rows(
+    stmt: Select,
+    fmt: str,
+    compress: bool,
+    archived: Optional[AsyncIterator[List[dict]]] = None,
+) -> AsyncIterator[bytes]:
+    gzip = zlib.compressobj(wbits=31) if compress else None
+    header = fmt == "csv"
+
+    async for items in _batches(stmt, archived):
+        if fmt == "csv":
+            chunk = _encode_csv(items, header)
+            header = False
+        else:
+            chunk = _encode_ndjson(items)
+
+        data = chunk.encode()
+        if gzip is not None:
+            data = gzip.compress(data)
+        if data:
+            yield data
+
+    if header:
+        # порожній CSV - лише заголовок
+        data = _encode_csv([], True).encode()
+        yield gzip.compress(data) if gzip is not None else data
+    if gzip is not None:
+        yield gzip.flush()
+
+
+def export_response(
+    stmt: Select,
+    fmt: str,
+    compress: bool = False,
+    filename: Optional[str] = None,
+    archived: Optional[AsyncIterator[List[dict]]] = None,
+) -> StreamingResponse:
+    """
+    Стрімінговий експорт транзакцій (NDJSON або CSV, опційно gzip).
+    Рядки читаються server-side cursor пачками по EXPORT_BATCH_SIZE,
+    тому пам'ять не залежить від кількості рядків.
+    archived - пачки рядків з холодного архіву (app.utils.archive) перед БД.
+    """
+    filename = f"{filename or 'transactions'}.{fmt}"
+    media_type = MEDIA_TYPES[fmt]
+    if compress:
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        _stream_rows(stmt, fmt, compress, archived),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
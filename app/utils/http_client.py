@@ -1,21 +1,135 @@
+import asyncio
+import random
+from typing import Dict, Optional
+
 import httpx
 from fastapi import HTTPException
 
 from app.core.config import config
 
+# відповіді, на які має сенс повторити ідемпотентний виклик
+RETRY_STATUS_CODES = {502, 503, 504}
+
+# один клієнт (пул keep-alive з'єднань) на весь час життя worker
+_client: Optional[httpx.AsyncClient] = None
+
+# лічильники використання пулу поточного worker
+_stats: Dict[str, int] = {
+    "requests": 0,
+    "in_flight": 0,
+    "max_in_flight": 0,
+    "connections_opened": 0,
+    "retries": 0,
+    "errors": 0,
+}
+
+
+def _build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=f"{config.INTERNAL_HOST}:{config.INTERNAL_PORT}",
+        headers={"X-Service-Token": config.SERVICE_TOKEN},
+        limits=httpx.Limits(
+            max_connections=config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=httpx.Timeout(
+            config.HTTP_READ_TIMEOUT_SECONDS,
+            connect=config.HTTP_CONNECT_TIMEOUT_SECONDS,
+            pool=config.HTTP_CONNECT_TIMEOUT_SECONDS,
+        ),
+    )
+
+
+async def open_http_client():
+    """Lifespan: відкрити клієнт при старті worker"""
+    global _client
+    if _client is None:
+        _client = _build_client()
+
+
+async def close_http_client():
+    """Lifespan: закрити пул з'єднань при зупинці worker"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    # без lifespan (скрипти, тести) клієнт створюється при першому виклику
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
 
-async def call_internal_api(endpoint: str, payload: dict) -> dict:
+def get_http_client_stats() -> Dict[str, int]:
+    return dict(_stats)
+
+
+async def _trace(event_name: str, info: dict):
+    # httpcore повідомляє про кожне нове TCP з'єднання (не reuse з пулу)
+    if event_name == "connection.connect_tcp.complete":
+        _stats["connections_opened"] += 1
+
+
+def _retry_delay(attempt: int) -> float:
+    # exponential backoff з full jitter
+    return random.uniform(0, config.HTTP_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+
+
+async def _post(endpoint: str, payload: dict, idempotent: bool) -> httpx.Response:
+    client = get_http_client()
+    attempt = 0
+    while True:
+        _stats["requests"] += 1
+        _stats["in_flight"] += 1
+        _stats["max_in_flight"] = max(_stats["max_in_flight"], _stats["in_flight"])
+        try:
+            response = await client.post(
+                endpoint, json=payload, extensions={"trace": _trace}
+            )
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as exc:
+            # запит не було відправлено - повтор безпечний завжди
+            error = exc
+        except httpx.TransportError as exc:
+            if not idempotent:
+                _stats["errors"] += 1
+                raise HTTPException(
+                    status_code=503, detail=f"Internal API unavailable: {exc!r}"
+                )
+            error = exc
+        else:
+            if not (idempotent and response.status_code in RETRY_STATUS_CODES):
+                return response
+            error = None
+        finally:
+            _stats["in_flight"] -= 1
+
+        if attempt >= config.HTTP_RETRIES:
+            if error is None:
+                return response
+            _stats["errors"] += 1
+            raise HTTPException(
+                status_code=503, detail=f"Internal API unavailable: {error!r}"
+            )
+
+        _stats["retries"] += 1
+        await asyncio.sleep(_retry_delay(attempt))
+        attempt += 1
+
+
+async def call_internal_api(
+    endpoint: str, payload: dict, idempotent: bool = False
+) -> dict:
     """
     Викликає Internal API з переданим payload.
     Повертає JSON-відповідь або кидає HTTPException.
+    idempotent=True (payload з operation_id) - дозволяє повтори при
+    обривах з'єднання та 502/503/504.
     """
-    url = f"{config.INTERNAL_HOST}:{config.INTERNAL_PORT}{endpoint}"
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            url,
-            headers={"X-Service-Token": config.SERVICE_TOKEN},
-            json=payload,
-        )
+    response = await _post(endpoint, payload, idempotent)
 
     if response.status_code != 200:
         raise HTTPException(
@@ -1,9 +1,47 @@
-from typing import Optional, Tuple
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple, Dict, Iterable, AsyncIterator, List, Set
+
 from fastapi import HTTPException, status
-from sqlalchemy import select
+from pydantic import BaseModel
+from sqlalchemy import Select, select, bindparam, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import Transaction
+from app.core.config import config
+from app.models import Transaction, TransactionOperation
+from app.utils.redis_cache import (
+    get_redis, acquire_lock, release_lock, acquire_locks, release_locks
+)
+
+# інтервал опитування Redis, поки інший запит виконує ту саму операцію
+IDEMPOTENCY_POLL_SECONDS = 0.05
+
+
+def select_transactions_by_operation(condition) -> Select:
+    """
+    Транзакції за умовою на TransactionOperation (глобальний індекс operation_id).
+    Join по (id, created_at): created_at - ключ партиції, тож executor
+    читає лише партицію місяця транзакції, а не всі місяці.
+    """
+    return (
+        select(Transaction)
+        .join(
+            TransactionOperation,
+            and_(
+                TransactionOperation.transaction_id == Transaction.id,
+                TransactionOperation.created_at == Transaction.created_at,
+            ),
+        )
+        .where(condition)
+    )
+
+
+# запит на рівні модуля: будується (і отримує ключ кешу компіляції) один раз
+_TRANSACTION_BY_OPERATION = select_transactions_by_operation(
+    TransactionOperation.operation_id == bindparam("operation_id")
+)
 
 
 async def check_idempotency(
@@ -19,7 +57,7 @@ async def check_idempotency(
     Якщо expected_type передано і тип не збігається - кидає 409
     """
     result = await session.execute(
-        select(Transaction).where(Transaction.operation_id == operation_id)
+        _TRANSACTION_BY_OPERATION, {"operation_id": operation_id}
     )
     tx: Transaction | None = result.scalar_one_or_none()
 
@@ -27,13 +65,256 @@ async def check_idempotency(
         return False, None
 
     # Якщо є очікуваний тип операції — перевіряємо
-    if expected_type is not None and tx.type.value != expected_type:
+    if expected_type is not None:
+        check_operation_type(tx, operation_id, expected_type)
+
+    return True, tx
+
+
+def check_operation_type(tx: Transaction, operation_id: str, expected_type: str):
+    """Якщо тип існуючої транзакції не збігається з очікуваним - кидає 409"""
+    _check_type(tx.type.value, operation_id, expected_type)
+
+
+def _check_type(operation_type: str, operation_id: str, expected_type: str):
+    if operation_type != expected_type:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=(
                 f"Operation ID '{operation_id}' already used "
-                f"for different operation type: {tx.type.value}"
+                f"for different operation type: {operation_type}"
             )
         )
 
-    return True, tx
+
+def raise_operation_used(operation_id: str):
+    """
+    operation_id вже є в transaction_operations, але транзакції в БД немає
+    (перенесена в холодний архів) - повтор неможливо відтворити, лише 409
+    """
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Operation ID '{operation_id}' already used.",
+    )
+
+
+async def get_used_operations(
+    session: AsyncSession,
+    operation_ids: Iterable[str],
+) -> Set[str]:
+    """operation_id, які вже є в глобальному індексі (один запит)"""
+    operation_ids = set(operation_ids)
+    if not operation_ids:
+        return set()
+
+    result = await session.execute(
+        select(TransactionOperation.operation_id)
+        .where(TransactionOperation.operation_id.in_(operation_ids))
+    )
+    return set(result.scalars().all())
+
+
+async def get_existing_transactions(
+    session: AsyncSession,
+    operation_ids: Iterable[str],
+) -> Dict[str, Transaction]:
+    """
+    Пакетна перевірка ідемпотентності: один запит для багатьох operation_id
+    Повертає dict {operation_id: Transaction} лише для вже виконаних операцій.
+    Перевірку типу операції виконує викликач (окремо для кожного елемента).
+    """
+    operation_ids = set(operation_ids)
+    if not operation_ids:
+        return {}
+
+    result = await session.execute(
+        select_transactions_by_operation(
+            TransactionOperation.operation_id.in_(operation_ids)
+        )
+    )
+    return {tx.operation_id: tx for tx in result.scalars().all()}
+
+
+# **************    Redis fast path
+def _response_key(operation_id: str) -> str:
+    return f"idempotency:{operation_id}:response"
+
+
+def _lock_key(operation_id: str) -> str:
+    return f"idempotency:{operation_id}:lock"
+
+
+def _dump_response(operation_type: str, response: BaseModel) -> str:
+    return json.dumps({
+        "type": operation_type,
+        "response": response.model_dump(mode="json"),
+    })
+
+
+async def get_idempotent_response(
+    operation_id: str,
+    expected_type: Optional[str] = None,
+) -> Optional[dict]:
+    """
+    Повертає збережену в Redis відповідь завершеної операції (без БД) або None.
+    Якщо expected_type передано і тип не збігається - кидає 409
+    """
+    r = await get_redis()
+    cached = await r.get(_response_key(operation_id))
+    if not cached:
+        return None
+
+    data = json.loads(cached)
+    if expected_type is not None:
+        _check_type(data["type"], operation_id, expected_type)
+
+    return data["response"]
+
+
+async def save_idempotent_responses(
+    operation_type: str,
+    responses: List[Tuple[str, BaseModel]],
+):
+    """Зберегти відповіді завершених операцій (після commit!) одним pipeline"""
+    if not responses:
+        return
+
+    r = await get_redis()
+    async with r.pipeline(transaction=False) as pipe:
+        for operation_id, response in responses:
+            pipe.set(
+                _response_key(operation_id),
+                _dump_response(operation_type, response),
+                ex=config.IDEMPOTENCY_TTL_SECONDS,
+            )
+        await pipe.execute()
+
+
+class IdempotentOperation:
+    def __init__(
+        self,
+        operation_id: str,
+        operation_type: str,
+        replay: Optional[dict] = None,
+    ):
+        self.operation_id = operation_id
+        self.operation_type = operation_type
+        # відповідь першого виконання (якщо операція вже завершена)
+        self.replay = replay
+
+    async def save(self, response: BaseModel):
+        """Зберегти відповідь для повторів (викликати після commit)"""
+        await save_idempotent_responses(
+            self.operation_type, [(self.operation_id, response)]
+        )
+
+
+@asynccontextmanager
+async def idempotent_operation(
+    operation_id: str,
+    operation_type: str,
+) -> AsyncIterator[IdempotentOperation]:
+    """
+    Redis fast path ідемпотентності:
+    1) якщо відповідь вже збережена - op.replay (Postgres не використовується)
+    2) інакше ставимо in-flight маркер (SET NX); якщо його тримає інший запит
+       з тим самим operation_id - чекаємо на його результат
+    3) якщо результату так і не дочекались - звичайний DB-шлях
+       (check_idempotency / load_request_context визначить дублікат)
+    """
+    deadline = time.monotonic() + config.IDEMPOTENCY_WAIT_SECONDS
+    token = None
+
+    while True:
+        replay = await get_idempotent_response(operation_id, operation_type)
+        if replay is not None:
+            yield IdempotentOperation(operation_id, operation_type, replay)
+            return
+
+        token = await acquire_lock(
+            _lock_key(operation_id), config.IDEMPOTENCY_LOCK_SECONDS
+        )
+        if token is not None or time.monotonic() >= deadline:
+            break
+
+        await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+
+    try:
+        yield IdempotentOperation(operation_id, operation_type)
+    finally:
+        if token is not None:
+            await release_lock(_lock_key(operation_id), token)
+
+
+class IdempotentBatch:
+    def __init__(self, operation_type: str):
+        self.operation_type = operation_type
+        # operation_id -> відповідь першого виконання (операція вже завершена)
+        self.replays: Dict[str, dict] = {}
+        # operation_id -> тип операції, під яким його вже використано
+        self.conflicts: Dict[str, str] = {}
+
+    async def save(self, responses: List[Tuple[str, BaseModel]]):
+        """Зберегти відповіді нових операцій пакета (викликати після commit)"""
+        await save_idempotent_responses(
+            self.operation_type,
+            [
+                (operation_id, response) for operation_id, response in responses
+                if operation_id not in self.replays
+            ],
+        )
+
+
+@asynccontextmanager
+async def idempotent_operations(
+    operation_ids: Iterable[str],
+    operation_type: str,
+) -> AsyncIterator[IdempotentBatch]:
+    """
+    Redis fast path ідемпотентності для пакета (як idempotent_operation):
+    завершені операції - batch.replays (один MGET на прохід), операції
+    іншого типу - batch.conflicts (без 409 на весь пакет), на решту
+    ставимо in-flight маркери. Маркери беруться в порядку operation_id
+    і до першого зайнятого (його чекаємо): пакети з спільними operation_id
+    не чекають один на одного по колу. Після спільного дедлайну -
+    звичайний DB-шлях.
+    """
+    batch = IdempotentBatch(operation_type)
+    pending = sorted(set(operation_ids))
+    deadline = time.monotonic() + config.IDEMPOTENCY_WAIT_SECONDS
+    token = None
+    locked: List[str] = []
+    r = await get_redis()
+
+    try:
+        while pending:
+            cached = await r.mget([_response_key(op_id) for op_id in pending])
+            to_lock = []
+            for operation_id, value in zip(pending, cached):
+                if not value:
+                    to_lock.append(operation_id)
+                    continue
+                data = json.loads(value)
+                if data["type"] != operation_type:
+                    batch.conflicts[operation_id] = data["type"]
+                else:
+                    batch.replays[operation_id] = data["response"]
+
+            # усі маркери одним викликом Redis, по порядку до першого зайнятого
+            token, acquired = await acquire_locks(
+                [_lock_key(op_id) for op_id in to_lock],
+                config.IDEMPOTENCY_LOCK_SECONDS,
+                token,
+            )
+            locked.extend(to_lock[:acquired])
+            waiting = to_lock[acquired:]
+
+            if not waiting or time.monotonic() >= deadline:
+                break
+            pending = waiting
+            await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+
+        yield batch
+    finally:
+        if locked:
+            await release_locks([_lock_key(op_id) for op_id in locked], token)
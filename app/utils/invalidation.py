@@ -0,0 +1,68 @@
+import asyncio
+import json
+import logging
+from typing import Callable, Dict, List
+
+from app.utils.redis_cache import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Redis pub/sub канал для інвалідації in-process кешів у всіх uvicorn workers
+INVALIDATION_CHANNEL = "token_system:invalidate"
+
+# вид кешу -> обробники (key: конкретний ключ або "*" - все)
+_handlers: Dict[str, List[Callable[[str], None]]] = {}
+
+
+def register_invalidation_handler(kind: str, handler: Callable[[str], None]):
+    _handlers.setdefault(kind, []).append(handler)
+
+
+def _dispatch(kind: str, key: str):
+    for handler in _handlers.get(kind, []):
+        handler(key)
+
+
+async def publish_invalidation(kind: str, *keys: str):
+    """
+    Інвалідує кеш локально (одразу) та в інших workers (через Redis pub/sub).
+    Без keys - скидається весь кеш цього виду.
+    Викликати ПІСЛЯ commit змін у БД.
+    """
+    keys = keys or ("*",)
+    for key in keys:
+        _dispatch(kind, key)
+
+    r = await get_redis()
+    await r.publish(
+        INVALIDATION_CHANNEL, json.dumps({"kind": kind, "keys": list(keys)})
+    )
+
+
+async def listen_invalidations():
+    """
+    Фонова задача worker: слухає канал інвалідації.
+    Після (пере)підключення скидає всі кеші, бо повідомлення могли бути втрачені.
+    """
+    r = await get_redis()
+
+    while True:
+        pubsub = r.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            for kind in _handlers:
+                _dispatch(kind, "*")
+
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                data = json.loads(message["data"])
+                for key in data["keys"]:
+                    _dispatch(data["kind"], key)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Invalidation listener failed, reconnecting")
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
@@ -0,0 +1,35 @@
+import enum
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # опційна залежність: без неї - stdlib json
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    # типи, які не кодуються нативно (orjson сам кодує datetime/Enum)
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return str(value)
+
+
+if orjson is not None:
+    def json_dumps(data: Any) -> str:
+        """Компактний JSON (логи, NDJSON): orjson, інакше stdlib json"""
+        return orjson.dumps(
+            data, default=_default, option=orjson.OPT_NON_STR_KEYS
+        ).decode()
+else:
+    def json_dumps(data: Any) -> str:
+        """Компактний JSON (логи, NDJSON): orjson, інакше stdlib json"""
+        return json.dumps(
+            data, default=_default, ensure_ascii=False, separators=(",", ":")
+        )
@@ -0,0 +1,106 @@
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import insert, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import (
+    Transaction, TransactionType, TransactionCounter, TransactionOperation
+)
+from app.utils.idempotency import raise_operation_used
+
+# лічильник однієї транзакції (гарячий шлях add_transaction) - на рівні модуля
+_increment_one = pg_insert(TransactionCounter).values(
+    user_id=bindparam("b_user_id"), type=bindparam("b_type"), count=1
+)
+_INCREMENT_COUNTER = _increment_one.on_conflict_do_update(
+    index_elements=[TransactionCounter.user_id, TransactionCounter.type],
+    set_={"count": TransactionCounter.count + 1},
+)
+
+# operation_id у глобальний індекс; конфлікт - операцію вже виконано
+# (транзакція в холодному архіві або паралельний запит закомітив раніше)
+_CLAIM_OPERATION = (
+    pg_insert(TransactionOperation)
+    .values(
+        operation_id=bindparam("b_operation_id"),
+        transaction_id=bindparam("b_transaction_id"),
+        created_at=bindparam("b_created_at"),
+    )
+    .on_conflict_do_nothing(index_elements=[TransactionOperation.operation_id])
+    .returning(TransactionOperation.operation_id)
+)
+
+
+async def add_transaction(session: AsyncSession, tx: Transaction):
+    """
+    Додати транзакцію + operation_id у глобальний індекс + оновити
+    лічильник користувача (в поточній DB-транзакції, commit - на стороні виклику).
+    Якщо operation_id вже використано - 409 (DB-транзакцію відкочує виклик).
+    """
+    if tx.created_at is None:
+        # ключ партиції має бути відомий до вставки (для transaction_operations)
+        tx.created_at = datetime.now(timezone.utc)
+    result = await session.execute(
+        _CLAIM_OPERATION,
+        {
+            "b_operation_id": tx.operation_id,
+            "b_transaction_id": tx.id,
+            "b_created_at": tx.created_at,
+        },
+    )
+    if result.scalar_one_or_none() is None:
+        raise_operation_used(tx.operation_id)
+
+    session.add(tx)
+    await session.execute(
+        _INCREMENT_COUNTER, {"b_user_id": tx.user_id, "b_type": tx.type}
+    )
+
+
+async def insert_transactions(session: AsyncSession, rows: List[dict]):
+    """Bulk insert транзакцій (dicts колонок, з created_at) + operation_id + лічильники"""
+    if not rows:
+        return
+    await session.execute(insert(Transaction), rows)
+    await session.execute(
+        insert(TransactionOperation),
+        [
+            {
+                "operation_id": row["operation_id"],
+                "transaction_id": row["id"],
+                "created_at": row["created_at"],
+            }
+            for row in rows
+        ],
+    )
+    await increment_counters(
+        session, ((row["user_id"], row["type"]) for row in rows)
+    )
+
+
+async def increment_counters(
+    session: AsyncSession,
+    keys: Iterable[Tuple[str, TransactionType]],
+):
+    """
+    Один INSERT ... ON CONFLICT DO UPDATE для всіх (user_id, type).
+    Рядки оновлюються у стабільному порядку, щоб уникнути deadlock.
+    """
+    counts: Dict[Tuple[str, TransactionType], int] = Counter(keys)
+    if not counts:
+        return
+
+    stmt = pg_insert(TransactionCounter).values([
+        {"user_id": user_id, "type": tx_type, "count": count}
+        for (user_id, tx_type), count in sorted(
+            counts.items(), key=lambda item: (item[0][0], item[0][1].name)
+        )
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TransactionCounter.user_id, TransactionCounter.type],
+        set_={"count": TransactionCounter.count + stmt.excluded.count},
+    )
+    await session.execute(stmt)
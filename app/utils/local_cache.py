@@ -0,0 +1,96 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from app.core.config import config
+
+# маркер відсутності у кеші (None - теж коректне значення, напр. "немає підписки")
+MISSING = object()
+
+# лічильники hit/miss: кеш -> рівень (l1/redis/...) -> {"hits": .., "misses": ..}
+_stats: Dict[str, Dict[str, Dict[str, int]]] = {}
+
+
+def record_cache_access(cache: str, tier: str, hit: bool):
+    counters = _stats.setdefault(cache, {}).setdefault(
+        tier, {"hits": 0, "misses": 0}
+    )
+    counters["hits" if hit else "misses"] += 1
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Dict[str, int]]]:
+    """Знімок лічильників поточного worker"""
+    return {
+        cache: {tier: dict(counters) for tier, counters in tiers.items()}
+        for cache, tiers in _stats.items()
+    }
+
+
+class LocalCache:
+    """
+    In-process L1 кеш (bounded LRU з коротким TTL) перед Redis/БД.
+    Працює при LOCAL_CACHE_ENABLED (або always_enabled); узгодженість
+    між workers - через publish_invalidation після commit змін.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        always_enabled: bool = False,
+    ):
+        self.name = name
+        self.max_entries = max_entries or config.LOCAL_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds or config.LOCAL_CACHE_TTL_SECONDS
+        self.always_enabled = always_enabled
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._generation = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.always_enabled or config.LOCAL_CACHE_ENABLED
+
+    def get(self, key: Hashable) -> Any:
+        """Значення або MISSING"""
+        if not self.enabled:
+            return MISSING
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            record_cache_access(self.name, "l1", True)
+            return entry[1]
+
+        if entry is not None:
+            del self._entries[key]
+        record_cache_access(self.name, "l1", False)
+        return MISSING
+
+    def generation(self) -> int:
+        """Взяти ПЕРЕД читанням з Redis/БД і передати у set()"""
+        return self._generation
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        generation: int,
+        ttl_seconds: Optional[float] = None,
+    ):
+        # якщо під час читання прийшла інвалідація - значення могло застаріти
+        if not self.enabled or generation != self._generation:
+            return
+
+        expires_at = time.monotonic() + (ttl_seconds or self.ttl_seconds)
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: str = "*"):
+        self._generation += 1
+        if key == "*":
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
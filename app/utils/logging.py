@@ -1,14 +1,27 @@
 import random
 import logging
+from operator import attrgetter
+from typing import Callable, Dict
 
 logger = logging.getLogger(__name__)
 
+# модель -> функція obj -> dict колонок (будується один раз на клас)
+_extractors: Dict[type, Callable[[object], dict]] = {}
+
+
+def _build_extractor(model: type) -> Callable[[object], dict]:
+    names = tuple(column.name for column in model.__table__.columns)
+    getter = attrgetter(*names)
+    if len(names) == 1:
+        return lambda obj: {names[0]: getter(obj)}
+    return lambda obj: dict(zip(names, getter(obj)))
+
 
 def get_extra_data_log(obj: object) -> dict:
-    return {
-        column.name: getattr(obj, column.name)
-        for column in obj.__table__.columns
-    }
+    extractor = _extractors.get(type(obj))
+    if extractor is None:
+        extractor = _extractors[type(obj)] = _build_extractor(type(obj))
+    return extractor(obj)
 
 
 def generate_admin_log_id(operation_type: str) -> str:
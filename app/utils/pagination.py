@@ -0,0 +1,26 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Tuple
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(created_at: datetime, tx_id: str) -> str:
+    """Непрозорий cursor: позиція останнього рядка сторінки (created_at, id)"""
+    raw = json.dumps([created_at.isoformat(), tx_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Розбирає cursor; якщо він пошкоджений - 400"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, tx_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), str(tx_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor.",
+        )
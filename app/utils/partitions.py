@@ -0,0 +1,185 @@
+import asyncio
+import logging
+from datetime import date, datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app.core.config import config
+from app.core.database import async_session
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "transactions"
+DEFAULT_PARTITION = "transactions_default"
+
+# advisory lock: партиції створює лише один worker одночасно
+PARTITIONS_LOCK_ID = 7_240_001
+
+_EXISTING_PARTITIONS = text(
+    "SELECT c.relname FROM pg_inherits i "
+    "JOIN pg_class c ON c.oid = i.inhrelid "
+    "WHERE i.inhparent = CAST(:parent AS regclass)"
+)
+
+# NULL - таблиця не є партицією transactions; true - перерваний DETACH CONCURRENTLY
+_DETACH_PENDING = text(
+    "SELECT i.inhdetachpending FROM pg_inherits i "
+    "JOIN pg_class c ON c.oid = i.inhrelid "
+    "WHERE i.inhparent = CAST(:parent AS regclass) AND c.relname = :name"
+)
+
+# звичайний DETACH бере ACCESS EXCLUSIVE на transactions: чекаємо lock
+# недовго (записи не стають у чергу за ним) і повторюємо
+DETACH_LOCK_TIMEOUT_MS = 200
+DETACH_RETRY_SECONDS = 1.0
+DETACH_ATTEMPTS = 60
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year}m{month.month:02d}"
+
+
+def partition_ddl(month: date) -> str:
+    """CREATE TABLE ... PARTITION OF для місяця [month, month + 1) в UTC"""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} "
+        f"PARTITION OF {PARENT_TABLE} FOR VALUES "
+        f"FROM ('{month.isoformat()} 00:00:00+00') "
+        f"TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+    )
+
+
+def default_partition_ddl() -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} "
+        f"PARTITION OF {PARENT_TABLE} DEFAULT"
+    )
+
+
+async def ensure_transaction_partitions(
+    session: AsyncSession,
+    months_ahead: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> List[str]:
+    """
+    Створює відсутні місячні партиції transactions: поточний місяць і
+    months_ahead наступних (+ default партицію) і комітить.
+    Повертає імена створених партицій.
+    Якщо default партиція вже містить рядки місяця, партицію створити
+    неможливо - місяць пропускається з помилкою в лог.
+    """
+    if months_ahead is None:
+        months_ahead = config.TRANSACTION_PARTITIONS_AHEAD
+    now = now or datetime.now(timezone.utc)
+    current = month_start(now.astimezone(timezone.utc).date())
+
+    await session.execute(
+        text("SELECT pg_advisory_xact_lock(:lock_id)"),
+        {"lock_id": PARTITIONS_LOCK_ID},
+    )
+    result = await session.execute(_EXISTING_PARTITIONS, {"parent": PARENT_TABLE})
+    existing = set(result.scalars().all())
+
+    created: List[str] = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        name = partition_name(month)
+        if name in existing:
+            continue
+        try:
+            async with session.begin_nested():
+                await session.execute(text(partition_ddl(month)))
+        except DBAPIError:
+            logger.exception("Cannot create partition %s", name)
+            continue
+        created.append(name)
+
+    if DEFAULT_PARTITION not in existing:
+        await session.execute(text(default_partition_ddl()))
+        created.append(DEFAULT_PARTITION)
+
+    await session.commit()
+    if created:
+        logger.info("Transaction partitions created: %s", ", ".join(created))
+    return created
+
+
+async def _detach_partition(engine: AsyncEngine, name: str, has_default: bool):
+    detach = f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"
+    if not has_default:
+        # CONCURRENTLY - лише поза транзакцією, запис у transactions не блокується
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text(f"{detach} CONCURRENTLY"))
+        return
+
+    # з default партицією PostgreSQL не дозволяє CONCURRENTLY
+    for attempt in range(1, DETACH_ATTEMPTS + 1):
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(
+                    text(f"SET LOCAL lock_timeout = {DETACH_LOCK_TIMEOUT_MS}")
+                )
+                await conn.execute(text(detach))
+            return
+        except DBAPIError as exc:
+            sqlstate = getattr(exc.orig, "sqlstate", None)
+            if sqlstate != LOCK_NOT_AVAILABLE or attempt == DETACH_ATTEMPTS:
+                raise
+        await asyncio.sleep(DETACH_RETRY_SECONDS)
+
+
+async def drop_partition(engine: AsyncEngine, month: date):
+    """
+    Від'єднує (вже порожню) партицію місяця від transactions і видаляє її.
+    DROP партиції, що ще приєднана, тримав би ACCESS EXCLUSIVE на всій
+    transactions; DROP від'єднаної таблиці parent не блокує.
+    Викликати поза транзакцією сесії (після commit).
+    """
+    name = partition_name(month)
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            _DETACH_PENDING, {"parent": PARENT_TABLE, "name": name}
+        )
+        pending = result.scalar_one_or_none()
+        result = await conn.execute(_EXISTING_PARTITIONS, {"parent": PARENT_TABLE})
+        has_default = DEFAULT_PARTITION in set(result.scalars().all())
+
+    if pending:
+        # попередній DETACH CONCURRENTLY перервано - завершуємо його
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text(
+                f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name} FINALIZE"
+            ))
+    elif pending is not None:
+        await _detach_partition(engine, name, has_default)
+
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+
+
+async def run_partition_maintenance():
+    """Фонова задача worker: партиції transactions на місяці наперед"""
+    while True:
+        try:
+            async with async_session() as session:
+                await ensure_transaction_partitions(session)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Transaction partition maintenance failed")
+        await asyncio.sleep(config.PARTITION_MAINTENANCE_INTERVAL_SECONDS)
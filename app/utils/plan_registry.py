@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import time
+from decimal import Decimal
+from typing import Dict, NamedTuple, Optional
+
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import config
+from app.models import Settings, SubscriptionPlan
+from app.utils.invalidation import (
+    register_invalidation_handler, publish_invalidation
+)
+
+logger = logging.getLogger(__name__)
+
+# дефолтне значення, як у get_base_rate_from_settings
+DEFAULT_BASE_RATE = 10000
+
+PLANS_INVALIDATION = "plans"
+
+# максимум запам'ятованих неіснуючих tiers (захист від росту при 404 storm)
+MAX_MISSING_TIERS = 10000
+
+
+class PlanInfo(NamedTuple):
+    tier: str
+    name: str
+    monthly_cost: Decimal
+    fixed_cost: Decimal
+    credits_included: int
+    bonus_credits: int
+    multiplier: Decimal
+    purchase_rate: Decimal
+    active: bool
+
+
+class PlanRegistry:
+    """
+    In-process реєстр Settings.base_rate та SubscriptionPlan.
+    Змінюються лише через Admin API, тому на hot path читаються без БД.
+    Інвалідація - через Redis pub/sub (publish_invalidation) у всіх workers,
+    REGISTRY_TTL_SECONDS - страховка на випадок втрачених повідомлень.
+    """
+
+    def __init__(self):
+        self._base_rate: int = DEFAULT_BASE_RATE
+        self._plans: Dict[str, PlanInfo] = {}
+        # неіснуючі tiers -> час, до якого не перезавантажувати реєстр
+        self._missing: Dict[str, float] = {}
+        self._loaded_at: Optional[float] = None
+        # час останнього примусового перезавантаження (невідомий tier)
+        self._reloaded_at: Optional[float] = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._loaded_at is not None
+            and time.monotonic() - self._loaded_at < config.REGISTRY_TTL_SECONDS
+        )
+
+    async def load(self, session: AsyncSession):
+        """Завантажити base_rate та всі плани (2 запити)"""
+        generation = self._generation
+
+        result = await session.execute(select(Settings.base_rate))
+        base_rate = result.scalars().first()
+
+        result = await session.execute(select(SubscriptionPlan))
+        plans = {
+            plan.tier: PlanInfo(
+                tier=plan.tier,
+                name=plan.name,
+                monthly_cost=plan.monthly_cost,
+                fixed_cost=plan.fixed_cost,
+                credits_included=plan.credits_included,
+                bonus_credits=plan.bonus_credits,
+                multiplier=plan.multiplier,
+                purchase_rate=plan.purchase_rate,
+                active=plan.active,
+            )
+            for plan in result.scalars().all()
+        }
+
+        self._base_rate = base_rate if base_rate is not None else DEFAULT_BASE_RATE
+        self._plans = plans
+        # якщо під час завантаження прийшла інвалідація - дані вже застарілі
+        if generation == self._generation:
+            self._loaded_at = time.monotonic()
+
+    async def _ensure_loaded(self, session: AsyncSession):
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if not self._is_fresh():
+                await self.load(session)
+
+    async def _reload(self, session: AsyncSession):
+        """
+        Примусове перезавантаження (tier міг з'явитись в іншому worker до
+        pub/sub інвалідації) - не частіше за REGISTRY_MIN_RELOAD_SECONDS,
+        щоб потік невідомих tiers не перетворювався на запити до БД.
+        Негативний кеш _missing не скидається.
+        """
+        async with self._lock:
+            now = time.monotonic()
+            if (
+                self._reloaded_at is not None
+                and now - self._reloaded_at < config.REGISTRY_MIN_RELOAD_SECONDS
+            ):
+                return
+            self._reloaded_at = now
+            await self.load(session)
+
+    async def get_base_rate(self, session: AsyncSession) -> int:
+        await self._ensure_loaded(session)
+        return self._base_rate
+
+    async def get_plan(self, session: AsyncSession, tier: str) -> Optional[PlanInfo]:
+        """
+        Відсутність tier у реєстрі означає або застарілий реєстр
+        (перезавантажуємо, з обмеженням частоти), або неіснуючий tier -
+        його пам'ятаємо EXISTENCE_NEGATIVE_TTL_SECONDS, щоб повторні 404
+        не йшли в БД.
+        """
+        await self._ensure_loaded(session)
+        plan = self._plans.get(tier)
+        if plan is not None:
+            return plan
+
+        now = time.monotonic()
+        if self._missing.get(tier, 0) > now:
+            return None
+
+        await self._reload(session)
+        plan = self._plans.get(tier)
+        if plan is None:
+            if len(self._missing) >= MAX_MISSING_TIERS:
+                self._missing.clear()
+            self._missing[tier] = now + config.EXISTENCE_NEGATIVE_TTL_SECONDS
+        return plan
+
+    async def tier_exists(self, session: AsyncSession, tier: str) -> bool:
+        return await self.get_plan(session, tier) is not None
+
+    def invalidate(self, key: str = "*"):
+        self._generation += 1
+        self._loaded_at = None
+        self._missing.clear()
+
+    async def notify_changed(self):
+        """
+        Викликати після commit змін Settings/SubscriptionPlan в Admin API
+        (скидає і негативний кеш tiers - створений план одразу доступний).
+        Локальний реєстр скидається завжди; якщо Redis недоступний, інші
+        workers підхоплять зміни через REGISTRY_TTL_SECONDS - зміни вже
+        закомічені, тому відповідь адміністратору не має падати.
+        """
+        try:
+            await publish_invalidation(PLANS_INVALIDATION)
+        except (RedisError, OSError):
+            logger.exception("Plan registry invalidation was not published")
+
+
+plan_registry = PlanRegistry()
+register_invalidation_handler(PLANS_INVALIDATION, plan_registry.invalidate)
@@ -1,3 +1,6 @@
+import uuid
+from typing import List, Optional, Tuple
+
 import redis.asyncio as redis
 
 from app.core.config import config
@@ -13,3 +16,70 @@ redis_client = redis.from_url(
 
 async def get_redis() -> redis.Redis:
     return redis_client
+
+
+# зняти lock, лише якщо він ще наш (token збігається)
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+async def acquire_lock(key: str, ttl_seconds: float) -> Optional[str]:
+    """Короткий lock між workers (SET NX PX). Повертає token або None"""
+    token = uuid.uuid4().hex
+    acquired = await redis_client.set(
+        key, token, nx=True, px=max(int(ttl_seconds * 1000), 1)
+    )
+    return token if acquired else None
+
+
+async def release_lock(key: str, token: str):
+    await redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, key, token)
+
+
+# SET NX по ключах у переданому порядку до першого зайнятого;
+# повертає кількість взятих (ключі після зайнятого не чіпаються)
+_ACQUIRE_LOCKS_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    if not redis.call('SET', key, ARGV[1], 'NX', 'PX', ARGV[2]) then
+        return i - 1
+    end
+end
+return #KEYS
+"""
+
+# зняти ті locks, що ще наші (один виклик на весь пакет)
+_RELEASE_LOCKS_SCRIPT = """
+local released = 0
+for _, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[1] then
+        released = released + redis.call('DEL', key)
+    end
+end
+return released
+"""
+
+
+async def acquire_locks(
+    keys: List[str], ttl_seconds: float, token: Optional[str] = None
+) -> Tuple[str, int]:
+    """
+    Пакет locks одним викликом: keys беруться по порядку до першого
+    зайнятого. Повертає (token, кількість взятих з початку keys)
+    """
+    token = token or uuid.uuid4().hex
+    if not keys:
+        return token, 0
+    acquired = await redis_client.eval(
+        _ACQUIRE_LOCKS_SCRIPT, len(keys), *keys,
+        token, max(int(ttl_seconds * 1000), 1)
+    )
+    return token, int(acquired)
+
+
+async def release_locks(keys: List[str], token: str):
+    if keys:
+        await redis_client.eval(_RELEASE_LOCKS_SCRIPT, len(keys), *keys, token)
@@ -0,0 +1,88 @@
+from typing import NamedTuple, Optional
+
+from sqlalchemy import select, true, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.models import User, Subscription, Transaction, TransactionOperation
+from app.utils.common import (
+    user_existence_cache, remember_missing_user, raise_user_not_found
+)
+from app.utils.idempotency import (
+    check_operation_type, select_transactions_by_operation
+)
+from app.utils.plan_registry import plan_registry, PlanInfo
+
+# запити контексту - на рівні модуля: конструкція та ключ кешу компіляції
+# будуються один раз, user_id/operation_id передаються bind-параметрами
+_CONTEXT = (
+    select(User.id, Subscription.plan_id)
+    .outerjoin(Subscription, Subscription.user_id == User.id)
+    .where(User.id == bindparam("user_id"))
+)
+
+# operation_id глобально унікальний, тому не прив'язаний до user
+_existing = aliased(
+    Transaction,
+    select_transactions_by_operation(
+        TransactionOperation.operation_id == bindparam("operation_id")
+    ).subquery()
+)
+_CONTEXT_WITH_OPERATION = _CONTEXT.add_columns(_existing).outerjoin(
+    _existing, true()
+)
+
+
+class RequestContext(NamedTuple):
+    user_id: str
+    plan: Optional[PlanInfo]  # None: користувач без підписки
+    existing_tx: Optional[Transaction]  # транзакція з тим самим operation_id
+
+
+async def load_request_context(
+    session: AsyncSession,
+    user_id: str,
+    operation_id: Optional[str] = None,
+    expected_type: Optional[str] = None,
+) -> RequestContext:
+    """
+    Завантажує контекст запиту ОДНИМ SQL-запитом (LEFT JOINs):
+    існування user, план підписки і (якщо передано operation_id) вже
+    виконану транзакцію для ідемпотентності.
+    Значення плану беруться з in-process реєстру за plan_id.
+    Кредити сюди не входять: баланс читається через BalanceService
+    (L1, Redis, single-flight), а списання - guarded UPDATE у БД.
+    Якщо user не існує - 404 (повтори для того ж user_id відповідають
+    з негативного кешу без БД), якщо тип операції не збігається - 409.
+    Обидва варіанти запиту побудовані на рівні модуля (_CONTEXT*).
+    """
+    if user_existence_cache.get(user_id) is False:
+        raise_user_not_found(user_id)
+    generation = user_existence_cache.generation()
+
+    if operation_id is None:
+        result = await session.execute(_CONTEXT, {"user_id": user_id})
+    else:
+        result = await session.execute(
+            _CONTEXT_WITH_OPERATION,
+            {"user_id": user_id, "operation_id": operation_id},
+        )
+    row = result.first()
+
+    if row is None:
+        remember_missing_user(user_id, generation)
+        raise_user_not_found(user_id)
+
+    existing_tx = row[2] if operation_id is not None else None
+    if existing_tx is not None and expected_type is not None:
+        check_operation_type(existing_tx, operation_id, expected_type)
+
+    plan = None
+    if row.plan_id is not None:
+        plan = await plan_registry.get_plan(session, row.plan_id)
+
+    return RequestContext(
+        user_id=user_id,
+        plan=plan,
+        existing_tx=existing_tx,
+    )
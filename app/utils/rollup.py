@@ -0,0 +1,176 @@
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import select, delete, func, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import config
+from app.models import (
+    Transaction, TransactionType, Subscription,
+    DailyUsageRollup, DailyUsageRollupState
+)
+
+logger = logging.getLogger(__name__)
+
+# id єдиного рядка daily_usage_rollup_state
+ROLLUP_STATE_ID = 1
+
+
+def day_start(day: date) -> datetime:
+    return datetime.combine(day, time(0, 0, 0), tzinfo=timezone.utc)
+
+
+def last_closed_day(now: Optional[datetime] = None) -> date:
+    """Останній день (UTC), у який вже не можуть закомітитись нові транзакції"""
+    now = now or datetime.now(timezone.utc)
+    lagged = now - timedelta(seconds=config.ROLLUP_LAG_SECONDS)
+    return lagged.date() - timedelta(days=1)
+
+
+async def get_rolled_through(session: AsyncSession) -> Optional[date]:
+    result = await session.execute(
+        select(DailyUsageRollupState.rolled_through)
+        .where(DailyUsageRollupState.id == ROLLUP_STATE_ID)
+    )
+    return result.scalar_one_or_none()
+
+
+async def refresh_daily_rollup(
+    session: AsyncSession,
+    rebuild: bool = False,
+    keep_before: Optional[date] = None,
+) -> Optional[date]:
+    """
+    Catch-up: агрегує всі закриті дні після rolled_through одним
+    INSERT ... SELECT ... GROUP BY (day, tier, type) і комітить.
+    Рядок стану блокується (FOR UPDATE), тому паралельні workers
+    не агрегують ті самі дні двічі. Повертає новий rolled_through.
+    rebuild перераховує дні з keep_before (раніші транзакції вже в
+    холодному архіві - їх rollups лишаються).
+    """
+    await session.execute(
+        pg_insert(DailyUsageRollupState)
+        .values(id=ROLLUP_STATE_ID)
+        .on_conflict_do_nothing()
+    )
+    result = await session.execute(
+        select(DailyUsageRollupState)
+        .where(DailyUsageRollupState.id == ROLLUP_STATE_ID)
+        .with_for_update()
+    )
+    state = result.scalar_one()
+
+    if rebuild:
+        stmt = delete(DailyUsageRollup)
+        state.rolled_through = None
+        if keep_before is not None:
+            stmt = stmt.where(DailyUsageRollup.day >= keep_before)
+            state.rolled_through = keep_before - timedelta(days=1)
+        await session.execute(stmt)
+
+    target = last_closed_day()
+    if state.rolled_through is not None:
+        first_day = state.rolled_through + timedelta(days=1)
+    else:
+        result = await session.execute(select(func.min(Transaction.created_at)))
+        first_created_at = result.scalar_one_or_none()
+        first_day = (
+            first_created_at.astimezone(timezone.utc).date()
+            if first_created_at is not None else target + timedelta(days=1)
+        )
+
+    if first_day <= target:
+        day_col = func.date(func.timezone("UTC", Transaction.created_at))
+
+        # повторний прогін тих самих днів (rebuild) не дублює рядки
+        await session.execute(
+            delete(DailyUsageRollup)
+            .where(DailyUsageRollup.day >= first_day)
+            .where(DailyUsageRollup.day <= target)
+        )
+        await session.execute(
+            insert(DailyUsageRollup).from_select(
+                [
+                    "day", "tier", "type", "tx_count",
+                    "credits", "cost_usd", "amount_usd",
+                ],
+                select(
+                    day_col,
+                    Subscription.plan_id,
+                    Transaction.type,
+                    func.count(),
+                    func.coalesce(func.sum(Transaction.credits), 0),
+                    func.coalesce(func.sum(Transaction.cost_usd), 0),
+                    func.coalesce(func.sum(Transaction.amount_usd), 0),
+                )
+                .select_from(Transaction)
+                .join(Subscription, Subscription.user_id == Transaction.user_id)
+                .where(Transaction.created_at >= day_start(first_day))
+                .where(
+                    Transaction.created_at < day_start(target + timedelta(days=1))
+                )
+                .group_by(day_col, Subscription.plan_id, Transaction.type)
+            )
+        )
+        logger.info("Daily usage rollup: %s .. %s", first_day, target)
+
+    if state.rolled_through is None or state.rolled_through < target:
+        state.rolled_through = target
+    rolled_through = state.rolled_through
+    await session.commit()
+
+    return rolled_through
+
+
+async def transaction_counts(
+    session: AsyncSession,
+    start_date: date,
+    end_date: date,
+    tier: Optional[str] = None,
+) -> Dict[TransactionType, int]:
+    """
+    Кількість транзакцій за типом у [start_date, end_date] (UTC):
+    закриті дні - з daily_usage_rollup (без join), решта (після
+    rolled_through) - сирі транзакції з поточною підпискою. В обох частинах
+    рахуються лише користувачі з підпискою.
+    """
+    counts: Dict[TransactionType, int] = {t: 0 for t in TransactionType}
+    raw_from = day_start(start_date)
+    raw_to = day_start(end_date + timedelta(days=1))
+
+    rolled_through = await get_rolled_through(session)
+    if rolled_through is not None and rolled_through >= start_date:
+        stmt = (
+            select(DailyUsageRollup.type, func.sum(DailyUsageRollup.tx_count))
+            .where(DailyUsageRollup.day >= start_date)
+            .where(DailyUsageRollup.day <= min(end_date, rolled_through))
+            .group_by(DailyUsageRollup.type)
+        )
+        if tier:
+            stmt = stmt.where(DailyUsageRollup.tier == tier)
+
+        result = await session.execute(stmt)
+        for tx_type, count in result.all():
+            counts[tx_type] += count
+
+        raw_from = max(raw_from, day_start(rolled_through + timedelta(days=1)))
+
+    if raw_from < raw_to:
+        stmt = (
+            select(Transaction.type, func.count())
+            .join(Subscription, Subscription.user_id == Transaction.user_id)
+            .where(Transaction.created_at >= raw_from)
+            .where(Transaction.created_at < raw_to)
+            .group_by(Transaction.type)
+        )
+        if tier:
+            stmt = stmt.where(Subscription.plan_id == tier)
+
+        result = await session.execute(stmt)
+        for tx_type, count in result.all():
+            counts[tx_type] += count
+
+    return counts
+
@@ -1,85 +1,439 @@
+import asyncio
 import json
+import math
+import random
+import time
+from typing import Dict, Iterable, Optional
+
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, bindparam, Integer
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from app.models import Credits
-from app.utils.redis_cache import get_redis
+from app.utils.invalidation import (
+	register_invalidation_handler, publish_invalidation
+)
+from app.utils.local_cache import LocalCache, MISSING, record_cache_access
+from app.utils.redis_cache import get_redis, acquire_lock, release_lock
 from app.core.config import config
 
+# колонки, що повертаються після зміни кредитів
+_RETURNING = (
+	Credits.balance, Credits.total_earned, Credits.total_spent, Credits.version
+)
+
+# гарячі запити - на рівні модуля: конструкція та ключ кешу компіляції
+# будуються один раз, значення передаються як bind-параметри
+# (у INSERT/UPDATE імена параметрів не можуть збігатися з колонками - b_*)
+_SELECT_CREDITS = select(*_RETURNING).where(
+	Credits.user_id == bindparam("user_id")
+)
+
+_UPDATE_CREDITS = (
+	pg_insert(Credits)
+	.values(
+		user_id=bindparam("b_user_id"),
+		balance=bindparam("delta", type_=Integer),
+		total_earned=bindparam("earned", type_=Integer),
+		total_spent=bindparam("spent", type_=Integer),
+		version=1,
+	)
+	.on_conflict_do_update(
+		index_elements=[Credits.user_id],
+		set_={
+			"balance": Credits.balance + bindparam("delta", type_=Integer),
+			"total_earned": Credits.total_earned + bindparam("earned", type_=Integer),
+			"total_spent": Credits.total_spent + bindparam("spent", type_=Integer),
+			"version": Credits.version + 1,
+		},
+	)
+	.returning(*_RETURNING)
+)
+
+_CHARGE_CREDITS = (
+	update(Credits)
+	.where(
+		Credits.user_id == bindparam("b_user_id"),
+		Credits.balance >= bindparam("amount", type_=Integer),
+	)
+	.values(
+		balance=Credits.balance - bindparam("amount", type_=Integer),
+		total_spent=Credits.total_spent + bindparam("amount", type_=Integer),
+		version=Credits.version + 1,
+	)
+	.returning(*_RETURNING)
+)
+
+# стратегії оновлення кешу балансу після зміни кредитів
+CACHE_STRATEGY_DELETE = "delete"
+CACHE_STRATEGY_WRITE_THROUGH = "write_through"
+
+# записати баланс, лише якщо у кеші немає новішої версії
+# (та сама версія перезаписується - це подовжує TTL при ранньому оновленні)
+_VERSIONED_SET_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current then
+	local ok, data = pcall(cjson.decode, current)
+	if ok and type(data) == 'table' and data['version']
+		and tonumber(data['version']) > tonumber(ARGV[2]) then
+		return 0
+	end
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+return 1
+"""
+
+# інтервал опитування Redis, поки інший worker читає баланс з БД
+BALANCE_LOCK_POLL_SECONDS = 0.02
+
+# оцінка часу читання з БД для XFetch, якщо її немає у кеші (write-through)
+DEFAULT_RECOMPUTE_SECONDS = 0.05
+
+# single-flight у межах worker: user_id -> future з даними для кешу
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+# L1 кеш балансів (user_id -> дані кешу), інвалідація після commit змін
+BALANCE_INVALIDATION = "balance"
+balance_local_cache = LocalCache("balance")
+register_invalidation_handler(BALANCE_INVALIDATION, balance_local_cache.invalidate)
+
+
+def _retrieve_exception(future: asyncio.Future):
+	# помилку лідера отримують очікувачі; без них - не логувати "never retrieved"
+	if not future.cancelled():
+		future.exception()
+
 
 class BalanceService:
 	def __init__(self, session: AsyncSession):
 		self.session = session
+		# зміни кредитів поточної DB-транзакції, кеш оновлюється після commit
+		self._pending: Dict[str, dict] = {}
 
 	@staticmethod
 	def _balance_key(user_id: str) -> str:
 		return f"user:{user_id}:balance"
 
+	@staticmethod
+	def _cache_data(credit) -> dict:
+		# credit - Credits або рядок з колонками _RETURNING
+		return {
+			"balance": credit.balance,
+			"total_earned": credit.total_earned,
+			"total_spent": credit.total_spent,
+			"version": credit.version or 0,
+		}
+
+	@staticmethod
+	def _set_cache(client, user_id: str, data: dict):
+		"""Версіонований SET (client - Redis або pipeline)"""
+		return client.eval(
+			_VERSIONED_SET_SCRIPT,
+			1,
+			BalanceService._balance_key(user_id),
+			json.dumps(data),
+			data["version"],
+			config.CACHE_TTL_SECONDS,
+		)
+
+	def defer_cache_update(self, credits: Iterable[Credits]) -> None:
+		"""
+		Запам'ятати змінені кредити; кеш оновлюється лише після commit
+		(commit / apply_cache_updates), щоб не віддати незакомічений баланс.
+		"""
+		for credit in credits:
+			self._pending[credit.user_id] = self._cache_data(credit)
+
+	async def apply_cache_updates(self) -> None:
+		"""
+		Оновити кеш балансу для змін, уже закомічених у БД:
+		write_through - версіонований SET нового балансу,
+		delete - DEL ключів (наступне читання піде в БД).
+		L1 кеші всіх workers інвалідуються через pub/sub.
+		"""
+		if not self._pending:
+			return
+		pending, self._pending = self._pending, {}
+
+		r = await get_redis()
+		if config.BALANCE_CACHE_STRATEGY == CACHE_STRATEGY_DELETE:
+			await r.delete(*(self._balance_key(user_id) for user_id in pending))
+		else:
+			async with r.pipeline(transaction=False) as pipe:
+				for user_id, data in pending.items():
+					self._set_cache(pipe, user_id, data)
+				await pipe.execute()
+
+		if balance_local_cache.enabled:
+			await publish_invalidation(BALANCE_INVALIDATION, *pending)
+
+	async def commit(self) -> None:
+		"""Commit DB-транзакції, потім оновлення кешу балансу"""
+		await self.session.commit()
+		await self.apply_cache_updates()
+
+	async def rollback(self) -> None:
+		"""Rollback DB-транзакції разом з відкладеними оновленнями кешу"""
+		await self.session.rollback()
+		self._pending.clear()
+
+	@staticmethod
+	def _from_cache(user_id: str, data: dict) -> Credits:
+		return Credits(
+			user_id=user_id,
+			balance=data["balance"],
+			total_earned=data["total_earned"],
+			total_spent=data["total_spent"],
+			version=data.get("version", 0),
+		)
+
+	@staticmethod
+	def _should_refresh_early(data: dict, ttl_ms: int) -> bool:
+		"""XFetch: оновити раніше з імовірністю, що зростає ближче до TTL"""
+		if ttl_ms < 0:
+			return False
+		delta = data.get("delta", DEFAULT_RECOMPUTE_SECONDS)
+		gap = -delta * config.BALANCE_EARLY_REFRESH_BETA * math.log(1.0 - random.random())
+		return gap >= ttl_ms / 1000
+
 	async def get_credits(self, user_id: str) -> Credits:
-		"""Отримати кредити користувача: спочатку Redis, якщо немає — БД"""
+		"""
+		Отримати кредити користувача: спочатку Redis, якщо немає — БД.
+		Захист від stampede, коли закінчується CACHE_TTL_SECONDS:
+		- single-flight у межах worker: паралельні запити чекають один future;
+		- короткий Redis lock між workers: БД читає лише власник lock;
+		- раннє оновлення (XFetch) до закінчення TTL, якщо
+		  BALANCE_EARLY_REFRESH_BETA > 0 (інші запити отримують кешоване значення).
+		Перед Redis - in-process L1 кеш (LOCAL_CACHE_ENABLED).
+		"""
+		# L1: in-process кеш (без Redis і json.loads)
+		local = balance_local_cache.get(user_id)
+		if local is not MISSING:
+			return self._from_cache(user_id, local)
+		generation = balance_local_cache.generation()
+
+		key = self._balance_key(user_id)
 		r = await get_redis()
 
 		# пробуємо кеш
-		cached = await r.get(self._balance_key(user_id))
+		if config.BALANCE_EARLY_REFRESH_BETA > 0:
+			async with r.pipeline(transaction=False) as pipe:
+				pipe.get(key)
+				pipe.pttl(key)
+				cached, ttl_ms = await pipe.execute()
+		else:
+			cached, ttl_ms = await r.get(key), None
+		record_cache_access("balance", "redis", bool(cached))
+
 		if cached:
 			data = json.loads(cached)
-			return Credits(
-				user_id=user_id,
-				balance=data["balance"],
-				total_earned=data["total_earned"],
-				total_spent=data["total_spent"],
-			)
+			if ttl_ms is not None and self._should_refresh_early(data, ttl_ms):
+				data = await self._load_shared(user_id, stale=data)
+		else:
+			# якщо немає у кеші - беремо з БД (один запит на ключ)
+			data = await self._load_shared(user_id)
 
-		# якщо немає у кеші - беремо з БД
+		balance_local_cache.set(user_id, data, generation)
+		return self._from_cache(user_id, data)
+
+	async def _load_shared(self, user_id: str, stale: Optional[dict] = None) -> dict:
+		"""Single-flight: лише один запит worker'а читає ключ з БД"""
+		future = _inflight.get(user_id)
+		if future is not None:
+			if stale is not None:
+				return stale
+			try:
+				return await asyncio.shield(future)
+			except asyncio.CancelledError:
+				if not future.cancelled():
+					raise
+				# лідер скасований - читаємо самі
+				return await self._load_locked(user_id)
+
+		future = asyncio.get_running_loop().create_future()
+		future.add_done_callback(_retrieve_exception)
+		_inflight[user_id] = future
+		try:
+			data = await self._load_locked(user_id, stale)
+		except asyncio.CancelledError:
+			future.cancel()
+			raise
+		except Exception as exc:
+			future.set_exception(exc)
+			raise
+		else:
+			future.set_result(data)
+			return data
+		finally:
+			_inflight.pop(user_id, None)
+
+	async def _load_locked(self, user_id: str, stale: Optional[dict] = None) -> dict:
+		"""Redis lock між workers: поки інший worker читає БД - чекаємо кеш"""
+		key = self._balance_key(user_id)
+		lock_key = f"{key}:lock"
+
+		token = await acquire_lock(lock_key, config.BALANCE_LOCK_SECONDS)
+		if token is None:
+			if stale is not None:
+				return stale
+
+			r = await get_redis()
+			deadline = time.monotonic() + config.BALANCE_LOCK_SECONDS
+			while time.monotonic() < deadline:
+				await asyncio.sleep(BALANCE_LOCK_POLL_SECONDS)
+				cached = await r.get(key)
+				if cached:
+					return json.loads(cached)
+			# не дочекались - читаємо БД самі
+
+		try:
+			return await self._load_from_db(user_id)
+		finally:
+			if token is not None:
+				await release_lock(lock_key, token)
+
+	async def _load_from_db(self, user_id: str) -> dict:
+		started = time.monotonic()
+
+		# лише колонки кешу - рядок без ORM-об'єкта та identity map
 		result = await self.session.execute(
-			select(Credits).where(Credits.user_id == user_id)
+			_SELECT_CREDITS, {"user_id": user_id}
 		)
-		credit: Credits | None = result.scalar_one_or_none()
+		credit = result.first()
 
 		if not credit:
 			# якщо користувач новий - створюємо пустий запис
 			credit = Credits(
-				user_id=user_id, balance=0, total_earned=0, total_spent=0
+				user_id=user_id, balance=0, total_earned=0, total_spent=0,
+				version=0
 			)
 			self.session.add(credit)
 			await self.session.commit()
 
-		# кладемо у Redis весь об’єкт як JSON
-		await r.set(
-			self._balance_key(user_id),
-			json.dumps({
-				"balance": credit.balance,
-				"total_earned": credit.total_earned,
-				"total_spent": credit.total_spent,
-			}),
-			ex=config.CACHE_TTL_SECONDS,
+		# кладемо у Redis весь об’єкт як JSON (не перетираючи новішу версію)
+		data = self._cache_data(credit)
+		data["delta"] = round(time.monotonic() - started, 4)
+		r = await get_redis()
+		await self._set_cache(r, user_id, data)
+
+		return data
+
+	async def get_credits_many(self, user_ids: Iterable[str]) -> Dict[str, Credits]:
+		"""
+		Отримати кредити багатьох користувачів: L1 кеш, один MGET у Redis,
+		один SELECT ... IN (...) для промахів кешу, один pipeline для запису в кеш.
+		Для користувачів без запису повертаються нульові кредити (без створення).
+		"""
+		user_ids = list(dict.fromkeys(user_ids))
+		if not user_ids:
+			return {}
+
+		credits: Dict[str, Credits] = {}
+
+		# L1: in-process кеш
+		generation = balance_local_cache.generation()
+		remote = []
+		for user_id in user_ids:
+			local = balance_local_cache.get(user_id)
+			if local is MISSING:
+				remote.append(user_id)
+			else:
+				credits[user_id] = self._from_cache(user_id, local)
+
+		if not remote:
+			return credits
+
+		r = await get_redis()
+
+		# пробуємо кеш
+		cached_values = await r.mget(
+			[self._balance_key(user_id) for user_id in remote]
 		)
 
-		return credit
+		missed = []
+		for user_id, cached in zip(remote, cached_values):
+			record_cache_access("balance", "redis", bool(cached))
+			if cached:
+				data = json.loads(cached)
+				balance_local_cache.set(user_id, data, generation)
+				credits[user_id] = self._from_cache(user_id, data)
+			else:
+				missed.append(user_id)
+
+		if not missed:
+			return credits
+
+		# промахи кешу - одним запитом з БД
+		result = await self.session.execute(
+			select(Credits.user_id, *_RETURNING).where(Credits.user_id.in_(missed))
+		)
+		found = {row.user_id: row for row in result.all()}
+
+		async with r.pipeline(transaction=False) as pipe:
+			for user_id in missed:
+				credit = found.get(user_id)
+				if credit is None:
+					credits[user_id] = Credits(
+						user_id=user_id, balance=0, total_earned=0, total_spent=0
+					)
+					continue
+
+				data = self._cache_data(credit)
+				credits[user_id] = self._from_cache(user_id, data)
+				balance_local_cache.set(user_id, data, generation)
+				self._set_cache(pipe, user_id, data)
+			await pipe.execute()
+
+		return credits
 
 	async def update_credits(self, user_id: str, delta: int) -> Credits:
-		"""Оновити user credits: транзакція у БД + чистка кешу"""
-		async with self.session.begin_nested():
-			result = await self.session.execute(
-				select(Credits).where(Credits.user_id == user_id)
-			)
-			credit = result.scalar_one_or_none()
+		"""
+		Оновити user credits одним INSERT ... ON CONFLICT DO UPDATE ... RETURNING
+		(атомарно, без попереднього SELECT); кеш оновлюється після commit
+		"""
+		result = await self.session.execute(
+			_UPDATE_CREDITS,
+			{
+				"b_user_id": user_id,
+				"delta": delta,
+				"earned": max(delta, 0),
+				"spent": max(-delta, 0),
+			},
+		)
+		return self._changed(user_id, result.one())
 
-			if not credit:
-				credit = Credits(
-					user_id=user_id, balance=0, total_earned=0, total_spent=0
-				)
-				self.session.add(credit)
+	async def charge_credits(self, user_id: str, amount: int) -> Credits | None:
+		"""
+		Атомарне списання кредитів одним UPDATE ... WHERE balance >= amount.
+		Баланс ніколи не стає від'ємним, блокування рядка не тримається між await.
+		Повертає оновлені кредити або None, якщо кредитів недостатньо.
+		"""
+		result = await self.session.execute(
+			_CHARGE_CREDITS, {"b_user_id": user_id, "amount": amount}
+		)
+		row = result.one_or_none()
 
-			if delta > 0:
-				credit.total_earned += delta
-			elif delta < 0:
-				credit.total_spent += abs(delta)
+		if row is None:
+			return None
 
-			credit.balance += delta
-			await self.session.flush()
+		return self._changed(user_id, row)
 
-			# чистка кешу
-			r = await get_redis()
-			await r.delete(self._balance_key(user_id))
+	async def current_balance(self, user_id: str) -> int:
+		"""
+		Баланс з БД у поточній DB-транзакції, без кешу (напр. для відповіді
+		після charge_credits, що повернув None).
+		"""
+		result = await self.session.execute(_SELECT_CREDITS, {"user_id": user_id})
+		row = result.first()
+		return row.balance if row is not None else 0
 
+	def _changed(self, user_id: str, row) -> Credits:
+		credit = Credits(
+			user_id=user_id,
+			balance=row.balance,
+			total_earned=row.total_earned,
+			total_spent=row.total_spent,
+			version=row.version,
+		)
+		self.defer_cache_update([credit])
 		return credit
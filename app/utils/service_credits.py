@@ -0,0 +1,159 @@
+from datetime import datetime, timezone
+
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Transaction, TransactionType, TransactionSource
+from app.schemas.credits import CreditsAddRequest, CreditsAddResponse
+from app.utils.common import generate_transaction_id
+from app.utils.idempotency import idempotent_operation
+from app.utils.ledger import add_transaction
+from app.utils.logging import get_extra_data_log
+from app.utils.plan_registry import plan_registry
+from app.utils.request_context import load_request_context
+from app.utils.service_balance import BalanceService
+
+import logging
+
+
+async def add_credits(
+    payload: CreditsAddRequest,
+    session: AsyncSession,
+    balance_service: BalanceService,
+    logger: logging.Logger
+) -> CreditsAddResponse:
+    """
+    Поповнення балансу (логіка /api/internal/credits/add).
+    Викликається як з Internal API, так і напряму з Public API,
+    коли обидва працюють в одному процесі (INTERNAL_API_MODE=local).
+    logger - logger того API, що викликає (запис у його лог-файл).
+    """
+    # Redis fast path ідемпотентності: повтори без звернення до Postgres,
+    # паралельні дублікати чекають на результат першого запиту
+    async with idempotent_operation(
+        payload.operation_id, TransactionType.ADD.value
+    ) as idempotency:
+        if idempotency.replay is not None:
+            logger.info(
+                "Found duplicate operation. Cached response:",
+                extra={"operation_id": payload.operation_id}
+            )
+            return CreditsAddResponse(**idempotency.replay)
+
+        result = await _add_credits(payload, session, balance_service, logger)
+
+        # зберігаємо відповідь (вже після commit) для наступних повторів
+        await idempotency.save(result)
+
+    return result
+
+
+async def _add_credits(
+    payload: CreditsAddRequest,
+    session: AsyncSession,
+    balance_service: BalanceService,
+    logger: logging.Logger
+):
+    user_id = payload.user_id
+
+    # контекст одним запитом: user (404), підписка, ідемпотентність (409)
+    operation_id = payload.operation_id
+    context = await load_request_context(
+        session,
+        user_id,
+        operation_id=operation_id,
+        expected_type=TransactionType.ADD.value
+    )
+    existing_tx = context.existing_tx
+
+    if existing_tx is not None:
+        metadata = existing_tx.info
+        # Повертаємо той самий результат, що був раніше
+        message = "Found duplicate transaction. Existing transaction:"
+        extra_log = get_extra_data_log(existing_tx)
+
+        result =  CreditsAddResponse(
+            success=True,
+            transaction_id=existing_tx.id,
+            user_id=existing_tx.user_id,
+            amount_usd=existing_tx.amount_usd,
+            credits_added=existing_tx.credits,
+            purchase_rate=metadata.get("purchase_rate"),
+            balance_before=existing_tx.balance_before,
+            balance_after=existing_tx.balance_after,
+            operation_id=existing_tx.operation_id
+        )
+    else:
+        # план підписки (з контексту)
+        plan = context.plan
+
+        if plan is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Not found: user '{user_id}' does not have subscription.",
+            )
+        purchase_rate = float(plan.purchase_rate)
+
+        # завантаження базового курсу конвертації
+        base_rate = await plan_registry.get_base_rate(session)
+
+        # розрахунок суми кредитів з урахуванням бонусу підписки
+        amount_usd = payload.amount_usd
+        credits_added = round(amount_usd * purchase_rate * base_rate)
+
+        # оновити кредити (атомарно, balance_before з RETURNING)
+        # та створити транзакцію в тій самій DB-транзакції
+        user_credits = await balance_service.update_credits(
+            user_id, credits_added
+        )
+        balance_after = user_credits.balance
+        balance_before = balance_after - credits_added
+
+        id_tx = generate_transaction_id(operation_id)
+
+        meta = payload.metadata.dict() if hasattr(payload.metadata, "dict") else (payload.metadata or {})
+        info = {"purchase_rate": float(purchase_rate), **meta}
+
+        # транзакція
+        new_tx = Transaction(
+            id=id_tx,
+            user_id=user_id,
+            operation_id=operation_id,
+            type=TransactionType.ADD,
+            source=TransactionSource.PURCHASE,
+            amount_usd=amount_usd,
+            credits=credits_added,
+            balance_before=balance_before,
+            balance_after=balance_after,
+            description=payload.description,
+            created_at=datetime.now(timezone.utc),
+            info=info
+        )
+
+        await add_transaction(session, new_tx)
+        await session.flush()
+
+        message = "Updated credits. Transaction::"
+        extra_log = get_extra_data_log(new_tx)
+
+        result = CreditsAddResponse(
+            success=True,
+            transaction_id=new_tx.id,
+            user_id=user_id,
+            amount_usd=amount_usd,
+            credits_added=credits_added,
+            purchase_rate=purchase_rate,
+            balance_before=balance_before,
+            balance_after=balance_after,
+            operation_id=operation_id
+        )
+
+    # commit, потім оновлення кешу балансу
+    await balance_service.commit()
+
+    logger.info(
+        message,
+        extra=extra_log
+    )
+
+    return result
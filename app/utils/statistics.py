@@ -0,0 +1,243 @@
+import asyncio
+import json
+import logging
+from datetime import date, datetime, time, timezone
+from typing import Dict, Optional, Tuple
+
+from redis.exceptions import RedisError
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import config
+from app.core.database import async_session
+from app.models import Credits, TransactionType
+from app.models.user import User
+from app.models.subscription import SubscriptionPlan, Subscription
+from app.schemas.base import (
+    StatisticsResponse, StatisticsPeriod, StatisticsPlans,
+    StatisticsCredits, StatisticsTransactions
+)
+from app.utils.redis_cache import get_redis
+from app.utils.rollup import (
+    get_rolled_through, last_closed_day, refresh_daily_rollup, transaction_counts
+)
+
+logger = logging.getLogger(__name__)
+
+# лічильник поколінь кешу: INCR інвалідує всі збережені відповіді
+STATS_GENERATION_KEY = "stats:usage:generation"
+
+
+def _stats_key(start_date: date, end_date: date, tier: Optional[str]) -> str:
+    return f"stats:usage:{start_date.isoformat()}:{end_date.isoformat()}:{tier or ''}"
+
+
+def _counts_key(start_date: date, end_date: date, tier: Optional[str]) -> str:
+    return f"stats:counts:{start_date.isoformat()}:{end_date.isoformat()}:{tier or ''}"
+
+
+async def _subscription_counts(session: AsyncSession) -> Dict[str, int]:
+    # dict з кількістю users у кожний підписці
+    stmt = (
+        select(SubscriptionPlan.tier, func.count(User.id))
+        .join(Subscription, Subscription.user_id == User.id)
+        .join(SubscriptionPlan, Subscription.plan_id == SubscriptionPlan.tier)
+        .group_by(SubscriptionPlan.tier)
+    )
+    result = await session.execute(stmt)
+    return {tier: count for tier, count in result.all()}
+
+
+async def _credits_totals(
+    session: AsyncSession, tier: Optional[str]
+) -> Tuple[int, int]:
+    # статистика по кредитам (поточний стан, один рядок credits на user)
+    stmt = (
+        select(
+            func.sum(Credits.total_earned).label("total_earned"),
+            func.sum(Credits.total_spent).label("total_spent"),
+        )
+        .select_from(User)
+        .join(Subscription, Subscription.user_id == User.id)
+        .join(Credits, Credits.user_id == User.id)
+    )
+    if tier:
+        stmt = stmt.where(Subscription.plan_id == tier)
+
+    result = await session.execute(stmt)
+    row = result.one()
+    return row.total_earned or 0, row.total_spent or 0
+
+
+async def _run_in_own_session(session: AsyncSession, query, *args):
+    # окрема сесія - окреме з'єднання з пулу, запити йдуть паралельно
+    async with AsyncSession(bind=session.bind, expire_on_commit=False) as own:
+        return await query(own, *args)
+
+
+async def compute_usage_statistics(
+    session: AsyncSession,
+    start_date: date,
+    end_date: date,
+    tier: Optional[str] = None,
+    count_transactions=transaction_counts,
+) -> StatisticsResponse:
+    """
+    Три незалежні запити статистики виконуються паралельно (asyncio.gather).
+    count_transactions - запит лічильників транзакцій за період
+    (get_cached_usage_statistics підставляє версію з кешем).
+    """
+    subscriptions, (total_earned, total_spent), counts = await asyncio.gather(
+        _run_in_own_session(session, _subscription_counts),
+        _run_in_own_session(session, _credits_totals, tier),
+        _run_in_own_session(
+            session, count_transactions, start_date, end_date, tier
+        ),
+    )
+
+    # загальна кількість користувачів які мають підписку
+    total_users = sum(subscriptions.values())
+    if tier:
+        if tier in subscriptions:
+            subscriptions = {tier: subscriptions[tier]}
+            total_users = subscriptions[tier]
+        else:
+            subscriptions = {}
+            total_users = 0
+
+    return StatisticsResponse(
+        period=StatisticsPeriod(
+            start=datetime.combine(start_date, time(0, 0, 0), tzinfo=timezone.utc),
+            end=datetime.combine(end_date, time(23, 59, 59), tzinfo=timezone.utc)
+        ),
+        total_users=total_users,
+        subscriptions=StatisticsPlans(subscriptions=subscriptions),
+        credits=StatisticsCredits(
+            total_earned=total_earned,
+            total_spent=total_spent,
+            current_balance=total_earned - total_spent
+        ),
+        transactions=StatisticsTransactions(
+            total=sum(counts.values()),
+            charges=counts[TransactionType.CHARGE],
+            additions=counts[TransactionType.ADD]
+        )
+    )
+
+
+def _counts_ttl(end_date: date) -> int:
+    """
+    Лічильники транзакцій діапазону лише з закритих днів (нові транзакції
+    в нього не потраплять) кешуються до наступного прогону rollup.
+    0 - діапазон ще відкритий, окремо не кешується.
+    """
+    if end_date <= last_closed_day():
+        return max(config.STATS_CACHE_TTL_SECONDS, config.ROLLUP_INTERVAL_SECONDS)
+    return 0
+
+
+async def get_cached_usage_statistics(
+    session: AsyncSession,
+    start_date: date,
+    end_date: date,
+    tier: Optional[str] = None,
+) -> StatisticsResponse:
+    """
+    Статистика з кешем у Redis за ключем (start_date, end_date, tier).
+    Відповідь (з поточним станом credits та підписок) живе
+    STATS_CACHE_TTL_SECONDS, лічильники транзакцій закритого діапазону -
+    окремо і довше. Записи зберігаються разом з поколінням кешу, тож після
+    invalidate_statistics_cache() старі вже не віддаються.
+    """
+    if config.STATS_CACHE_TTL_SECONDS <= 0:
+        return await compute_usage_statistics(session, start_date, end_date, tier)
+
+    key = _stats_key(start_date, end_date, tier)
+    counts_key = _counts_key(start_date, end_date, tier)
+    r = await get_redis()
+    generation, cached, cached_counts = await r.mget(
+        [STATS_GENERATION_KEY, key, counts_key]
+    )
+    generation = int(generation or 0)
+
+    if cached is not None:
+        payload = json.loads(cached)
+        if payload["generation"] == generation:
+            return StatisticsResponse.model_validate(payload["data"])
+
+    async def count_transactions(
+        own: AsyncSession, start: date, end: date, tier: Optional[str]
+    ) -> Dict[TransactionType, int]:
+        if cached_counts is not None:
+            payload = json.loads(cached_counts)
+            if payload["generation"] == generation:
+                return {TransactionType(t): n for t, n in payload["data"].items()}
+
+        counts = await transaction_counts(own, start, end, tier)
+        counts_ttl = _counts_ttl(end)
+        if counts_ttl > 0:
+            await r.set(
+                counts_key,
+                json.dumps({
+                    "generation": generation,
+                    "data": {t.value: n for t, n in counts.items()},
+                }),
+                ex=counts_ttl,
+            )
+        return counts
+
+    response = await compute_usage_statistics(
+        session, start_date, end_date, tier, count_transactions
+    )
+    await r.set(
+        key,
+        json.dumps({
+            "generation": generation,
+            "data": response.model_dump(mode="json"),
+        }),
+        ex=config.STATS_CACHE_TTL_SECONDS,
+    )
+    return response
+
+
+async def invalidate_statistics_cache():
+    """
+    Після змін адміністратора (плани, курси) та перерахунку rollups.
+    Зміни вже закомічені: якщо Redis недоступний, кеш застаріє лише до
+    STATS_CACHE_TTL_SECONDS, а відповідь адміністратору не має падати.
+    """
+    try:
+        r = await get_redis()
+        await r.incr(STATS_GENERATION_KEY)
+    except (RedisError, OSError):
+        logger.exception("Statistics cache invalidation failed")
+
+
+async def refresh_statistics_rollup(
+    session: AsyncSession,
+    rebuild: bool = False,
+    keep_before: Optional[date] = None,
+) -> Optional[date]:
+    """
+    refresh_daily_rollup + інвалідація кешу /statistics, якщо rollups
+    змінились (нові закриті дні або rebuild): закешовані відповіді
+    діапазонів з цими днями вже не актуальні.
+    """
+    before = await get_rolled_through(session)
+    rolled_through = await refresh_daily_rollup(session, rebuild, keep_before)
+    if rebuild or rolled_through != before:
+        await invalidate_statistics_cache()
+    return rolled_through
+
+
+async def run_daily_rollup():
+    """Фонова задача worker: періодичний catch-up денних rollups"""
+    while True:
+        try:
+            async with async_session() as session:
+                await refresh_statistics_rollup(session)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Daily usage rollup failed")
+        await asyncio.sleep(config.ROLLUP_INTERVAL_SECONDS)
@@ -0,0 +1,224 @@
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import config
+from app.models import Transaction, TransactionType, Subscription
+from app.utils.archive import archive_horizon, iter_archived
+from app.utils.redis_cache import get_redis
+
+BUCKET_SIZES = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+# захист від випадкових запитів на роки погодинних точок
+MAX_SERIES_BUCKETS = 2000
+
+
+def _series_key(bucket: str, bucket_start: datetime) -> str:
+    return f"stats:series:{bucket}:{bucket_start.isoformat()}"
+
+
+def floor_bucket(moment: datetime, bucket: str) -> datetime:
+    moment = moment.astimezone(timezone.utc)
+    if bucket == "day":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _sum_if(tx_type: TransactionType, value):
+    return func.coalesce(
+        func.sum(case((Transaction.type == tx_type, value), else_=0)), 0
+    )
+
+
+# поля точки series для транзакцій кожного типу (кількість, кредити)
+_TYPE_FIELDS = {
+    TransactionType.CHARGE.value: ("charges", "credits_charged"),
+    TransactionType.ADD.value: ("additions", "credits_added"),
+    TransactionType.SUBSCRIPTION.value: ("subscriptions", "credits_granted"),
+}
+_POINT_FIELDS = (
+    "charges", "additions", "subscriptions",
+    "credits_charged", "credits_added", "credits_granted",
+    "cost_usd", "amount_usd",
+)
+
+
+def _round_point(point: dict) -> dict:
+    point["cost_usd"] = round(float(point["cost_usd"]), 4)
+    point["amount_usd"] = round(float(point["amount_usd"]), 2)
+    return point
+
+
+async def _archived_buckets(
+    session: AsyncSession,
+    bucket: str,
+    range_start: datetime,
+    range_end: datetime,
+) -> Dict[datetime, List[dict]]:
+    """
+    Ті самі точки з холодного архіву (app.utils.archive): агрегація по
+    (bucket, user), потім tier - поточна підписка user, як у запиті до БД
+    """
+    by_user: Dict[Tuple[datetime, str], dict] = {}
+    async for items in iter_archived(range_start, range_end):
+        for item in items:
+            key = (floor_bucket(item["created_at"], bucket), item["user_id"])
+            point = by_user.get(key)
+            if point is None:
+                point = by_user[key] = dict.fromkeys(_POINT_FIELDS, 0)
+            count_field, credits_field = _TYPE_FIELDS[item["type"]]
+            point[count_field] += 1
+            point[credits_field] += (
+                -item["credits"] if count_field == "charges" else item["credits"]
+            )
+            point["cost_usd"] += item["cost_usd"] or 0
+            point["amount_usd"] += item["amount_usd"] or 0
+
+    if not by_user:
+        return {}
+
+    result = await session.execute(
+        select(Subscription.user_id, Subscription.plan_id)
+        .where(Subscription.user_id.in_({user_id for _, user_id in by_user}))
+    )
+    plans = dict(result.all())
+
+    by_tier: Dict[Tuple[datetime, str], dict] = {}
+    for (bucket_start, user_id), point in by_user.items():
+        tier = plans.get(user_id)
+        if tier is None:
+            # як і join з subscriptions: лише користувачі з підпискою
+            continue
+        total = by_tier.setdefault(
+            (bucket_start, tier), {"tier": tier, **dict.fromkeys(_POINT_FIELDS, 0)}
+        )
+        for field in _POINT_FIELDS:
+            total[field] += point[field]
+
+    buckets: Dict[datetime, List[dict]] = {}
+    for (bucket_start, _), point in sorted(by_tier.items()):
+        buckets.setdefault(bucket_start, []).append(_round_point(point))
+    return buckets
+
+
+async def _query_buckets(
+    session: AsyncSession,
+    bucket: str,
+    range_start: datetime,
+    range_end: datetime,
+) -> Dict[datetime, List[dict]]:
+    """
+    Усі бакети діапазону одним GROUP BY (date_trunc, tier);
+    частина до межі холодного архіву - з його файлів
+    """
+    buckets: Dict[datetime, List[dict]] = {}
+    horizon = archive_horizon()
+    if horizon is not None and range_start < horizon:
+        buckets.update(await _archived_buckets(
+            session, bucket, range_start, min(range_end, horizon)
+        ))
+        range_start = horizon
+    if range_start >= range_end:
+        return buckets
+
+    bucket_col = func.date_trunc(
+        bucket, func.timezone("UTC", Transaction.created_at)
+    )
+    stmt = (
+        select(
+            bucket_col.label("bucket"),
+            Subscription.plan_id.label("tier"),
+            _sum_if(TransactionType.CHARGE, 1).label("charges"),
+            _sum_if(TransactionType.ADD, 1).label("additions"),
+            _sum_if(TransactionType.SUBSCRIPTION, 1).label("subscriptions"),
+            _sum_if(TransactionType.CHARGE, -Transaction.credits).label("credits_charged"),
+            _sum_if(TransactionType.ADD, Transaction.credits).label("credits_added"),
+            _sum_if(TransactionType.SUBSCRIPTION, Transaction.credits).label("credits_granted"),
+            func.coalesce(func.sum(Transaction.cost_usd), 0).label("cost_usd"),
+            func.coalesce(func.sum(Transaction.amount_usd), 0).label("amount_usd"),
+        )
+        .join(Subscription, Subscription.user_id == Transaction.user_id)
+        .where(Transaction.created_at >= range_start)
+        .where(Transaction.created_at < range_end)
+        .group_by(bucket_col, Subscription.plan_id)
+        .order_by(bucket_col, Subscription.plan_id)
+    )
+
+    result = await session.execute(stmt)
+
+    for row in result.all():
+        point = dict(row._mapping)
+        bucket_start = point.pop("bucket").replace(tzinfo=timezone.utc)
+        buckets.setdefault(bucket_start, []).append(_round_point(point))
+    return buckets
+
+
+async def get_statistics_series(
+    session: AsyncSession,
+    bucket: str,
+    start: datetime,
+    end: datetime,
+    tier: Optional[str] = None,
+) -> List[dict]:
+    """
+    Точки (bucket, tier) за [start, end). Закриті бакети беруться з Redis
+    (кешуються для всіх tiers), з БД одним запитом читаються лише відсутні
+    у кеші - при опитуванні зі зсувним вікном це лише відкритий бакет.
+    """
+    size = BUCKET_SIZES[bucket]
+    buckets = []
+    bucket_start = floor_bucket(start, bucket)
+    while bucket_start < end:
+        buckets.append(bucket_start)
+        bucket_start += size
+        if len(buckets) > MAX_SERIES_BUCKETS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Too many buckets (max {MAX_SERIES_BUCKETS}).",
+            )
+
+    if not buckets:
+        return []
+
+    r = await get_redis()
+    cached_values = await r.mget([_series_key(bucket, b) for b in buckets])
+
+    points_by_bucket: Dict[datetime, List[dict]] = {}
+    missing = []
+    for bucket_start, cached in zip(buckets, cached_values):
+        if cached is None:
+            missing.append(bucket_start)
+        else:
+            points_by_bucket[bucket_start] = json.loads(cached)
+
+    if missing:
+        computed = await _query_buckets(
+            session, bucket, missing[0], missing[-1] + size
+        )
+        # бакет закритий, якщо в нього вже не можуть закомітитись транзакції
+        closed_before = (
+            datetime.now(timezone.utc)
+            - timedelta(seconds=config.ROLLUP_LAG_SECONDS)
+        )
+        async with r.pipeline(transaction=False) as pipe:
+            for bucket_start in missing:
+                points = computed.get(bucket_start, [])
+                points_by_bucket[bucket_start] = points
+                if bucket_start + size <= closed_before:
+                    pipe.set(
+                        _series_key(bucket, bucket_start),
+                        json.dumps(points),
+                        ex=config.STATS_SERIES_CACHE_TTL_SECONDS,
+                    )
+            await pipe.execute()
+
+    return [
+        {"bucket": bucket_start, **point}
+        for bucket_start in buckets
+        for point in points_by_bucket[bucket_start]
+        if not tier or point["tier"] == tier
+    ]
@@ -0,0 +1,15 @@
+from app.core.database import async_session
+from app.utils.archive import archive_transactions, archive_root
+
+
+async def archive():
+    async with async_session() as session:
+        archived = await archive_transactions(session)
+    for entry in archived:
+        files = ", ".join(part["file"] for part in entry["files"])
+        print(f"{entry['month']}: {entry['rows']} transactions -> {files}")
+    print(f"Archive is up to date: {archive_root()}")
+
+# Викликати вручну (або cron): транзакції старші за ARCHIVE_RETENTION_MONTHS -> архів
+import asyncio
+asyncio.run(archive())
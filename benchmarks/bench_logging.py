@@ -0,0 +1,87 @@
+import json
+import logging
+import timeit
+from datetime import datetime, timezone
+
+from app.core.logging_config import (
+    ModelFormatter, JsonFormatter, TRANSACTION_FIELDS
+)
+from app.models import Transaction, TransactionType, TransactionSource
+from app.utils.json_encoding import orjson
+from app.utils.logging import get_extra_data_log
+
+NUMBER = 20000
+FMT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+def sample_transaction() -> Transaction:
+    return Transaction(
+        id="txn_0123456789ab",
+        user_id="user_111",
+        type=TransactionType.CHARGE,
+        source=TransactionSource.PURCHASE,
+        operation_id="op_0123456789ab",
+        cost_usd=0.01,
+        credits=-100,
+        balance_before=1500,
+        balance_after=1400,
+        description="Image generation",
+        info={"model": "gpt-4", "tokens": 1500},
+        created_at=datetime.now(timezone.utc),
+    )
+
+
+def legacy_extra(obj) -> dict:
+    # попередня реалізація get_extra_data_log
+    return {
+        column.name: getattr(obj, column.name)
+        for column in obj.__table__.columns
+    }
+
+
+class LegacyFormatter(logging.Formatter):
+    # попередній ModelFormatter: обхід record.__dict__ + json.dumps(default=str)
+    def __init__(self, fmt, fields):
+        super().__init__(fmt)
+        self.fields = set(fields)
+
+    def format(self, record):
+        base = super().format(record)
+        extras = {k: v for k, v in record.__dict__.items() if k in self.fields}
+        if extras:
+            base += " " + json.dumps(extras, default=str, ensure_ascii=False)
+        return base
+
+
+def make_record(extra: dict) -> logging.LogRecord:
+    return logging.getLogger("[INTERNAL]").makeRecord(
+        "[INTERNAL]", logging.INFO, __file__, 0,
+        "Updated credits. Transaction::", (), None, extra=extra
+    )
+
+
+def per_record_us(func) -> float:
+    return timeit.timeit(func, number=NUMBER) / NUMBER * 1e6
+
+
+def bench_logging():
+    tx = sample_transaction()
+    legacy = LegacyFormatter(FMT, TRANSACTION_FIELDS)
+    text = ModelFormatter(FMT, fields=TRANSACTION_FIELDS)
+    structured = JsonFormatter(FMT, fields=TRANSACTION_FIELDS)
+
+    print(f"orjson: {'yes' if orjson is not None else 'no (stdlib json)'}")
+    print(f"extract legacy      {per_record_us(lambda: legacy_extra(tx)):7.2f} us/record")
+    print(f"extract attrgetter  {per_record_us(lambda: get_extra_data_log(tx)):7.2f} us/record")
+
+    cases = (
+        ("legacy", legacy_extra, legacy),
+        ("text", get_extra_data_log, text),
+        ("json", get_extra_data_log, structured),
+    )
+    for name, extract, formatter in cases:
+        cost = per_record_us(lambda: formatter.format(make_record(extract(tx))))
+        print(f"record {name:<12} {cost:7.2f} us/record")
+
+# Викликати вручну: вартість одного запису логу транзакції (extract + format)
+bench_logging()
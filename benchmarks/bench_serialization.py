@@ -0,0 +1,84 @@
+import json
+import timeit
+from datetime import datetime, timezone
+
+from pydantic import TypeAdapter
+
+from app.models import Transaction, TransactionType
+from app.schemas.serializers import (
+    TRANSACTION_MODELS, serialize_transaction, serialize_transactions,
+    _transaction_dict
+)
+from app.schemas.transactions import TransactionPublicPaginatedList
+
+TYPES = list(TransactionType)
+page_adapter = TypeAdapter(TransactionPublicPaginatedList)
+
+
+def sample_transactions(count: int) -> list:
+    now = datetime.now(timezone.utc)
+    return [
+        Transaction(
+            id=f"txn_{i:012d}",
+            user_id="user_111",
+            type=TYPES[i % len(TYPES)],
+            operation_id=f"op_{i:012d}",
+            cost_usd=0.012345,
+            amount_usd=1.2345,
+            credits=-100 if i % 3 == 0 else 100,
+            balance_before=1500,
+            balance_after=1400,
+            description="Image generation",
+            created_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+def legacy(txs) -> bytes:
+    # попередній шлях: model_validate на рядок, потім FastAPI повторно
+    # валідує response_model, dump_python(mode="json") та stdlib json
+    page = TransactionPublicPaginatedList(
+        total=len(txs), limit=len(txs), offset=0,
+        transactions=[serialize_transaction(tx) for tx in txs]
+    )
+    validated = page_adapter.validate_python(page, from_attributes=True)
+    content = page_adapter.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def adapter(txs) -> bytes:
+    page = TransactionPublicPaginatedList.model_construct(
+        total=len(txs), limit=len(txs), offset=0,
+        transactions=serialize_transactions(txs), next_cursor=None
+    )
+    return page.model_dump_json().encode()
+
+
+def construct(txs) -> bytes:
+    # model_construct без валідації: у Python на кожен рядок - повільніше
+    # за одну валідацію списку у pydantic-core
+    transactions = [
+        TRANSACTION_MODELS[tx.type].model_construct(**_transaction_dict(tx))
+        for tx in txs
+    ]
+    page = TransactionPublicPaginatedList.model_construct(
+        total=len(txs), limit=len(txs), offset=0,
+        transactions=transactions, next_cursor=None
+    )
+    return page.model_dump_json().encode()
+
+
+def bench_serialization():
+    for count in (100, 10000):
+        txs = sample_transactions(count)
+        number = max(1, 100000 // count)
+        for name, func in (
+            ("legacy", legacy), ("type_adapter", adapter), ("construct", construct)
+        ):
+            seconds = timeit.timeit(lambda: func(txs), number=number)
+            per_row = seconds / number / count * 1e6
+            print(f"{count:>6} rows  {name:<13} {per_row:6.2f} us/row")
+
+# Викликати вручну: вартість серіалізації сторінки історії транзакцій
+bench_serialization()
@@ -0,0 +1,100 @@
+import timeit
+
+from sqlalchemy import select, update, true
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import aliased
+
+from app.models import User, Subscription, Credits, Transaction
+from app.utils import idempotency, request_context, service_balance
+
+NUMBER = 5000
+dialect = postgresql.asyncpg.dialect()
+
+
+# попередні версії: запит будувався заново на кожен виклик
+def legacy_context(user_id: str, operation_id: str):
+    stmt = (
+        select(
+            User.id, Subscription.plan_id,
+            Credits.balance, Credits.total_earned, Credits.total_spent,
+        )
+        .outerjoin(Subscription, Subscription.user_id == User.id)
+        .outerjoin(Credits, Credits.user_id == User.id)
+        .where(User.id == user_id)
+    )
+    existing = aliased(
+        Transaction,
+        select(Transaction)
+        .where(Transaction.operation_id == operation_id)
+        .subquery()
+    )
+    return stmt.add_columns(existing).outerjoin(existing, true())
+
+
+def legacy_update_credits(user_id: str, delta: int):
+    stmt = pg_insert(Credits).values(
+        user_id=user_id, balance=delta, total_earned=delta, total_spent=0,
+        version=1
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[Credits.user_id],
+        set_={
+            "balance": Credits.balance + delta,
+            "total_earned": Credits.total_earned + delta,
+            "total_spent": Credits.total_spent + 0,
+            "version": Credits.version + 1,
+        },
+    ).returning(*service_balance._RETURNING)
+
+
+def legacy_charge_credits(user_id: str, amount: int):
+    return (
+        update(Credits)
+        .where(Credits.user_id == user_id, Credits.balance >= amount)
+        .values(
+            balance=Credits.balance - amount,
+            total_spent=Credits.total_spent + amount,
+            version=Credits.version + 1,
+        )
+        .returning(*service_balance._RETURNING)
+    )
+
+
+def legacy_operation(operation_id: str):
+    return select(Transaction).where(Transaction.operation_id == operation_id)
+
+
+CASES = (
+    ("request context", lambda: legacy_context("user_111", "op_1"),
+     request_context._CONTEXT_WITH_OPERATION),
+    ("update credits", lambda: legacy_update_credits("user_111", 100),
+     service_balance._UPDATE_CREDITS),
+    ("charge credits", lambda: legacy_charge_credits("user_111", 100),
+     service_balance._CHARGE_CREDITS),
+    ("operation lookup", lambda: legacy_operation("op_1"),
+     idempotency._TRANSACTION_BY_OPERATION),
+)
+
+
+def per_call_us(func) -> float:
+    return timeit.timeit(func, number=NUMBER) / NUMBER * 1e6
+
+
+def bench_statements():
+    """
+    Вартість підготовки запиту до виконання на кожен виклик:
+    побудова конструкції + ключ кешу компіляції (compiled cache hit).
+    Повна компіляція (compile) - лише для порівняння: її вже уникає кеш SQLAlchemy.
+    """
+    for name, build, cached in CASES:
+        rebuilt = per_call_us(lambda: build()._generate_cache_key())
+        module = per_call_us(lambda: cached._generate_cache_key())
+        compiled = per_call_us(lambda: cached.compile(dialect=dialect))
+        print(
+            f"{name:<17} rebuild+key {rebuilt:7.1f} us   "
+            f"module-level {module:5.2f} us   full compile {compiled:7.1f} us"
+        )
+
+# Викликати вручну: скільки коштує побудова гарячих запитів на кожен виклик
+bench_statements()
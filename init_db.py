@@ -1,16 +1,24 @@
-from app.core.database import engine, Base
+from app.core.database import engine, Base, async_session
 
 from app.models.settings import Settings, AdminLog, AdminOperationType
 from app.models.user import User
 from app.models.subscription import Subscription
 from app.models.credits import Credits
-from app.models.transaction import Transaction
+from app.models.transaction import (
+    Transaction, TransactionCounter, TransactionOperation
+)
+from app.models.rollup import DailyUsageRollup, DailyUsageRollupState
+from app.utils.partitions import ensure_transaction_partitions
 
 
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
+    # create_all створює лише батьківську партиціоновану transactions
+    async with async_session() as session:
+        await ensure_transaction_partitions(session)
+
 # Викликати при старті
 import asyncio
 asyncio.run(init_db())
@@ -0,0 +1,31 @@
+from sqlalchemy import delete, func, insert, select, text
+
+from app.core.database import engine
+from app.models.transaction import Transaction, TransactionCounter
+
+
+async def repair_counters():
+    """
+    Перерахувати transaction_counters з таблиці transactions.
+    EXCLUSIVE lock блокує запис лічильників на час перерахунку:
+    транзакції, що вже оновили лічильник, встигають закомітитись до нього,
+    нові - інкрементують лічильник вже після перерахунку.
+    """
+    async with engine.begin() as conn:
+        await conn.execute(
+            text("LOCK TABLE transaction_counters IN EXCLUSIVE MODE")
+        )
+        await conn.execute(delete(TransactionCounter))
+        result = await conn.execute(
+            insert(TransactionCounter).from_select(
+                ["user_id", "type", "count"],
+                select(
+                    Transaction.user_id, Transaction.type, func.count()
+                ).group_by(Transaction.user_id, Transaction.type)
+            )
+        )
+        print(f"Transaction counters repaired: {result.rowcount} rows")
+
+# Викликати вручну, якщо лічильники розійшлися з transactions
+import asyncio
+asyncio.run(repair_counters())
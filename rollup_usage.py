@@ -0,0 +1,20 @@
+import sys
+
+from app.core.database import async_session
+from app.utils.archive import archive_horizon
+from app.utils.statistics import refresh_statistics_rollup
+
+
+async def rollup_usage(rebuild: bool):
+    # дні до межі холодного архіву не перераховуються (транзакцій вже немає в БД)
+    horizon = archive_horizon()
+    async with async_session() as session:
+        rolled_through = await refresh_statistics_rollup(
+            session, rebuild=rebuild,
+            keep_before=horizon.date() if horizon is not None else None
+        )
+    print(f"Daily usage rollup is up to date through {rolled_through}")
+
+# Викликати вручну: catch-up денних rollups (--rebuild - перерахувати все)
+import asyncio
+asyncio.run(rollup_usage("--rebuild" in sys.argv))
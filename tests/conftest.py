@@ -11,7 +11,9 @@ from sqlalchemy.ext.asyncio import (
 
 from app.main import app
 from app.core.config import config
+from app.core.database import engine as app_engine
 from app.core.dependencies import get_session
+from app.utils.redis_cache import redis_client
 
 
 # Override get_db для кожного тесту окремо
@@ -42,6 +44,10 @@ async def db_session():
 	# Cleanup після тесту
 	app.dependency_overrides.clear()
 	await engine.dispose()  #  Закриваємо engine
+	# з'єднання Redis прив'язані до event loop тесту - наступний тест відкриє нові
+	await redis_client.connection_pool.disconnect()
+	# так само пул engine застосунку (стрімінг експорту, фонові сесії)
+	await app_engine.dispose()
 
 
 @pytest_asyncio.fixture
@@ -1,5 +1,17 @@
+import csv
+import gzip
+import io
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
 import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
 from app.core.config import config
+from app.models import Transaction, TransactionType, User
+from app.utils.redis_cache import redis_client
 
 
 @pytest.mark.asyncio
@@ -37,3 +49,279 @@ async def test_list_admin_subscription_plans(async_client):
 
     else:
         pytest.skip("No plans yet.")
+
+
+@pytest.mark.asyncio
+async def test_admin_cache_stats(async_client):
+    resp = await async_client.get(
+        "/api/admin/cache/stats",
+        headers={"X-Admin-Token": config.ADMIN_TOKEN}
+    )
+    assert resp.status_code == 200
+
+    data = resp.json()
+    assert isinstance(data["local_cache_enabled"], bool)
+    assert isinstance(data["caches"], dict)
+    for tiers in data["caches"].values():
+        for counters in tiers.values():
+            assert set(counters) == {"hits", "misses"}
+
+
+@pytest.mark.asyncio
+async def test_admin_http_client_stats(async_client):
+    resp = await async_client.get(
+        "/api/admin/http-client/stats",
+        headers={"X-Admin-Token": config.ADMIN_TOKEN}
+    )
+    assert resp.status_code == 200
+
+    data = resp.json()
+    assert data["in_flight"] >= 0
+    assert data["connections_opened"] <= data["requests"]
+
+
+@pytest.mark.asyncio
+async def test_admin_logging_stats(async_client):
+    resp = await async_client.get(
+        "/api/admin/logging/stats",
+        headers={"X-Admin-Token": config.ADMIN_TOKEN}
+    )
+    assert resp.status_code == 200
+
+    data = resp.json()
+    assert data["overflow_policy"] in ("drop_new", "drop_oldest", "block")
+    assert data["queued"] >= 0 and data["dropped"] >= 0
+
+
+@pytest.mark.asyncio
+async def test_admin_statistics_series(async_client):
+    resp = await async_client.get(
+        "/api/admin/statistics/series",
+        params={"bucket": "day"},
+        headers={"X-Admin-Token": config.ADMIN_TOKEN}
+    )
+    assert resp.status_code == 200
+
+    data = resp.json()
+    assert data["bucket"] == "day"
+    assert isinstance(data["points"], list)
+
+    expected_fields = {
+        "bucket",
+        "tier",
+        "charges",
+        "additions",
+        "subscriptions",
+        "credits_charged",
+        "credits_added",
+        "credits_granted",
+        "cost_usd",
+        "amount_usd",
+    }
+    for point in data["points"]:
+        assert set(point) == expected_fields
+
+
+@pytest.mark.asyncio
+async def test_admin_change_survives_redis_outage(async_client, monkeypatch):
+    async def redis_down(*args, **kwargs):
+        raise RedisConnectionError("Redis is down")
+
+    # зміна вже закомічена - скидання кешу статистики не ламає відповідь
+    monkeypatch.setattr(redis_client, "incr", redis_down)
+    monkeypatch.setattr(redis_client, "publish", redis_down)
+
+    resp = await async_client.post(
+        "/api/admin/subscription-plans",
+        headers={"X-Admin-Token": config.ADMIN_TOKEN},
+        json={
+            "tier": "test_admin",
+            "name": "test_admin",
+            "monthly_cost": 10,
+            "fixed_cost": 1,
+            "credits_included": 100,
+            "bonus_credits": 10,
+            "multiplier": 1.0,
+            "purchase_rate": 1.0,
+            "active": True,
+        },
+    )
+    assert resp.status_code in (201, 409)
+
+    resp = await async_client.patch(
+        "/api/admin/subscription-plans/test_admin/multiplier",
+        params={"multiplier": 1.0},
+        headers={"X-Admin-Token": config.ADMIN_TOKEN},
+    )
+    assert resp.status_code == 200
+
+
+async def _create_subscriber(async_client) -> tuple:
+    """Новий user з власним tier (експорт tier містить лише його рядки)"""
+    suffix = uuid.uuid4().hex[:8]
+    user_id, tier = f"test_{suffix}", f"test_export_{suffix}"
+
+    engine = create_async_engine(config.DATABASE_URL)
+    try:
+        async with AsyncSession(engine) as session:
+            session.add(User(id=user_id))
+            await session.commit()
+    finally:
+        await engine.dispose()
+
+    resp = await async_client.post(
+        "/api/admin/subscription-plans",
+        headers={"X-Admin-Token": config.ADMIN_TOKEN},
+        json={
+            "tier": tier,
+            "name": tier,
+            "monthly_cost": 10,
+            "fixed_cost": 1,
+            "credits_included": 100,
+            "bonus_credits": 10,
+            "multiplier": 1.0,
+            "purchase_rate": 1.0,
+            "active": True,
+        },
+    )
+    assert resp.status_code == 201
+
+    resp = await async_client.post(
+        "/api/internal/subscription/update",
+        headers={"X-Service-Token": config.SERVICE_TOKEN},
+        json={
+            "user_id": user_id,
+            "subscription_tier": tier,
+            "credits_to_add": 1000,
+            "operation_id": f"op_test_{suffix}",
+        },
+    )
+    assert resp.status_code == 200
+    return user_id, tier
+
+
+async def _add_charges(user_id: str, *created_at: datetime) -> list:
+    engine = create_async_engine(config.DATABASE_URL)
+    try:
+        async with AsyncSession(engine) as session:
+            ids = []
+            for value in created_at:
+                suffix = uuid.uuid4().hex[:12]
+                ids.append(f"txn_test_{suffix}")
+                session.add(Transaction(
+                    id=ids[-1],
+                    user_id=user_id,
+                    type=TransactionType.CHARGE,
+                    operation_id=f"op_test_{suffix}",
+                    cost_usd=0.01,
+                    credits=-100,
+                    balance_before=1000,
+                    balance_after=900,
+                    info={"n": len(ids)},
+                    created_at=value,
+                ))
+            await session.commit()
+            return ids
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_admin_export_transactions(async_client):
+    user_id, tier = await _create_subscriber(async_client)
+    other_user_id, other_tier = await _create_subscriber(async_client)
+
+    # тиждень тому: рядки не перетинаються з SUBSCRIPTION від subscription/update
+    start = (datetime.now(timezone.utc) - timedelta(days=7)).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    inside = await _add_charges(
+        user_id,
+        start,
+        start + timedelta(hours=12),
+        # межа end_date: 23:59:59.5 ще належить дню
+        start + timedelta(days=2) - timedelta(microseconds=500000),
+    )
+    outside = await _add_charges(
+        user_id,
+        start - timedelta(microseconds=1),
+        start + timedelta(days=2),
+    )
+    other = await _add_charges(other_user_id, start + timedelta(hours=12))
+
+    params = {
+        "start_date": start.date().isoformat(),
+        "end_date": (start + timedelta(days=1)).date().isoformat(),
+        "tier": tier,
+    }
+    resp = await async_client.get(
+        "/api/admin/transactions/export",
+        params=params,
+        headers={"X-Admin-Token": config.ADMIN_TOKEN}
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+
+    rows = [json.loads(line) for line in resp.text.splitlines() if line]
+    # інший tier та рядки поза [start_date, end_date + 1 день) не потрапляють
+    assert [row["id"] for row in rows] == inside
+    assert not {row["id"] for row in rows} & {*outside, *other}
+    assert {row["user_id"] for row in rows} == {user_id}
+    assert rows[0]["type"] == "charge"
+    assert rows[0]["credits"] == -100
+    assert rows[0]["created_at"] == start.isoformat()
+
+    # CSV з gzip - ті самі рядки
+    resp = await async_client.get(
+        "/api/admin/transactions/export",
+        params={**params, "format": "csv", "gzip": True},
+        headers={"X-Admin-Token": config.ADMIN_TOKEN}
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/gzip")
+
+    reader = csv.DictReader(io.StringIO(gzip.decompress(resp.content).decode()))
+    rows = list(reader)
+    assert [row["id"] for row in rows] == inside
+    assert json.loads(rows[0]["info"]) == {"n": 1}
+
+    # другий tier бачить лише свій рядок
+    resp = await async_client.get(
+        "/api/admin/transactions/export",
+        params={**params, "tier": other_tier},
+        headers={"X-Admin-Token": config.ADMIN_TOKEN}
+    )
+    assert resp.status_code == 200
+    assert [json.loads(line)["id"] for line in resp.text.splitlines()] == other
+
+
+@pytest.mark.asyncio
+async def test_admin_export_empty_and_unknown_tier(async_client):
+    user_id, tier = await _create_subscriber(async_client)
+
+    resp = await async_client.get(
+        "/api/admin/transactions/export",
+        params={
+            "start_date": "2021-03-01",
+            "end_date": "2021-03-31",
+            "tier": tier,
+            "format": "csv",
+        },
+        headers={"X-Admin-Token": config.ADMIN_TOKEN}
+    )
+    assert resp.status_code == 200
+    # порожній CSV - лише заголовок
+    lines = resp.text.splitlines()
+    assert len(lines) == 1
+    assert lines[0].split(",")[0] == "id"
+
+    resp = await async_client.get(
+        "/api/admin/transactions/export",
+        params={
+            "start_date": "2021-03-01",
+            "end_date": "2021-03-31",
+            "tier": f"{tier}_missing",
+        },
+        headers={"X-Admin-Token": config.ADMIN_TOKEN}
+    )
+    assert resp.status_code == 404
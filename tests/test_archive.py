@@ -0,0 +1,273 @@
+import json
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import select, func, text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+from app.core.config import config
+from app.models import (
+    Transaction, TransactionOperation, TransactionType, User
+)
+from app.utils.archive import archive_transactions, iter_archived, load_manifest
+from app.utils.partitions import partition_ddl, partition_name
+from app.utils.redis_cache import get_redis
+
+SERVICE_HEADERS = {"X-Service-Token": config.SERVICE_TOKEN}
+ADMIN_HEADERS = {"X-Admin-Token": config.ADMIN_TOKEN}
+
+# місяць, старший за будь-які дані тестової БД: архівується лише він
+ARCHIVE_MONTH = datetime(2020, 1, 1, tzinfo=timezone.utc).date()
+ARCHIVE_NOW = datetime(2020, 2, 15, tzinfo=timezone.utc)
+
+CREATED_AT = (
+    datetime(2020, 1, 10, 0, 0, 0, tzinfo=timezone.utc),
+    datetime(2020, 1, 15, 12, 0, 0, tzinfo=timezone.utc),
+    datetime(2020, 1, 15, 12, 0, 0, tzinfo=timezone.utc),
+    # межа дня: потрапляє в end_date=2020-01-31
+    datetime(2020, 1, 31, 23, 59, 59, 500000, tzinfo=timezone.utc),
+)
+
+
+async def _create_subscriber(async_client) -> tuple:
+    suffix = uuid.uuid4().hex[:8]
+    user_id, tier = f"test_{suffix}", f"test_archive_{suffix}"
+
+    engine = create_async_engine(config.DATABASE_URL)
+    try:
+        async with AsyncSession(engine) as session:
+            session.add(User(id=user_id))
+            await session.commit()
+    finally:
+        await engine.dispose()
+
+    resp = await async_client.post(
+        "/api/admin/subscription-plans",
+        headers=ADMIN_HEADERS,
+        json={
+            "tier": tier,
+            "name": tier,
+            "monthly_cost": 10,
+            "fixed_cost": 1,
+            "credits_included": 100,
+            "bonus_credits": 10,
+            "multiplier": 1.0,
+            "purchase_rate": 1.0,
+            "active": True,
+        },
+    )
+    assert resp.status_code == 201
+
+    resp = await async_client.post(
+        "/api/internal/subscription/update",
+        headers=SERVICE_HEADERS,
+        json={
+            "user_id": user_id,
+            "subscription_tier": tier,
+            "credits_to_add": 1000,
+            "operation_id": f"op_test_{suffix}",
+        },
+    )
+    assert resp.status_code == 200
+    return user_id, tier
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "ARCHIVE_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+async def archived_user(async_client, archive_dir):
+    """User з транзакціями ARCHIVE_MONTH, перенесеними в архів"""
+    user_id, tier = await _create_subscriber(async_client)
+
+    engine = create_async_engine(config.DATABASE_URL)
+    try:
+        async with AsyncSession(engine) as session:
+            await session.execute(text(partition_ddl(ARCHIVE_MONTH)))
+            ids = []
+            for created_at in CREATED_AT:
+                suffix = uuid.uuid4().hex[:12]
+                ids.append(f"txn_test_{suffix}")
+                session.add(Transaction(
+                    id=ids[-1],
+                    user_id=user_id,
+                    type=TransactionType.CHARGE,
+                    operation_id=f"op_test_{suffix}",
+                    cost_usd=0.01,
+                    credits=-100,
+                    balance_before=1000,
+                    balance_after=900,
+                    info={},
+                    created_at=created_at,
+                ))
+                session.add(TransactionOperation(
+                    operation_id=f"op_test_{suffix}",
+                    transaction_id=ids[-1],
+                    created_at=created_at,
+                ))
+            await session.commit()
+
+            archived = await archive_transactions(
+                session, retention_months=0, now=ARCHIVE_NOW
+            )
+    finally:
+        await engine.dispose()
+
+    return user_id, tier, ids, archived
+
+
+async def _export(async_client, start_date: str, end_date: str, tier: str) -> list:
+    resp = await async_client.get(
+        "/api/admin/transactions/export",
+        params={"start_date": start_date, "end_date": end_date, "tier": tier},
+        headers=ADMIN_HEADERS,
+    )
+    assert resp.status_code == 200
+    return [json.loads(line) for line in resp.text.splitlines() if line]
+
+
+@pytest.mark.asyncio
+async def test_archive_transactions(archived_user):
+    user_id, tier, ids, archived = archived_user
+
+    entry = next(item for item in archived if item["month"] == "2020-01")
+    assert entry["rows"] >= len(ids)
+    assert entry["pending_delete"] is False
+    assert load_manifest()["archived_before"] == "2020-02-01T00:00:00+00:00"
+
+    engine = create_async_engine(config.DATABASE_URL)
+    try:
+        async with AsyncSession(engine) as session:
+            result = await session.execute(
+                select(Transaction.id).where(Transaction.user_id == user_id)
+                .where(Transaction.created_at < ARCHIVE_NOW)
+            )
+            assert result.all() == []
+
+            # партиція місяця від'єднана і видалена
+            result = await session.execute(
+                text("SELECT to_regclass(:name)"),
+                {"name": partition_name(ARCHIVE_MONTH)},
+            )
+            assert result.scalar() is None
+
+            # operation_id лишаються: архівовану операцію не виконати вдруге
+            result = await session.execute(
+                select(func.count())
+                .select_from(TransactionOperation)
+                .where(TransactionOperation.transaction_id.in_(ids))
+            )
+            assert result.scalar() == len(ids)
+    finally:
+        await engine.dispose()
+
+    # повторний запуск нічого не архівує
+    engine = create_async_engine(config.DATABASE_URL)
+    try:
+        async with AsyncSession(engine) as session:
+            again = await archive_transactions(
+                session, retention_months=0, now=ARCHIVE_NOW
+            )
+            assert again == []
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_iter_archived(archived_user):
+    user_id, tier, ids, archived = archived_user
+
+    items = [
+        item
+        async for batch in iter_archived(
+            datetime(2020, 1, 1, tzinfo=timezone.utc),
+            datetime(2020, 2, 1, tzinfo=timezone.utc),
+            {user_id},
+        )
+        for item in batch
+    ]
+    assert sorted(item["id"] for item in items) == sorted(ids)
+    assert [item["created_at"] for item in items] == list(CREATED_AT)
+    assert {item["user_id"] for item in items} == {user_id}
+
+    # напіввідкритий інтервал [start, end)
+    items = [
+        item
+        async for batch in iter_archived(
+            CREATED_AT[0], CREATED_AT[1], {user_id}
+        )
+        for item in batch
+    ]
+    assert [item["created_at"] for item in items] == [CREATED_AT[0]]
+
+
+@pytest.mark.asyncio
+async def test_export_reads_archive(async_client, archived_user):
+    user_id, tier, ids, archived = archived_user
+
+    rows = await _export(async_client, "2020-01-01", "2020-01-31", tier)
+    assert sorted(row["id"] for row in rows) == sorted(ids)
+
+    # рядок о 23:59:59.5 належить end_date, а не наступному дню
+    rows = await _export(async_client, "2020-01-31", "2020-01-31", tier)
+    assert [row["id"] for row in rows] == [ids[-1]]
+    rows = await _export(async_client, "2020-01-11", "2020-01-30", tier)
+    assert sorted(row["id"] for row in rows) == sorted(ids[1:3])
+
+    # архів і БД разом: підписка (сьогодні) - з БД, рядки 2020-01 - з архіву
+    rows = await _export(
+        async_client, "2020-01-01", datetime.now(timezone.utc).date().isoformat(), tier
+    )
+    assert sorted(row["id"] for row in rows[:len(ids)]) == sorted(ids)
+    assert rows[-1]["type"] == "subscription"
+
+
+@pytest.mark.asyncio
+async def test_statistics_series_reads_archive(async_client, archived_user):
+    user_id, tier, ids, archived = archived_user
+
+    # закриті бакети кешуються для всіх tiers - прибираємо точки попередніх прогонів
+    r = await get_redis()
+    keys = [key async for key in r.scan_iter("stats:series:day:2020-01-*")]
+    if keys:
+        await r.delete(*keys)
+
+    resp = await async_client.get(
+        "/api/admin/statistics/series",
+        params={
+            "bucket": "day",
+            "start": "2020-01-01T00:00:00Z",
+            "end": "2020-02-01T00:00:00Z",
+            "tier": tier,
+        },
+        headers=ADMIN_HEADERS,
+    )
+    assert resp.status_code == 200
+
+    points = resp.json()["points"]
+    charges = {point["bucket"][:10]: point["charges"] for point in points}
+    assert charges == {"2020-01-10": 1, "2020-01-15": 2, "2020-01-31": 1}
+    assert sum(point["credits_charged"] for point in points) == 100 * len(ids)
+
+
+@pytest.mark.asyncio
+async def test_archived_operation_replay_conflict(async_client, archived_user):
+    user_id, tier, ids, archived = archived_user
+    operation_id = ids[0].replace("txn_test_", "op_test_")
+
+    resp = await async_client.post(
+        "/api/internal/credits/charge",
+        headers=SERVICE_HEADERS,
+        json={
+            "user_id": user_id,
+            "cost_usd": 0.01,
+            "operation_id": operation_id,
+            "description": "test charge",
+            "metadata": {},
+        },
+    )
+    assert resp.status_code == 409
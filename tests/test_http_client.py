@@ -0,0 +1,128 @@
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.core.config import config
+from app.utils import http_client
+from app.utils.http_client import call_internal_api, get_http_client_stats
+
+
+class _Responder:
+    """Відповіді Internal API по черзі; останній елемент повторюється"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        outcome = self.outcomes[min(self.calls, len(self.outcomes) - 1)]
+        self.calls += 1
+        if isinstance(outcome, type) and issubclass(outcome, Exception):
+            raise outcome("mocked", request=request)
+        return httpx.Response(outcome, json={"ok": outcome == 200})
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    """Мок-клієнт замість пулу worker; записує паузи між спробами"""
+    recorded = []
+
+    async def sleep(seconds):
+        recorded.append(seconds)
+
+    monkeypatch.setattr(config, "HTTP_RETRIES", 2)
+    monkeypatch.setattr(config, "HTTP_RETRY_BACKOFF_SECONDS", 0.1)
+    monkeypatch.setattr(http_client.asyncio, "sleep", sleep)
+    # верхня межа jitter - перевіряється саме експонента
+    monkeypatch.setattr(http_client.random, "uniform", lambda low, high: high)
+    return recorded
+
+
+def _mock_client(monkeypatch, responder: _Responder):
+    monkeypatch.setattr(http_client, "_client", httpx.AsyncClient(
+        base_url="http://internal", transport=httpx.MockTransport(responder)
+    ))
+
+
+@pytest.mark.asyncio
+async def test_idempotent_call_retries_with_backoff(monkeypatch, delays):
+    responder = _Responder(503, 502, 200)
+    _mock_client(monkeypatch, responder)
+    before = get_http_client_stats()
+
+    data = await call_internal_api("/api/internal/credits/charge", {}, idempotent=True)
+    assert data == {"ok": True}
+    assert responder.calls == 3
+    assert delays == [0.1, 0.2]
+
+    stats = get_http_client_stats()
+    assert stats["requests"] - before["requests"] == 3
+    assert stats["retries"] - before["retries"] == 2
+    assert stats["in_flight"] == before["in_flight"]
+
+
+@pytest.mark.asyncio
+async def test_idempotent_call_gives_up_after_retries(monkeypatch, delays):
+    responder = _Responder(503)
+    _mock_client(monkeypatch, responder)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await call_internal_api("/api/internal/credits/charge", {}, idempotent=True)
+    # остання відповідь повертається як є
+    assert exc_info.value.status_code == 503
+    assert responder.calls == 1 + config.HTTP_RETRIES
+
+    responder = _Responder(httpx.ReadError)
+    _mock_client(monkeypatch, responder)
+    errors = get_http_client_stats()["errors"]
+
+    with pytest.raises(HTTPException) as exc_info:
+        await call_internal_api("/api/internal/credits/charge", {}, idempotent=True)
+    assert exc_info.value.status_code == 503
+    assert responder.calls == 1 + config.HTTP_RETRIES
+    assert get_http_client_stats()["errors"] == errors + 1
+
+
+@pytest.mark.asyncio
+async def test_non_idempotent_call_is_not_retried(monkeypatch, delays):
+    # 5xx після відправки: запит міг виконатись
+    responder = _Responder(503, 200)
+    _mock_client(monkeypatch, responder)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await call_internal_api("/api/internal/credits/charge", {})
+    assert exc_info.value.status_code == 503
+    assert responder.calls == 1
+
+    # обрив після відправки: теж без повтору
+    responder = _Responder(httpx.ReadTimeout, 200)
+    _mock_client(monkeypatch, responder)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await call_internal_api("/api/internal/credits/charge", {})
+    assert exc_info.value.status_code == 503
+    assert responder.calls == 1
+    assert delays == []
+
+
+@pytest.mark.asyncio
+async def test_connect_error_is_retried_for_any_call(monkeypatch, delays):
+    # з'єднання не встановлено - запит не відправлено, повтор безпечний
+    responder = _Responder(httpx.ConnectError, 200)
+    _mock_client(monkeypatch, responder)
+
+    data = await call_internal_api("/api/internal/credits/charge", {})
+    assert data == {"ok": True}
+    assert responder.calls == 2
+    assert delays == [0.1]
+
+
+@pytest.mark.asyncio
+async def test_client_error_is_not_retried(monkeypatch, delays):
+    responder = _Responder(409, 200)
+    _mock_client(monkeypatch, responder)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await call_internal_api("/api/internal/credits/charge", {}, idempotent=True)
+    assert exc_info.value.status_code == 409
+    assert responder.calls == 1
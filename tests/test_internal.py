@@ -0,0 +1,373 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+from app.core.config import config
+from app.models import Credits, TransactionCounter, TransactionType, User
+from app.utils.redis_cache import get_redis
+from app.utils.service_balance import (
+    BalanceService, CACHE_STRATEGY_WRITE_THROUGH, balance_local_cache
+)
+
+SERVICE_HEADERS = {"X-Service-Token": config.SERVICE_TOKEN}
+ADMIN_HEADERS = {"X-Admin-Token": config.ADMIN_TOKEN}
+TEST_TIER = "test_internal"
+
+
+def _operation_id() -> str:
+    return f"op_test_{uuid.uuid4().hex[:12]}"
+
+
+async def _db_fetch(stmt):
+    # окремий engine: тести не діляться з'єднаннями з пулом застосунку
+    engine = create_async_engine(config.DATABASE_URL)
+    try:
+        async with AsyncSession(engine) as session:
+            result = await session.execute(stmt)
+            return result.all()
+    finally:
+        await engine.dispose()
+
+
+async def _create_user(async_client, credits: int = 1000) -> str:
+    """Новий user з підпискою TEST_TIER і credits на балансі"""
+    user_id = f"test_{uuid.uuid4().hex[:12]}"
+    engine = create_async_engine(config.DATABASE_URL)
+    try:
+        async with AsyncSession(engine) as session:
+            session.add(User(id=user_id))
+            await session.commit()
+    finally:
+        await engine.dispose()
+
+    # план може вже існувати після попереднього прогону (409)
+    resp = await async_client.post(
+        "/api/admin/subscription-plans",
+        headers=ADMIN_HEADERS,
+        json={
+            "tier": TEST_TIER,
+            "name": TEST_TIER,
+            "monthly_cost": 10,
+            "fixed_cost": 1,
+            "credits_included": 100,
+            "bonus_credits": 10,
+            "multiplier": 1.0,
+            "purchase_rate": 1.0,
+            "active": True,
+        },
+    )
+    assert resp.status_code in (201, 409)
+
+    resp = await async_client.post(
+        "/api/internal/subscription/update",
+        headers=SERVICE_HEADERS,
+        json={
+            "user_id": user_id,
+            "subscription_tier": TEST_TIER,
+            "credits_to_add": credits,
+            "operation_id": _operation_id(),
+        },
+    )
+    assert resp.status_code == 200
+    assert resp.json()["new_balance"] == credits
+    return user_id
+
+
+async def _credits_to_charge(async_client, user_id: str, cost_usd: float) -> int:
+    resp = await async_client.post(
+        "/api/internal/credits/calculate",
+        headers=SERVICE_HEADERS,
+        json={"user_id": user_id, "cost_usd": cost_usd},
+    )
+    assert resp.status_code == 200
+    return resp.json()["credits_to_charge"]
+
+
+async def _charge(async_client, user_id: str, cost_usd: float, operation_id: str):
+    return await async_client.post(
+        "/api/internal/credits/charge",
+        headers=SERVICE_HEADERS,
+        json={
+            "user_id": user_id,
+            "cost_usd": cost_usd,
+            "operation_id": operation_id,
+            "description": "test charge",
+            "metadata": {},
+        },
+    )
+
+
+async def _balance(async_client, user_id: str) -> dict:
+    resp = await async_client.get(
+        f"/api/internal/credits/balance/{user_id}", headers=SERVICE_HEADERS
+    )
+    assert resp.status_code == 200
+    return resp.json()["credits"]
+
+
+async def _charge_count(user_id: str) -> int:
+    rows = await _db_fetch(
+        select(TransactionCounter.count)
+        .where(TransactionCounter.user_id == user_id)
+        .where(TransactionCounter.type == TransactionType.CHARGE)
+    )
+    return rows[0][0] if rows else 0
+
+
+@pytest.mark.asyncio
+async def test_charge_guarded_debit(async_client):
+    user_id = await _create_user(async_client, credits=1000)
+    required = await _credits_to_charge(async_client, user_id, 0.01)
+
+    resp = await _charge(async_client, user_id, 0.01, _operation_id())
+    assert resp.status_code == 200
+
+    data = resp.json()
+    assert data["success"] is True
+    assert data["credits_charged"] == required
+    assert data["balance_before"] == 1000
+    assert data["balance_after"] == 1000 - required
+
+    credits = await _balance(async_client, user_id)
+    assert credits["balance"] == 1000 - required
+    assert credits["total_spent"] == required
+
+
+@pytest.mark.asyncio
+async def test_charge_insufficient_credits(async_client):
+    user_id = await _create_user(async_client, credits=10)
+    required = await _credits_to_charge(async_client, user_id, 1.0)
+    assert required > 10
+
+    resp = await _charge(async_client, user_id, 1.0, _operation_id())
+    assert resp.status_code == 200
+
+    data = resp.json()
+    assert data["success"] is False
+    assert data["error"] == "insufficient_credits"
+    assert data["required_credits"] == required
+    assert data["current_balance"] == 10
+    assert data["deficit"] == required - 10
+
+    # нічого не списано, транзакції немає
+    assert (await _balance(async_client, user_id))["balance"] == 10
+    assert await _charge_count(user_id) == 0
+
+
+@pytest.mark.asyncio
+async def test_charge_idempotent_replay(async_client):
+    user_id = await _create_user(async_client, credits=1000)
+    required = await _credits_to_charge(async_client, user_id, 0.01)
+    operation_id = _operation_id()
+
+    first = await _charge(async_client, user_id, 0.01, operation_id)
+    second = await _charge(async_client, user_id, 0.01, operation_id)
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+
+    # списано лише один раз
+    assert (await _balance(async_client, user_id))["balance"] == 1000 - required
+    assert await _charge_count(user_id) == 1
+
+
+@pytest.mark.asyncio
+async def test_charge_in_flight_duplicates_wait(async_client):
+    user_id = await _create_user(async_client, credits=1000)
+    required = await _credits_to_charge(async_client, user_id, 0.01)
+    operation_id = _operation_id()
+
+    # паралельні дублікати чекають на результат першого запиту
+    responses = await asyncio.gather(*(
+        _charge(async_client, user_id, 0.01, operation_id) for _ in range(5)
+    ))
+    assert all(resp.status_code == 200 for resp in responses)
+    assert len({resp.json()["transaction_id"] for resp in responses}) == 1
+
+    assert (await _balance(async_client, user_id))["balance"] == 1000 - required
+    assert await _charge_count(user_id) == 1
+
+
+@pytest.mark.asyncio
+async def test_balance_cache_versioned_write_through(async_client):
+    if config.BALANCE_CACHE_STRATEGY != CACHE_STRATEGY_WRITE_THROUGH:
+        pytest.skip("Balance cache strategy is not write_through.")
+
+    user_id = await _create_user(async_client, credits=1000)
+    resp = await _charge(async_client, user_id, 0.01, _operation_id())
+    assert resp.json()["success"] is True
+
+    # після commit кеш містить новий баланс з версією рядка credits
+    rows = await _db_fetch(
+        select(Credits.balance, Credits.version).where(Credits.user_id == user_id)
+    )
+    balance, version = rows[0]
+    r = await get_redis()
+    cached = json.loads(await r.get(f"user:{user_id}:balance"))
+    assert cached["balance"] == balance
+    assert cached["version"] == version
+
+    # запис зі старішою версією не перезаписує новіший (CAS)
+    stale = dict(cached, balance=balance + 500, version=version - 1)
+    assert await BalanceService._set_cache(r, user_id, stale) == 0
+    assert json.loads(await r.get(f"user:{user_id}:balance"))["balance"] == balance
+
+    newer = dict(cached, version=version + 1)
+    assert await BalanceService._set_cache(r, user_id, newer) == 1
+
+
+@pytest.mark.asyncio
+async def test_transaction_counter_increments(async_client):
+    user_id = await _create_user(async_client, credits=1000)
+    assert await _charge_count(user_id) == 0
+
+    resp = await _charge(async_client, user_id, 0.01, _operation_id())
+    assert resp.json()["success"] is True
+    assert await _charge_count(user_id) == 1
+
+    # пакет: лічильник зростає на кількість успішних списань
+    resp = await async_client.post(
+        "/api/internal/credits/charge/batch",
+        headers=SERVICE_HEADERS,
+        json={"items": [
+            {
+                "user_id": user_id,
+                "cost_usd": 0.01,
+                "operation_id": _operation_id(),
+                "description": "test batch",
+                "metadata": {},
+            }
+            for _ in range(2)
+        ]},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["charged"] == 2
+    assert await _charge_count(user_id) == 3
+
+
+@pytest.mark.asyncio
+async def test_balance_single_flight(async_client, monkeypatch):
+    user_id = await _create_user(async_client, credits=1000)
+
+    # холодний кеш: ні L1, ні Redis
+    r = await get_redis()
+    await r.delete(f"user:{user_id}:balance")
+    balance_local_cache.invalidate(user_id)
+
+    loads = 0
+    load_from_db = BalanceService._load_from_db
+
+    async def counting_load(self, load_user_id):
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.05)
+        return await load_from_db(self, load_user_id)
+
+    monkeypatch.setattr(BalanceService, "_load_from_db", counting_load)
+
+    engine = create_async_engine(config.DATABASE_URL)
+    try:
+        async with AsyncSession(engine) as session:
+            service = BalanceService(session)
+            results = await asyncio.gather(
+                *(service.get_credits(user_id) for _ in range(10))
+            )
+    finally:
+        await engine.dispose()
+
+    # паралельні запити одного worker'а чекають одне читання з БД
+    assert loads == 1
+    assert {credit.balance for credit in results} == {1000}
+
+
+@pytest.mark.asyncio
+async def test_batch_locks_in_one_call(async_client, monkeypatch):
+    user_id = await _create_user(async_client, credits=5000)
+    operation_ids = [_operation_id() for _ in range(20)]
+
+    r = await get_redis()
+    evals = 0
+    redis_eval = r.eval
+
+    async def counting_eval(*args, **kwargs):
+        nonlocal evals
+        evals += 1
+        return await redis_eval(*args, **kwargs)
+
+    monkeypatch.setattr(r, "eval", counting_eval)
+
+    resp = await async_client.post(
+        "/api/internal/credits/charge/batch",
+        headers=SERVICE_HEADERS,
+        json={"items": [
+            {
+                "user_id": user_id,
+                "cost_usd": 0.01,
+                "operation_id": operation_id,
+                "description": "test batch",
+                "metadata": {},
+            }
+            for operation_id in operation_ids
+        ]},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["charged"] == 20
+
+    # маркери in-flight: один виклик на захоплення і один на звільнення
+    assert evals == 2
+    assert not await r.exists(
+        *(f"idempotency:{operation_id}:lock" for operation_id in operation_ids)
+    )
+
+
+@pytest.mark.asyncio
+async def test_check_batch(async_client):
+    warm_user = await _create_user(async_client, credits=1000)
+    cold_user = await _create_user(async_client, credits=300)
+    no_plan_user = f"test_{uuid.uuid4().hex[:12]}"
+    engine = create_async_engine(config.DATABASE_URL)
+    try:
+        async with AsyncSession(engine) as session:
+            session.add(User(id=no_plan_user))
+            await session.commit()
+    finally:
+        await engine.dispose()
+
+    # баланс одного user вже в кеші, іншого - лише в БД
+    await _balance(async_client, warm_user)
+    r = await get_redis()
+    await r.delete(f"user:{cold_user}:balance")
+    balance_local_cache.invalidate(cold_user)
+
+    resp = await async_client.post(
+        "/api/internal/credits/check/batch",
+        headers=SERVICE_HEADERS,
+        json={"users": [
+            {"user_id": warm_user, "required_credits": 500},
+            {"user_id": cold_user, "required_credits": 500},
+            {"user_id": "test_unknown_user"},
+            {"user_id": no_plan_user, "required_credits": 1},
+            {"user_id": warm_user, "required_credits": 5000},
+            {"user_id": cold_user},
+        ]},
+    )
+    assert resp.status_code == 200
+
+    data = resp.json()
+    assert data["not_found"] == ["test_unknown_user"]
+    # порядок запиту зберігається, user може повторюватись
+    assert [
+        (item["user_id"], item["balance"], item["sufficient"])
+        for item in data["results"]
+    ] == [
+        (warm_user, 1000, True),
+        (cold_user, 300, False),
+        (no_plan_user, 0, False),
+        (warm_user, 1000, False),
+        (cold_user, 300, True),
+    ]
+    assert data["results"][0]["subscription_tier"] == TEST_TIER
+    assert data["results"][2]["has_subscription"] is False
@@ -0,0 +1,115 @@
+import logging
+import queue
+import threading
+
+from app.core import logging_config
+from app.core.logging_config import (
+    BatchingQueueListener,
+    BoundedQueueHandler,
+    OVERFLOW_BLOCK,
+    OVERFLOW_DROP_NEW,
+    OVERFLOW_DROP_OLDEST,
+    get_logging_stats,
+)
+
+
+def _records(count: int, name: str = "[INTERNAL]") -> list:
+    return [
+        logging.makeLogRecord(
+            {"name": name, "msg": f"record {i}", "levelno": logging.INFO}
+        )
+        for i in range(count)
+    ]
+
+
+def _drain(log_queue: queue.Queue) -> list:
+    items = []
+    while not log_queue.empty():
+        items.append(log_queue.get_nowait().getMessage())
+    return items
+
+
+class _ListHandler(logging.Handler):
+    """Handler маршруту: збирає записи, рахує скидання пачок"""
+
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(level)
+        self.messages = []
+        self.batches = 0
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+    def flush_batch(self):
+        self.batches += 1
+
+
+def test_overflow_drop_new():
+    handler = BoundedQueueHandler(queue.Queue(maxsize=2), OVERFLOW_DROP_NEW)
+    for record in _records(5):
+        handler.handle(record)
+
+    # старі записи лишаються, нові відкидаються
+    assert _drain(handler.queue) == ["record 0", "record 1"]
+    assert handler.dropped == 3
+
+
+def test_overflow_drop_oldest():
+    handler = BoundedQueueHandler(queue.Queue(maxsize=2), OVERFLOW_DROP_OLDEST)
+    for record in _records(5):
+        handler.handle(record)
+
+    # лишаються найновіші записи
+    assert _drain(handler.queue) == ["record 3", "record 4"]
+    assert handler.dropped == 3
+
+
+def test_overflow_block():
+    handler = BoundedQueueHandler(queue.Queue(maxsize=1), OVERFLOW_BLOCK)
+    first, second = _records(2)
+    handler.handle(first)
+
+    # повна черга: запис чекає на місце, а не губиться
+    writer = threading.Thread(target=handler.handle, args=(second,))
+    writer.start()
+    writer.join(timeout=0.1)
+    assert writer.is_alive()
+
+    assert handler.queue.get_nowait().getMessage() == "record 0"
+    writer.join(timeout=1)
+    assert not writer.is_alive()
+    assert _drain(handler.queue) == ["record 1"]
+    assert handler.dropped == 0
+
+
+def test_get_logging_stats(monkeypatch):
+    handler = BoundedQueueHandler(queue.Queue(maxsize=3), OVERFLOW_DROP_NEW)
+    monkeypatch.setattr(logging_config, "_queue_handler", handler)
+    for record in _records(4):
+        handler.handle(record)
+
+    assert get_logging_stats() == {"queued": 3, "dropped": 1}
+
+    monkeypatch.setattr(logging_config, "_queue_handler", None)
+    assert get_logging_stats() == {"queued": 0, "dropped": 0}
+
+
+def test_listener_routes_and_flushes_batches():
+    log_queue = queue.Queue(maxsize=4)
+    internal, admin = _ListHandler(), _ListHandler(logging.WARNING)
+    listener = BatchingQueueListener(
+        log_queue, {"[INTERNAL]": internal, "[ADMIN]": admin}
+    )
+    handler = BoundedQueueHandler(log_queue, OVERFLOW_DROP_NEW)
+
+    # черга заповнена до старту: sentinel stop() все одно має в неї потрапити
+    for record in _records(2) + _records(1, "[ADMIN]") + _records(1, "[OTHER]"):
+        handler.handle(record)
+    listener.start()
+    listener.stop()
+
+    assert internal.messages == ["record 0", "record 1"]
+    # рівень handler маршруту фільтрує INFO, невідомий logger ігнорується
+    assert admin.messages == []
+    assert internal.batches >= 1 and internal.batches == admin.batches
+    assert handler.dropped == 0
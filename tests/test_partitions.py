@@ -0,0 +1,180 @@
+import uuid
+from datetime import date, datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import delete, text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+from app.core.config import config
+from app.models import (
+    Transaction, TransactionOperation, TransactionType, User
+)
+from app.utils.idempotency import check_idempotency, get_existing_transactions
+from app.utils.ledger import add_transaction
+from app.utils.partitions import (
+    DEFAULT_PARTITION, ensure_transaction_partitions, partition_ddl, partition_name
+)
+
+# далекі місяці: партиції цього тесту не перетинаються з даними інших
+MAY, JUNE, JULY = date(2031, 5, 1), date(2031, 6, 1), date(2031, 7, 1)
+
+
+async def _partitions(session: AsyncSession) -> set:
+    result = await session.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'transactions'::regclass"
+    ))
+    return set(result.scalars().all())
+
+
+async def _drop_partitions(session: AsyncSession, *months: date):
+    for month in months:
+        await session.execute(text(f"DROP TABLE IF EXISTS {partition_name(month)}"))
+    await session.commit()
+
+
+async def _create_user(session: AsyncSession) -> str:
+    user_id = f"test_{uuid.uuid4().hex[:12]}"
+    session.add(User(id=user_id))
+    await session.commit()
+    return user_id
+
+
+def _charge_tx(user_id: str, tx_id: str, operation_id: str, created_at: datetime):
+    return Transaction(
+        id=tx_id,
+        user_id=user_id,
+        type=TransactionType.CHARGE,
+        operation_id=operation_id,
+        cost_usd=0.01,
+        credits=-100,
+        balance_before=1000,
+        balance_after=900,
+        info={},
+        created_at=created_at,
+    )
+
+
+@pytest.mark.asyncio
+async def test_ensure_transaction_partitions():
+    engine = create_async_engine(config.DATABASE_URL)
+    try:
+        async with AsyncSession(engine) as session:
+            await _drop_partitions(session, MAY, JUNE, JULY)
+            now = datetime(2031, 5, 20, tzinfo=timezone.utc)
+
+            created = await ensure_transaction_partitions(session, 2, now)
+            assert created == [
+                partition_name(MAY), partition_name(JUNE), partition_name(JULY)
+            ]
+            partitions = await _partitions(session)
+            assert {*created, DEFAULT_PARTITION} <= partitions
+
+            # повторний виклик нічого не створює
+            assert await ensure_transaction_partitions(session, 2, now) == []
+
+            # рядок у місяці, що вже з партицією, потрапляє в неї
+            user_id = await _create_user(session)
+            tx_id = f"txn_test_{uuid.uuid4().hex[:12]}"
+            session.add(_charge_tx(
+                user_id, tx_id, f"op_test_{uuid.uuid4().hex[:12]}",
+                datetime(2031, 6, 15, tzinfo=timezone.utc),
+            ))
+            await session.commit()
+            result = await session.execute(
+                text(f"SELECT count(*) FROM {partition_name(JUNE)} WHERE id = :id"),
+                {"id": tx_id},
+            )
+            assert result.scalar() == 1
+            await session.execute(delete(Transaction).where(Transaction.id == tx_id))
+            await session.commit()
+    finally:
+        async with AsyncSession(engine) as session:
+            await _drop_partitions(session, MAY, JUNE, JULY)
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_ensure_partitions_skips_month_in_default():
+    engine = create_async_engine(config.DATABASE_URL)
+    try:
+        async with AsyncSession(engine) as session:
+            await _drop_partitions(session, MAY, JUNE)
+
+            # рядок травня без партиції - у default: травень пропускається
+            user_id = await _create_user(session)
+            tx_id = f"txn_test_{uuid.uuid4().hex[:12]}"
+            session.add(_charge_tx(
+                user_id, tx_id, f"op_test_{uuid.uuid4().hex[:12]}",
+                datetime(2031, 5, 15, tzinfo=timezone.utc),
+            ))
+            await session.commit()
+
+            created = await ensure_transaction_partitions(
+                session, 1, datetime(2031, 5, 1, tzinfo=timezone.utc)
+            )
+            assert created == [partition_name(JUNE)]
+            assert partition_name(MAY) not in await _partitions(session)
+
+            await session.execute(delete(Transaction).where(Transaction.id == tx_id))
+            await session.commit()
+    finally:
+        async with AsyncSession(engine) as session:
+            await _drop_partitions(session, MAY, JUNE)
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_operation_lookup_across_partitions():
+    engine = create_async_engine(config.DATABASE_URL)
+    try:
+        async with AsyncSession(engine) as session:
+            for month in (MAY, JUNE):
+                await session.execute(text(partition_ddl(month)))
+            user_id = await _create_user(session)
+
+            # той самий id і operation_id у партиції іншого місяця: унікальність
+            # transactions - лише (id, created_at), глобальний індекс -
+            # transaction_operations
+            suffix = uuid.uuid4().hex[:12]
+            tx_id, operation_id = f"txn_test_{suffix}", f"op_test_{suffix}"
+            may_at = datetime(2031, 5, 10, tzinfo=timezone.utc)
+            june_at = datetime(2031, 6, 10, tzinfo=timezone.utc)
+
+            await add_transaction(
+                session, _charge_tx(user_id, tx_id, operation_id, may_at)
+            )
+            session.add(_charge_tx(user_id, tx_id, operation_id, june_at))
+            await session.commit()
+
+            is_duplicate, tx = await check_idempotency(
+                session, operation_id, TransactionType.CHARGE.value
+            )
+            assert is_duplicate
+            assert (tx.id, tx.created_at) == (tx_id, may_at)
+
+            existing = await get_existing_transactions(session, [operation_id])
+            assert list(existing) == [operation_id]
+            assert existing[operation_id].created_at == may_at
+
+            # повторне використання operation_id - 409 ще до вставки транзакції
+            with pytest.raises(HTTPException) as exc_info:
+                await add_transaction(session, _charge_tx(
+                    user_id, f"txn_test_{uuid.uuid4().hex[:12]}", operation_id,
+                    datetime(2031, 6, 20, tzinfo=timezone.utc),
+                ))
+            assert exc_info.value.status_code == 409
+            await session.rollback()
+
+            await session.execute(delete(Transaction).where(Transaction.id == tx_id))
+            await session.execute(
+                delete(TransactionOperation)
+                .where(TransactionOperation.operation_id == operation_id)
+            )
+            await session.commit()
+    finally:
+        async with AsyncSession(engine) as session:
+            await _drop_partitions(session, MAY, JUNE)
+        await engine.dispose()
@@ -82,3 +82,58 @@ async def test_list_user_transactions(async_client):
 
 		# усі очікувані поля присутні
 		assert expected_fields_transaction.issubset(transaction.keys())
+
+
+@pytest.mark.asyncio
+async def test_list_user_transactions_cursor(async_client):
+	resp = await async_client.get(
+		"/api/v1/transactions",
+		params={"limit": 1, "include_total": False},
+		headers={"Authorization": f"Bearer {config.USER_TOKEN_BEARER}"}
+	)
+
+	assert resp.status_code == 200
+	data = resp.json()
+
+	# без include_total total не рахується
+	assert data["total"] is None
+	assert "next_cursor" in data
+
+	if data["next_cursor"] is None:
+		pytest.skip("Less than 2 transactions yet.")
+
+	# наступна сторінка за cursor не повторює попередню
+	resp = await async_client.get(
+		"/api/v1/transactions",
+		params={"limit": 1, "cursor": data["next_cursor"]},
+		headers={"Authorization": f"Bearer {config.USER_TOKEN_BEARER}"}
+	)
+	assert resp.status_code == 200
+	next_page = resp.json()
+	assert next_page["transactions"][0]["id"] != data["transactions"][0]["id"]
+
+
+@pytest.mark.asyncio
+async def test_list_user_transactions_invalid_cursor(async_client):
+	resp = await async_client.get(
+		"/api/v1/transactions",
+		params={"cursor": "not-a-cursor"},
+		headers={"Authorization": f"Bearer {config.USER_TOKEN_BEARER}"}
+	)
+	assert resp.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_export_user_transactions_csv(async_client):
+	resp = await async_client.get(
+		"/api/v1/transactions/export",
+		params={"format": "csv"},
+		headers={"Authorization": f"Bearer {config.USER_TOKEN_BEARER}"}
+	)
+
+	assert resp.status_code == 200
+	assert resp.headers["content-type"].startswith("text/csv")
+
+	# перший рядок - заголовок CSV
+	header = resp.text.splitlines()[0].split(",")
+	assert {"id", "type", "credits", "balance_after", "created_at"}.issubset(header)
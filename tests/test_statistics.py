@@ -0,0 +1,167 @@
+import uuid
+from datetime import datetime, time, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, delete, func
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+from app.core.config import config
+from app.models import (
+    DailyUsageRollup, Subscription, Transaction, TransactionType, User
+)
+from app.utils.rollup import (
+    day_start, last_closed_day, refresh_daily_rollup, transaction_counts
+)
+
+SERVICE_HEADERS = {"X-Service-Token": config.SERVICE_TOKEN}
+ADMIN_HEADERS = {"X-Admin-Token": config.ADMIN_TOKEN}
+
+
+async def _create_subscriber(async_client) -> tuple:
+    """Новий user з власним tier (агрегати tier належать лише цьому тесту)"""
+    suffix = uuid.uuid4().hex[:8]
+    user_id, tier = f"test_{suffix}", f"test_rollup_{suffix}"
+
+    engine = create_async_engine(config.DATABASE_URL)
+    try:
+        async with AsyncSession(engine) as session:
+            session.add(User(id=user_id))
+            await session.commit()
+    finally:
+        await engine.dispose()
+
+    resp = await async_client.post(
+        "/api/admin/subscription-plans",
+        headers=ADMIN_HEADERS,
+        json={
+            "tier": tier,
+            "name": tier,
+            "monthly_cost": 10,
+            "fixed_cost": 1,
+            "credits_included": 100,
+            "bonus_credits": 10,
+            "multiplier": 1.0,
+            "purchase_rate": 1.0,
+            "active": True,
+        },
+    )
+    assert resp.status_code == 201
+
+    resp = await async_client.post(
+        "/api/internal/subscription/update",
+        headers=SERVICE_HEADERS,
+        json={
+            "user_id": user_id,
+            "subscription_tier": tier,
+            "credits_to_add": 1000,
+            "operation_id": f"op_test_{suffix}",
+        },
+    )
+    assert resp.status_code == 200
+    return user_id, tier
+
+
+def _charge_tx(user_id: str, created_at: datetime) -> Transaction:
+    suffix = uuid.uuid4().hex[:12]
+    return Transaction(
+        id=f"txn_test_{suffix}",
+        user_id=user_id,
+        type=TransactionType.CHARGE,
+        operation_id=f"op_test_{suffix}",
+        cost_usd=0.01,
+        credits=-100,
+        balance_before=1000,
+        balance_after=900,
+        info={},
+        created_at=created_at,
+    )
+
+
+def _at_noon(day) -> datetime:
+    return datetime.combine(day, time(12, 0), tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+async def test_refresh_daily_rollup(async_client):
+    user_id, tier = await _create_subscriber(async_client)
+    closed = last_closed_day()
+    first_day, second_day = closed - timedelta(days=2), closed - timedelta(days=1)
+
+    engine = create_async_engine(config.DATABASE_URL)
+    try:
+        async with AsyncSession(engine) as session:
+            session.add_all([
+                _charge_tx(user_id, _at_noon(first_day)),
+                _charge_tx(user_id, _at_noon(first_day)),
+                _charge_tx(user_id, _at_noon(second_day)),
+            ])
+            await session.commit()
+
+            # дні вже закриті - rebuild агрегує їх заново
+            assert await refresh_daily_rollup(session, rebuild=True) == closed
+            # повторний прогін нічого не дублює
+            assert await refresh_daily_rollup(session) == closed
+
+            result = await session.execute(
+                select(
+                    DailyUsageRollup.day,
+                    DailyUsageRollup.tx_count,
+                    DailyUsageRollup.credits,
+                )
+                .where(DailyUsageRollup.tier == tier)
+                .where(DailyUsageRollup.type == TransactionType.CHARGE)
+                .order_by(DailyUsageRollup.day)
+            )
+            assert result.all() == [(first_day, 2, -200), (second_day, 1, -100)]
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_transaction_counts_rollup_and_raw_tail(async_client):
+    user_id, tier = await _create_subscriber(async_client)
+    closed = last_closed_day()
+    closed_day = closed - timedelta(days=1)
+    today = datetime.now(timezone.utc)
+
+    engine = create_async_engine(config.DATABASE_URL)
+    try:
+        async with AsyncSession(engine) as session:
+            old_tx = _charge_tx(user_id, _at_noon(closed_day))
+            old_tx_id = old_tx.id
+            session.add_all([old_tx, _charge_tx(user_id, today)])
+            await session.commit()
+            await refresh_daily_rollup(session, rebuild=True)
+
+            # сирі транзакції того ж діапазону - еталон для rollup + хвоста
+            result = await session.execute(
+                select(Transaction.type, func.count())
+                .join(Subscription, Subscription.user_id == Transaction.user_id)
+                .where(Subscription.plan_id == tier)
+                .where(Transaction.created_at >= day_start(closed_day))
+                .group_by(Transaction.type)
+            )
+            raw = {t: 0 for t in TransactionType}
+            raw.update(dict(result.all()))
+
+            counts = await transaction_counts(
+                session, closed_day, today.date(), tier
+            )
+            assert counts == raw
+            assert counts[TransactionType.CHARGE] == 2
+            # SUBSCRIPTION з subscription/update - сьогодні, у сирому хвості
+            assert counts[TransactionType.SUBSCRIPTION] == 1
+
+            # закритий день читається з rollup, а не з transactions
+            await session.execute(delete(Transaction).where(Transaction.id == old_tx_id))
+            await session.commit()
+            counts = await transaction_counts(session, closed_day, closed_day, tier)
+            assert counts[TransactionType.CHARGE] == 1
+
+            # інший tier агрегатів цього користувача не бачить
+            counts = await transaction_counts(
+                session, closed_day, today.date(), f"{tier}_other"
+            )
+            assert sum(counts.values()) == 0
+    finally:
+        await engine.dispose()